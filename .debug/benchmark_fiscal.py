@@ -0,0 +1,220 @@
+"""
+Regression and throughput benchmark of FiscalDataExtractionTask, runs without IPED or a JVM.
+
+Fixtures are the parsed texts of PDFs, as stored by IPED in the parsed text cache:
+    <pdf name>.json  positional JSON written by PDFPositionalTextParser
+    <pdf name>.txt   plain text
+e.g. 'nota1.pdf.json'. The optional expected_values.json in the same format used by
+debug_all_pdfs.py is keyed by the pdf name.
+
+Each fixture is processed by FiscalDataExtractionTask.process() with the stand-alone
+fallbacks of the script. Reports field accuracy, documents/second, the time of each
+extraction phase and peak memory.
+
+Usage:
+    python benchmark_fiscal.py <fixtures_dir> [--repeat N] [--save results.json]
+                               [--compare baseline.json] [--tolerance 0.1] [--errors]
+
+With --compare, exits with status 1 if throughput or accuracy got worse than the
+baseline results, saved before with --save, more than the tolerance.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+task_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "iped-app", "resources", "scripts", "tasks")
+sys.path.append(os.path.normpath(task_dir))
+
+import FiscalDataExtractionTask as fiscal
+from FiscalDataExtractionTask import FiscalDataExtractionTask, StandaloneItem
+
+FIELDS = ['docType', 'remetCNPJ', 'remetName', 'remetCity', 'destCNPJ', 'destName', 'destCity', 'value', 'icms']
+
+PHASE_TIMERS = [fiscal.decodeTimer, fiscal.detectTimer, fiscal.regexTimer, fiscal.spatialTimer]
+
+def load_fixtures(fixtures_dir):
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.json")) + glob.glob(os.path.join(fixtures_dir, "*.txt"))):
+        name = os.path.basename(path)
+        if name == "expected_values.json":
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            fixtures.append((os.path.splitext(name)[0], f.read()))
+    return fixtures
+
+
+def normalize(s):
+    if s is None or s == "": return "MISSING"
+    return str(s).strip()
+
+
+def title_case(s):
+    """Title case without company suffixes, as displayed by debug_all_pdfs.py."""
+    if s == "MISSING": return s
+    suffixes = {"eireli", "ltda", "ltda.", "s.a.", "sa", "s/a", "me", "epp", "ss"}
+    return " ".join(w.capitalize() for w in s.split() if w.lower() not in suffixes)
+
+
+def matches(expected, actual):
+    """Same comparison rules of debug_all_pdfs.py."""
+    n_exp = normalize(expected)
+    n_act = normalize(actual)
+    d_exp = title_case(n_exp).upper()
+    d_act = title_case(n_act).upper()
+    if d_exp == d_act:
+        return True
+    if n_act == "MISSING":
+        return False
+    if d_exp in d_act or d_act in d_exp:
+        return True
+    strip = lambda v: v.replace(".", "").replace("/", "").replace("-", "")
+    return strip(n_exp) == strip(n_act)
+
+
+def extracted_fields(item):
+    res = dict(item.metadata.values)
+    # Expected locations are 'City - UF'
+    for prefix in ('remet', 'dest'):
+        city = res.pop(prefix + 'City', '')
+        uf = res.pop(prefix + 'UF', '')
+        res[prefix + 'City'] = f"{city} - {uf}" if city and uf else city
+    return res
+
+
+def run(fixtures, repeat):
+    task = FiscalDataExtractionTask()
+    task.init(None)
+    results = {}
+    start = time.perf_counter()
+    for i in range(repeat):
+        for name, text in fixtures:
+            item = StandaloneItem(name, text)
+            task.process(item)
+            if i == 0:
+                results[name] = extracted_fields(item)
+    elapsed = time.perf_counter() - start
+    return task, results, elapsed
+
+
+def peak_memory(fixtures):
+    task = FiscalDataExtractionTask()
+    peak = 0
+    tracemalloc.start()
+    for name, text in fixtures:
+        tracemalloc.reset_peak()
+        task.process(StandaloneItem(name, text))
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    return peak
+
+
+def accuracy(results, expected_data, show_errors):
+    counts = {field: [0, 0] for field in FIELDS}
+    for name, exp in expected_data.items():
+        if name not in results:
+            print(f"[WARN] No fixture for expected values of {name}")
+            continue
+        act = results[name]
+        for field in FIELDS:
+            if field not in exp:
+                continue
+            ok = matches(exp[field], act.get(field))
+            counts[field][0] += ok
+            counts[field][1] += 1
+            if show_errors and not ok:
+                print(f"[ERROR] {name}: {field} = {normalize(act.get(field))} (EXP: {normalize(exp[field])})")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of FiscalDataExtractionTask over parsed text fixtures.")
+    parser.add_argument("fixtures_dir")
+    parser.add_argument("--expected", help="expected values file, default is expected_values.json in the fixtures dir")
+    parser.add_argument("--repeat", type=int, default=3, help="times each fixture is processed in the timed run")
+    parser.add_argument("--save", help="saves the results to this file")
+    parser.add_argument("--compare", help="compares with results saved before")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="max relative regression accepted by --compare")
+    parser.add_argument("--errors", "-e", action="store_true", help="prints mismatched fields")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.fixtures_dir)
+    if not fixtures:
+        print(f"[ERROR] No .json or .txt fixtures found in {args.fixtures_dir}")
+        sys.exit(1)
+    print(f"[INFO] Loaded {len(fixtures)} fixtures, {sum(len(t) for n, t in fixtures) / 1e6:.1f} M chars")
+
+    expected_file = args.expected or os.path.join(args.fixtures_dir, "expected_values.json")
+    expected_data = {}
+    if os.path.exists(expected_file):
+        with open(expected_file, 'r', encoding='utf-8') as f:
+            expected_data = json.load(f)
+        print(f"[INFO] Loaded {len(expected_data)} expected value entries")
+
+    task, results, elapsed = run(fixtures, args.repeat)
+    num_docs = len(fixtures) * args.repeat
+    docs_per_sec = num_docs / elapsed
+    fiscal_docs = sum(1 for r in results.values() if r.get('docType'))
+    phases = {timer.name: timer.nanos.sum() / 1e6 / num_docs for timer in PHASE_TIMERS}
+    checked = fiscal.checkedCount.get()
+    rejected = fiscal.rejectedCount.get()
+    peak = peak_memory(fixtures)
+
+    print()
+    print("=" * 60)
+    print(f"Documents:                  {len(fixtures)} x {args.repeat}, {fiscal_docs} fiscal")
+    print(f"Throughput:                 {docs_per_sec:.1f} documents/s, {elapsed * 1000 / num_docs:.3f} ms/document")
+    if checked:
+        print(f"Rejected by pre-filter:     {rejected} of {checked} ({100 * rejected / checked:.1f}%)")
+    for name, ms in phases.items():
+        print(f"{name + ':':<28}{ms:.3f} ms/document")
+    print(f"Peak memory:                {peak / 1e6:.2f} MB max per document (python allocations)")
+
+    counts = accuracy(results, expected_data, args.errors)
+    total_ok = sum(c[0] for c in counts.values())
+    total = sum(c[1] for c in counts.values())
+    acc = total_ok / total if total else None
+    if total:
+        print("-" * 60)
+        for field, (ok, n) in counts.items():
+            if n:
+                print(f"{field + ':':<28}{ok}/{n} ({100 * ok / n:.1f}%)")
+        print(f"{'Accuracy:':<28}{total_ok}/{total} ({100 * acc:.1f}%)")
+    print("=" * 60)
+
+    summary = {
+        'documents': len(fixtures),
+        'docsPerSecond': docs_per_sec,
+        'phasesMsPerDocument': phases,
+        'peakMemoryBytes': peak,
+        'accuracy': acc,
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Results saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        failed = False
+        if docs_per_sec < baseline['docsPerSecond'] * (1 - args.tolerance):
+            print(f"[REGRESSION] Throughput {docs_per_sec:.1f} documents/s, baseline {baseline['docsPerSecond']:.1f}")
+            failed = True
+        if acc is not None and baseline.get('accuracy') is not None and acc < baseline['accuracy'] * (1 - args.tolerance):
+            print(f"[REGRESSION] Accuracy {100 * acc:.1f}%, baseline {100 * baseline['accuracy']:.1f}%")
+            failed = True
+        changed = [name for name, res in results.items() if name in baseline['results'] and baseline['results'][name] != res]
+        if changed:
+            print(f"[INFO] Extracted values changed for {len(changed)} documents: {', '.join(changed[:10])}")
+        if failed:
+            sys.exit(1)
+        print("[INFO] No regression compared to " + args.compare)
+
+
+if __name__ == "__main__":
+    main()
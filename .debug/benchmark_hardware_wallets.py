@@ -0,0 +1,202 @@
+"""
+Throughput benchmark of SearchHardwareWallets over synthetic reports, runs without IPED or a JVM.
+
+Generates a SYSTEM registry report and a setupapi.dev.log with device blocks of random
+wallets from hardwarewallets.json among other devices, and processes them with one or more
+versions of the script. The java text reader is stubbed by a python one counting the calls
+made to it, which are calls through JEP in IPED. Their cost is not measured here, just their
+number, the python time and whether the sub-items are the same of the first script.
+
+Usage:
+    python benchmark_hardware_wallets.py [--devices 200000] [--seed 1] [--repeat N] [script.py ...]
+
+The default script is the one in iped-app/resources/scripts/tasks. E.g. to compare with the
+previous version, reading the text line by line:
+    git show 49f1189:iped-app/resources/scripts/tasks/SearchHardwareWallets.py > /tmp/SearchHardwareWallets.py
+    python benchmark_hardware_wallets.py iped-app/resources/scripts/tasks/SearchHardwareWallets.py /tmp/SearchHardwareWallets.py
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+import types
+
+base_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "iped-app", "resources")
+script_path = os.path.join(base_dir, "scripts", "tasks", "SearchHardwareWallets.py")
+wallets_path = os.path.join(base_dir, "config", "conf", "hardwarewallets.json")
+
+OTHER_DEVICES = [('0C45', '64AD'), ('046D', 'C52B'), ('8087', '0A2B'), ('0BDA', '8153'), ('058F', '6387')]
+
+NOISE = ['Device Parameters', 'LastWrite Time: 2023-01-10 12:00:00Z', 'FriendlyName: USB Input Device',
+         'ParentIdPrefix: 7&1a2b3c4d&0', 'Service: HidUsb', 'Mfg: (Standard system devices)',
+         'dvi: {Build Driver List} 15:43:49.263', '<<<  [Exit status: SUCCESS]']
+
+
+def vid_pid(rnd, wallets):
+    if rnd.random() < 0.02:
+        w = rnd.choice(wallets)
+        return str(w.get('VendorID')), str(w.get('ProductID'))
+    return rnd.choice(OTHER_DEVICES)
+
+
+def registry_report(rnd, wallets, devices):
+    lines = ['Launching usbstor v.20200515', 'USBStor', 'ControlSet001\\Enum\\USB', '']
+    for d in range(devices):
+        vid, pid = vid_pid(rnd, wallets)
+        lines.append(f'USB\\VID_{vid}&PID_{pid}\\5&{d:x}')
+        lines.extend(rnd.choice(NOISE) for i in range(rnd.randint(1, 6)))
+        lines.append('')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def setupapi_log(rnd, wallets, devices):
+    lines = ['[Device Install Log]', '     OS Version = 10.0.19045']
+    for d in range(devices):
+        vid, pid = vid_pid(rnd, wallets)
+        lines.append(f'>>>  [Setup online Device Install (Hardware initiated) - USB\\VID_{vid}&PID_{pid}\\6&{d:x}&0&4]')
+        lines.append('>>>  Section start 2014/06/26 15:43:49.248')
+        lines.extend(rnd.choice(NOISE) for i in range(rnd.randint(1, 6)))
+        lines.append('<<<  Section end 2014/06/26 15:43:51.210')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+class TextReader:
+    '''
+    Stub of the java Reader of the item text, counting the calls to it.
+    '''
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.calls = 0
+
+    def read(self, buffer):
+        self.calls += 1
+        if self.pos == len(self.text):
+            return -1
+        buffer.chars = self.text[self.pos:self.pos + buffer.size]
+        self.pos += len(buffer.chars)
+        return len(buffer.chars)
+
+    def readLine(self):
+        self.calls += 1
+        if self.pos == len(self.text):
+            return None
+        end = self.text.find('\n', self.pos)
+        end = len(self.text) if end == -1 else end + 1
+        line = self.text[self.pos:end]
+        self.pos = end
+        return line.rstrip('\r\n')
+
+    def close(self):
+        pass
+
+
+class CharBuffer:
+
+    def __init__(self, size):
+        self.size = size
+        self.chars = ''
+
+    @staticmethod
+    def allocate(size):
+        return CharBuffer(size)
+
+    def flip(self):
+        return self
+
+    def toString(self):
+        return self.chars
+
+    def clear(self):
+        self.chars = ''
+        return self
+
+
+class Item:
+
+    def __init__(self, name, text):
+        self.name = name
+        self.reader = TextReader(text)
+
+    def getName(self):
+        return self.name
+
+    def getTextReader(self):
+        return self.reader
+
+
+def stub_java_classes():
+    modules = {
+        'iped.parsers.registry': {'RegRipperParser': types.SimpleNamespace(FULL_REPORT_SUFFIX='_Full_Report')},
+        # the text reader stub implements readLine() itself
+        'java.io': {'BufferedReader': lambda reader: reader},
+        'java.nio': {'CharBuffer': CharBuffer},
+    }
+    for name in ('iped', 'iped.parsers', 'java'):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    for name, classes in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(classes)
+        sys.modules[name] = module
+
+
+def load_script(path, index, wallets):
+    spec = importlib.util.spec_from_file_location('SearchHardwareWallets%d' % index, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    task = module.SearchHardwareWallets
+    if hasattr(module, 'WalletMatcher'):
+        task.registryMatcher = module.WalletMatcher(wallets, module.registryTemplate)
+        task.setupapiMatcher = module.WalletMatcher(wallets, module.setupapiTemplate)
+    else:
+        task.wallets = wallets
+    return module
+
+
+def process(module, name, text):
+    created = []
+    module.newSubItem = lambda task, item, text, subItemID, info: created.append((subItemID, text, info.get('DeviceName')))
+    item = Item(name, text)
+    module.SearchHardwareWallets().process(item)
+    return created, item.reader.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of SearchHardwareWallets over synthetic reports.")
+    parser.add_argument("scripts", nargs="*", default=[os.path.normpath(script_path)], help="task scripts, the first one is the reference")
+    parser.add_argument("--devices", type=int, default=200000, help="device blocks in each generated report")
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the generated reports")
+    parser.add_argument("--repeat", type=int, default=1, help="times each report is processed in the timed run")
+    args = parser.parse_args()
+
+    stub_java_classes()
+    with open(wallets_path) as f:
+        wallets = json.load(f)
+    rnd = random.Random(args.seed)
+    reports = [('SYSTEM_Full_Report', registry_report(rnd, wallets, args.devices)),
+               ('setupapi.dev.log', setupapi_log(rnd, wallets, args.devices))]
+    for name, text in reports:
+        print(f"[INFO] {name}: {len(text) / 1e6:.1f} MB, {text.count(chr(10))} lines")
+
+    reference = {}
+    for index, path in enumerate(args.scripts):
+        module = load_script(path, index, wallets)
+        print(f"{path}:")
+        for name, text in reports:
+            start = time.perf_counter()
+            for i in range(args.repeat):
+                created, calls = process(module, name, text)
+            elapsed = (time.perf_counter() - start) / args.repeat
+            print(f"    {name}: {len(created)} sub-items in {elapsed:.2f}s, {calls} text reader calls")
+            if name not in reference:
+                reference[name] = created
+            elif created != reference[name]:
+                print(f"    [DIFF] sub-items are different of {args.scripts[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Throughput and memory benchmark of PythonParserJabber, runs without IPED or a JVM.
+
+Generates a synthetic pidgin html log, with the line formats found in real logs (font and
+span styles, nested <font>, <body> messages, <br/> blocks, entities, links and system
+messages), and parses it with one or more versions of the parser script, with the Java
+classes imported by the script stubbed. Reports the parsing time, the peak python memory
+and whether the extracted messages are the same of the first parser.
+
+Tika's HtmlParser, used by older versions to write the indexed text, is Java code and is
+stubbed by a no-op, so it is not measured.
+
+Usage:
+    python benchmark_jabber.py [--lines 60000] [--seed 2] [--log log.html] [--repeat N]
+                               [parser.py ...]
+
+The default parser is the one in iped-app/resources/scripts/parsers. E.g. to compare with
+the previous BeautifulSoup version (requires pip install beautifulsoup4):
+    git show c41f058~1:iped-app/resources/scripts/parsers/PythonParserJabber.py > /tmp/PythonParserJabber.py
+    python benchmark_jabber.py iped-app/resources/scripts/parsers/PythonParserJabber.py /tmp/PythonParserJabber.py
+"""
+import argparse
+import importlib.util
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+parser_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "iped-app", "resources", "scripts", "parsers", "PythonParserJabber.py")
+
+WORDS = "olá mundo teste &amp; &lt;b&gt; café ação você <a href=\"http://x.y\">link</a> <i>it</i> ok   dois &#39;q&#39; \xa0nbsp".split(' ')
+
+SENDERS = ['alice@dukgo.com/Res', 'bob@xmpp.cm/Pidgin', 'bob@xmpp.cm']
+
+HEADER = ('<html><head><meta http-equiv="content-type" content="text/html; charset=UTF-8"><title>Conversation with alice@dukgo.com '
+          'at 05/02/2017 16:32:47 on bob@xmpp.cm/ (jabber)</title></head><body><h3>Conversation with alice@dukgo.com at 05/02/2017 '
+          '16:32:47 on bob@xmpp.cm/ (jabber)</h3>\n')
+
+# Name of the log file, the parser gets the time zone from it
+LOG_NAME = '2017-02-05.163247-0200BRT.html'
+
+
+def generate_log(path, lines, seed):
+    '''
+    Writes a pidgin log with the given number of message lines. Odd seeds use the span style.
+    '''
+    rnd = random.Random(seed)
+    style = 'span' if seed % 2 else 'font'
+
+    def message():
+        return ' '.join(rnd.choice(WORDS) for i in range(rnd.randint(1, 25)))
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        for i in range(lines):
+            t = '%02d:%02d:%02d' % (16 + i // 3600 % 8, i // 60 % 60, i % 60)
+            sender = rnd.choice(SENDERS)
+            r = rnd.random()
+            if r < 0.05:
+                f.write('<font size="2">(%s)</font><b> Tentando iniciar %s</b><br/>\n' % (t, message()))
+            elif r < 0.1:
+                f.write('<font color="#A82F2F"><font size="2">(%s)</font> <b>%s:</b></font> <body>%s</body><br/>\n' % (t, sender, message()))
+            elif r < 0.15:
+                f.write('<font color="#A82F2F"><font size="2">(%s)</font> <b>%s:</b></font> %s<br/>%s<br/>\n' % (t, sender, message(), message()))
+            elif style == 'span':
+                f.write('<span style="color: #16569E"><span style="font-size: smaller">(%s)</span> <b>%s:</b></span> %s<br/>\n' % (t, sender, message()))
+            else:
+                f.write('<font color="#16569E"><font size="2">(%s)</font> <b>%s:</b></font> %s<br/>\n' % (t, sender, message()))
+        f.write('</body></html>\n')
+
+
+class JavaStub:
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return JavaStub()
+
+    def __call__(self, *args, **kwargs):
+        return JavaStub()
+
+
+class XHTMLContentHandler:
+
+    def __init__(self, handler, metadata):
+        self.handler = handler
+
+    def startDocument(self):
+        pass
+
+    def endDocument(self):
+        pass
+
+    def element(self, name, value):
+        self.handler.append((name, value))
+
+
+class Metadata(dict):
+
+    def set(self, key, value):
+        self[key] = value
+
+
+class TikaInputStream:
+
+    @staticmethod
+    def get(stream, tmpResources):
+        return types.SimpleNamespace(getFile=lambda: types.SimpleNamespace(getAbsolutePath=lambda: stream))
+
+
+class EmbeddedDocumentExtractor:
+
+    def __init__(self):
+        self.messages = []
+
+    def parseEmbedded(self, stream, handler, metadata, outputHtml):
+        self.messages.append(dict(metadata))
+
+
+def stub_java_classes():
+    classes = {
+        'org.apache.tika.sax': {'XHTMLContentHandler': XHTMLContentHandler, 'EmbeddedContentHandler': lambda handler: handler},
+        'org.apache.tika.io': {'TikaInputStream': TikaInputStream},
+        'org.apache.tika.metadata': {'Metadata': Metadata},
+        'org.apache.tika.extractor': {'EmbeddedDocumentExtractor': EmbeddedDocumentExtractor},
+    }
+    names = ['org.apache.tika.exception', 'org.apache.tika.parser.html', 'iped.properties', 'iped.parsers.standard', 'iped.utils',
+             'iped.parsers.whatsapp', 'iped.parsers.util', 'org.apache.commons.codec.binary', 'java.io']
+    for name in names + list(classes):
+        module = types.ModuleType(name)
+        # other classes and constants are not used out of IPED
+        module.__getattr__ = lambda attr: JavaStub
+        module.__dict__.update(classes.get(name, {}))
+        sys.modules[name] = module
+    metadata = sys.modules['org.apache.tika.metadata']
+    metadata.TikaCoreProperties = types.SimpleNamespace(RESOURCE_NAME_KEY='resourceName', TITLE='dc:title')
+    metadata.Message = types.SimpleNamespace(MESSAGE_FROM='Message-From', MESSAGE_TO='Message-To')
+    sys.modules['iped.properties'].ExtraProperties = types.SimpleNamespace(MESSAGE_DATE='messageDate', MESSAGE_BODY='messageBody')
+    sys.modules['iped.properties'].BasicProps = types.SimpleNamespace(LENGTH='length')
+    sys.modules['iped.parsers.standard'].StandardParser = types.SimpleNamespace(INDEXER_CONTENT_TYPE='indexerContentType')
+
+
+def load_parser(path, index):
+    spec = importlib.util.spec_from_file_location('PythonParserJabber%d' % index, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PythonParserJabber()
+
+
+def parse(parser, log_path):
+    metadata = Metadata(resourceName=LOG_NAME)
+    extractor = EmbeddedDocumentExtractor()
+    context = types.SimpleNamespace(get=lambda cls: extractor)
+    parser.parse(log_path, [], metadata, context)
+    return extractor.messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of PythonParserJabber over a synthetic pidgin log.")
+    parser.add_argument("parsers", nargs="*", default=[os.path.normpath(parser_path)], help="parser scripts, the first one is the reference")
+    parser.add_argument("--lines", type=int, default=60000, help="message lines of the generated log")
+    parser.add_argument("--seed", type=int, default=2, help="random seed of the generated log, odd seeds use the span style")
+    parser.add_argument("--log", help="parses this log instead of generating one, it is kept if generated")
+    parser.add_argument("--repeat", type=int, default=1, help="times the log is parsed in the timed run")
+    args = parser.parse_args()
+
+    stub_java_classes()
+    log_path = args.log
+    tmp_dir = None
+    if not log_path:
+        tmp_dir = tempfile.mkdtemp()
+        log_path = os.path.join(tmp_dir, LOG_NAME)
+    if not os.path.exists(log_path):
+        generate_log(log_path, args.lines, args.seed)
+    print(f"[INFO] Log {log_path}, {os.path.getsize(log_path) / 1e6:.1f} MB")
+
+    reference = None
+    for index, path in enumerate(args.parsers):
+        jabber = load_parser(path, index)
+        start = time.perf_counter()
+        for i in range(args.repeat):
+            messages = parse(jabber, log_path)
+        elapsed = (time.perf_counter() - start) / args.repeat
+
+        tracemalloc.start()
+        parse(jabber, log_path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f"{path}:")
+        print(f"    {len(messages)} messages in {elapsed:.1f}s, peak memory {peak / 1e6:.0f} MB (python allocations)")
+        if reference is None:
+            reference = messages
+        elif messages != reference:
+            print(f"    [DIFF] messages are different of {args.parsers[0]}")
+        else:
+            print(f"    same messages of {args.parsers[0]}")
+
+    if tmp_dir:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
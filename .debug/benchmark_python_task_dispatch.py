@@ -0,0 +1,96 @@
+"""
+Microbenchmark of the python side of the dispatch of PythonTask calls to script instances,
+runs without IPED or a JVM.
+
+Calls a no-op process() of a script instance through one or more versions of
+PythonTaskInstancesHolder.py, in the ways PythonTask invokes it:
+    callFunction   PythonTaskInstancesHolder.callFunction(worker, script, 'process', item)
+    getFunction    the function returned by getFunction(), bound to an interpreter global
+                   and invoked directly by PythonTask, if the version implements it
+    bound method   the bare bound method, the lower bound of the dispatch cost
+The JEP crossing from java is the same for all of them and is not measured.
+
+Usage:
+    python benchmark_python_task_dispatch.py [--calls 1000000] [--repeat 5] [holder.py ...]
+
+The default holder is the one in iped-app/resources/scripts/tasks. E.g. to compare with the
+version looking up the instance and the method on every call:
+    git show a0fb429~1:iped-app/resources/scripts/tasks/PythonTaskInstancesHolder.py > /tmp/PythonTaskInstancesHolder.py
+    python benchmark_python_task_dispatch.py iped-app/resources/scripts/tasks/PythonTaskInstancesHolder.py /tmp/PythonTaskInstancesHolder.py
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import timeit
+import types
+
+holder_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "iped-app", "resources", "scripts", "tasks", "PythonTaskInstancesHolder.py")
+
+SCRIPT_NAME = 'BenchmarkTask'
+WORKER_ID = 0
+
+
+class BenchmarkTask:
+
+    def process(self, item):
+        pass
+
+
+class Logger:
+
+    def debug(self, msg):
+        pass
+
+    info = warn = error = debug
+
+
+def load_holder(path, index):
+    spec = importlib.util.spec_from_file_location('PythonTaskInstancesHolder%d' % index, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    holder = module.PythonTaskInstancesHolder()
+    holder.logger = Logger()
+    return holder
+
+
+def best_ns(function, calls, repeat):
+    '''
+    Returns the best time of a call in nanoseconds.
+    '''
+    return min(timeit.repeat(function, number=calls, repeat=repeat)) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark of the dispatch of PythonTask calls to script instances.")
+    parser.add_argument("holders", nargs="*", default=[os.path.normpath(holder_path)], help="PythonTaskInstancesHolder.py versions")
+    parser.add_argument("--calls", type=int, default=1000000, help="calls of each timed run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs, the best one is reported")
+    args = parser.parse_args()
+
+    # the script module imported by the holder when creating the instance
+    script = types.ModuleType(SCRIPT_NAME)
+    script.BenchmarkTask = BenchmarkTask
+    sys.modules[SCRIPT_NAME] = script
+    item = object()
+
+    for index, path in enumerate(args.holders):
+        holder = load_holder(path, index)
+        print(f"{path}:")
+
+        callFunction = holder.callFunction
+        ns = best_ns(lambda: callFunction(WORKER_ID, SCRIPT_NAME, 'process', item), args.calls, args.repeat)
+        print(f"    callFunction: {ns:6.0f} ns/call")
+
+        if hasattr(holder, 'getFunction'):
+            function = holder.getFunction(WORKER_ID, SCRIPT_NAME, 'process')
+            ns = best_ns(lambda: function(item), args.calls, args.repeat)
+            print(f"    getFunction:  {ns:6.0f} ns/call")
+
+        method = holder.getInstance(WORKER_ID, SCRIPT_NAME).process
+        ns = best_ns(lambda: method(item), args.calls, args.repeat)
+        print(f"    bound method: {ns:6.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -173,6 +173,8 @@ public class ExtraProperties {
 
         public static final String CONFIDENCE_ATTR = AUDIO_META_PREFIX + "transcriptConfidence";
 
+        public static final String TRANSCRIPT_LANGUAGE_ATTR = AUDIO_META_PREFIX + "transcriptLanguage";
+
         public static final String TIME_EVENT_ORDS = "timeEventOrds";
 
         public static final String TIME_EVENT_GROUPS = "timeEventGroups";
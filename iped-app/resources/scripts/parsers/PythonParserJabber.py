@@ -11,8 +11,6 @@
 from org.apache.tika.metadata import Metadata, Message, TikaCoreProperties
 from org.apache.tika.exception import TikaException
 from org.apache.tika.extractor import EmbeddedDocumentExtractor
-from org.apache.tika.sax import EmbeddedContentHandler
-from org.apache.tika.parser.html import HtmlParser
 from iped.properties import ExtraProperties
 from iped.properties import BasicProps
 from iped.parsers.standard import StandardParser
@@ -24,9 +22,134 @@
 import os
 import re
 import sys
-from bs4 import BeautifulSoup
-from bs4.element import NavigableString, Tag
 from datetime import datetime, tzinfo
+from html.parser import HTMLParser
+
+
+class LineText(str):
+    '''
+    Text of a log line element.
+    '''
+    name = None
+
+    @property
+    def text(self):
+        return str(self)
+
+    @property
+    def next_sibling(self):
+        return self.parent.child(self.position + 1)
+
+
+class LineElement:
+    '''
+    Element of a log line, with the few BeautifulSoup Tag features used by the parser.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.parent = None
+        self.position = 0
+        self.children = []
+
+    def append(self, node):
+        node.parent = self
+        node.position = len(self.children)
+        self.children.append(node)
+        return node
+
+    def child(self, position):
+        return self.children[position] if position < len(self.children) else None
+
+    @property
+    def next_sibling(self):
+        return self.parent.child(self.position + 1) if self.parent else None
+
+    @property
+    def text(self):
+        return "".join(child.text for child in self.children)
+
+    def find(self, name):
+        for child in self.children:
+            if child.name is not None:
+                if child.name == name:
+                    return child
+                found = child.find(name)
+                if found:
+                    return found
+        return None
+
+
+class LogLineParser(HTMLParser):
+    '''
+    Tokenizes each line of the pidgin html log into a small element tree, built like the
+    BeautifulSoup "html.parser" tree of the line, without keeping the whole file in memory.
+    '''
+    void_tags = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+    ascii_spaces = str.maketrans("", "", " \n\t\x0c\r")
+    hidden_tags = {"head", "title", "script", "style"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+
+    def parseLine(self, line):
+        self.reset()
+        self.data = []
+        self.stack = [LineElement(None)]
+        self.feed(line)
+        self.close()
+        self.flush()
+        return self.stack[0]
+
+    def flush(self):
+        if self.data:
+            data = "".join(self.data)
+            self.data = []
+            # whitespace only strings are collapsed like BeautifulSoup does
+            if not data.translate(self.ascii_spaces):
+                data = "\n" if "\n" in data else " "
+            self.stack[-1].append(LineText(data))
+
+    def handle_starttag(self, tag, attrs):
+        self.flush()
+        element = self.stack[-1].append(LineElement(tag))
+        if tag not in self.void_tags:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.flush()
+        self.stack[-1].append(LineElement(tag))
+
+    def handle_endtag(self, tag):
+        self.flush()
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].name == tag:
+                del self.stack[i:]
+                break
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    @classmethod
+    def visibleText(cls, node):
+        '''
+        Returns the text of a line as displayed by browsers, to be indexed.
+        '''
+        if isinstance(node, LineText):
+            return node
+        if node.name == "br":
+            return "\n"
+        if node.name in cls.hidden_tags:
+            return ""
+        return "".join(cls.visibleText(child) for child in node.children)
+
+
+def decodeLine(line):
+    try:
+        return line.decode("utf-8")
+    except UnicodeDecodeError:
+        return line.decode("windows-1252", errors="replace")
+
 
 class PythonParserJabber:
     
@@ -61,8 +184,63 @@ def getSupportedTypes(self, context):
             dictionary mapping mediaTypes to a queue number
         '''    
         # return {"application/xxxxxx" : 1}
-    
-    
+
+
+    def readMessage(self, html_message, curr_tag, message_day, filedate_tz, host_system, nicknames_set):
+        '''
+        Reads the message of a log line, given its first element with the message tag.
+        '''
+        idict={}
+        curr_msg = html_message.next_sibling
+        curr_metadata = html_message
+
+        '''
+        Found some cases in which the message is contained within further tags
+        <font color="#A82F2F"><font size="2">(16:10:56)</font> <b>FIDEL:</b></font> <body>Já tá promto</body><br/>
+        '''
+        if curr_msg == ' ':
+            curr_msg = curr_msg.next_sibling
+
+        # Some messages are html formated (check line 5 of previous html code)
+        curr_msg_text = ""
+        if isinstance(curr_msg, LineElement):
+            curr_msg_text = curr_msg.text
+        elif isinstance(curr_msg, LineText):
+            block_msg = ""
+            while curr_msg.name not in [curr_tag]:
+                if curr_msg.name == "br":
+                    block_msg+="\n"
+                else:
+                    block_msg+=curr_msg.text
+                curr_msg = curr_msg.next_sibling
+                if not curr_msg:
+                    break
+            curr_msg_text = block_msg
+
+        message_sender = curr_metadata.find("b")
+        if message_sender:
+            message_sender = message_sender.text.rsplit("/",1)[0].strip(":")
+            nicknames_set.add(message_sender)
+        else:
+            '''
+            it could be a system message, such as:
+            <html><head><meta http-equiv="content-type" content="text/html; charset=UTF-8"><title>Conversation with alice@dukgo.com at 05/02/2017 16:32:47 on bob@xmpp.cm/ (jabber)</title></head><body><h3>Conversation with alice@dukgo.com at 05/02/2017 16:32:47 on bob@xmpp.cm/ (jabber)</h3>
+            <font size="2">(16:32:51)</font><b> Tentando iniciar uma conversa privada com alice@dukgo.com...</b><br/>
+            <font size="2">(16:32:52)</font><b> alice@dukgo.com ainda não foi autenticado.  Você deve <a href="https://otr-help.cypherpunks.ca/4.0.2/authenticate.php?lang=pt_BR">autenticar</a> este amigo.</b><br/>
+            '''
+            message_sender = host_system
+
+        assert message_sender
+        message_time = re.search("\d{2}:\d{2}:\d{2}",curr_metadata.text).group(0)
+        dateobj = datetime.strptime("%sT%s"%(message_day,message_time),"%d/%m/%YT%H:%M:%S")
+        idict["message_date"] = dateobj.replace(tzinfo = filedate_tz).isoformat()
+        idict["message_sender"] = message_sender
+        idict["message_text"] = curr_msg_text
+
+        assert " " not in idict.values()
+        return idict
+
+
     def parse(self, stream, handler, metadata, context):
         '''
          Parses each item found in case of the supported types.
@@ -117,96 +295,62 @@ def parse(self, stream, handler, metadata, context):
             tmpFilePath = tis.getFile().getAbsolutePath()
             origFileName = metadata.get(TikaCoreProperties.RESOURCE_NAME_KEY)
             
-            # extract text from html chat to be indexed, searched for regexes and so on...
-            HtmlParser().parse(tis, EmbeddedContentHandler(xhtml), metadata, context)
-
-            soup_list = [BeautifulSoup(x,"html.parser") for x in open(tmpFilePath,'rb').readlines()]
-            body = soup_list[0].find("body")
-            title = soup_list[0].find('title').text
-            temp_to_date = title.split(" on ",1)[0]
-            temp_client_app = title.split(" on ",1)[1].split()
-            app = temp_client_app[1].strip("(").strip(")")
-            client = temp_client_app[0].strip("/")
-            #host_system = "sistema_%s_%s"%(app,client)
-            host_system = "System"
-            participants = [client, temp_to_date.split(" at ",1)[0].split("with ",1)[1]]
-            message_day = re.search("\d{2}/\d{2}/\d{4}",temp_to_date).group(0)
-            filedate = os.path.basename(origFileName).replace(".html","").replace("BRT","")
-            filedate_tz = datetime.strptime(filedate, '%Y-%m-%d.%f%z').tzinfo
             # host_system_messages = ["arquivo","envio"]
+            host_system = "System"
             messages_list = []
-
+            nicknames_set = set()
             curr_tag = None
             possible_tags = ["span", "font"]
-            for tag in possible_tags:
-                temp = soup_list[1].find(tag)
-                if temp:
-                    curr_tag = tag
-            assert curr_tag is not None
-            title_rep = body.next_element
-            assert title_rep.name in ["h1", "h2", "h3"]
-            soup_messages = [x.find(curr_tag) for x in soup_list if x.find(curr_tag)]
-            nicknames_set = set()
-            for idx, html_message in enumerate(soup_messages):
-                idict={}
-                curr_tag = html_message.name
-                curr_msg = html_message.next_sibling
-                curr_metadata = html_message
 
-                '''
-                Found some cases in which the message is contained within further tags
-                <font color="#A82F2F"><font size="2">(16:10:56)</font> <b>FIDEL:</b></font> <body>Já tá promto</body><br/>
-                '''
-                if curr_msg == ' ':
-                    curr_msg = curr_msg.next_sibling
-
-                # Some messages are html formated (check line 5 of previous html code)
-                if isinstance(curr_msg, Tag):
-                    curr_msg_text = curr_msg.text
-                elif isinstance(curr_msg, NavigableString):
-                    curr_msg_text = curr_msg.string
-                    block_msg = ""
-                    while curr_msg.name not in [curr_tag]:
-                        if curr_msg.name == "br":
-                            block_msg+="\n"
-                        else:
-                            if isinstance(curr_msg, NavigableString):
-                                text_to_add = curr_msg.string
-                            else:
-                                text_to_add = curr_msg.text
-                            block_msg+=text_to_add
-                        curr_msg = curr_msg.next_sibling
-                        if not curr_msg:
-                            break
-                    curr_msg_text = block_msg
-                elif isinstance(curr_msg, str):
-                    curr_msg_text = curr_msg
-
-                assert isinstance(curr_metadata, Tag)
-                assert isinstance(curr_msg_text, str)
-                
-                message_sender = curr_metadata.find("b")
-                if message_sender:
-                    message_sender = message_sender.text.rsplit("/",1)[0].strip(":")
-                    nicknames_set.add(message_sender)
-                else:
-                    '''
-                    it could be a system message, such as:
-                    <html><head><meta http-equiv="content-type" content="text/html; charset=UTF-8"><title>Conversation with alice@dukgo.com at 05/02/2017 16:32:47 on bob@xmpp.cm/ (jabber)</title></head><body><h3>Conversation with alice@dukgo.com at 05/02/2017 16:32:47 on bob@xmpp.cm/ (jabber)</h3>
-                    <font size="2">(16:32:51)</font><b> Tentando iniciar uma conversa privada com alice@dukgo.com...</b><br/>
-                    <font size="2">(16:32:52)</font><b> alice@dukgo.com ainda não foi autenticado.  Você deve <a href="https://otr-help.cypherpunks.ca/4.0.2/authenticate.php?lang=pt_BR">autenticar</a> este amigo.</b><br/>
-                    '''
-                    message_sender = host_system
-
-                assert message_sender
-                message_time = re.search("\d{2}:\d{2}:\d{2}",curr_metadata.text).group(0)
-                dateobj = datetime.strptime("%sT%s"%(message_day,message_time),"%d/%m/%YT%H:%M:%S")
-                idict["message_date"] = dateobj.replace(tzinfo = filedate_tz).isoformat()
-                idict["message_sender"] = message_sender
-                idict["message_text"] = curr_msg_text
-                
-                assert " " not in idict.values()
-                messages_list.append(idict)
+            # The log is read in a single pass, line by line, the text of each line is written to be
+            # indexed, searched for regexes and so on, while the messages are extracted from it.
+            line_parser = LogLineParser()
+            pending_lines = []
+            with open(tmpFilePath, 'rb') as log_file:
+                for line_num, raw_line in enumerate(log_file):
+                    line = line_parser.parseLine(decodeLine(raw_line))
+
+                    if line_num == 0:
+                        body = line.find("body")
+                        title = line.find('title').text
+                        temp_to_date = title.split(" on ",1)[0]
+                        temp_client_app = title.split(" on ",1)[1].split()
+                        app = temp_client_app[1].strip("(").strip(")")
+                        client = temp_client_app[0].strip("/")
+                        #host_system = "sistema_%s_%s"%(app,client)
+                        participants = [client, temp_to_date.split(" at ",1)[0].split("with ",1)[1]]
+                        message_day = re.search("\d{2}/\d{2}/\d{4}",temp_to_date).group(0)
+                        filedate = os.path.basename(origFileName).replace(".html","").replace("BRT","")
+                        filedate_tz = datetime.strptime(filedate, '%Y-%m-%d.%f%z').tzinfo
+                        metadata.set(TikaCoreProperties.TITLE, title)
+
+                    line_text = LogLineParser.visibleText(line).strip()
+                    if line_text:
+                        xhtml.element("p", line_text)
+
+                    # messages tag is known after reading the first message line
+                    if curr_tag is None:
+                        pending_lines.append(line)
+                        if line_num == 0:
+                            continue
+                        for tag in possible_tags:
+                            temp = line.find(tag)
+                            if temp:
+                                curr_tag = tag
+                        assert curr_tag is not None
+                        title_rep = body.children[0] if body and body.children else None
+                        assert title_rep is not None and title_rep.name in ["h1", "h2", "h3"]
+                        message_lines = pending_lines
+                    else:
+                        message_lines = [line]
+
+                    for message_line in message_lines:
+                        html_message = message_line.find(curr_tag)
+                        if not html_message:
+                            continue
+                        messages_list.append(self.readMessage(html_message, curr_tag, message_day, filedate_tz, host_system, nicknames_set))
+
+            assert curr_tag is not None
 
             #new_messages_list = []
             msg_num = 0
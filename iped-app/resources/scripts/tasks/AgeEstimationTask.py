@@ -24,6 +24,10 @@
 batchSize = 50
 batchSizeProp = 'batchSize'
 
+# Maximum seconds a face is held waiting for a full batch ('0' means no limit)
+batchMaxWait = 60
+batchMaxWaitProp = 'batchMaxWait'
+
 # Threshold used to decide if a face is labeled in one category ('0' means the category with the highest score)
 categorizationThreshold = 0
 categorizationThresholdProp = 'categorizationThreshold'
@@ -49,16 +53,20 @@
 sidesMargin = 0.05
 
 # variables related to statistics
-classificationSuccess = 0
-classificationFail = 0
-skipHashDBFilesCount = 0
-skipDuplicatesCount = 0
-predictCount = 0
-predictTime = 0
+import PythonTaskMetrics
+metrics = PythonTaskMetrics.get('AgeEstimationTask')
+classificationSuccess = metrics.counter('Successful age estimation')
+classificationFail = metrics.counter('Failed age estimation')
+skipHashDBFilesCount = metrics.counter('Skipped age estimation by hashDBFiles')
+skipDuplicatesCount = metrics.counter('Skipped age estimation by duplicates')
+predictTimer = metrics.timer('Age estimation', 'faces')
 
 # semaphore for concurrency control
 semaphore = None
 
+# imported lazily by processing methods, preloaded once at startup
+preloadModules = ['FaceRecognitionProcess']
+
 '''
 Main class: AgeEstimationTask
 '''
@@ -68,22 +76,24 @@ class AgeEstimationTask:
     videoSubitems = False
 
     def __init__(self):
-        self.itemList = []
-        self.nextTaskList = []
         self.faceItems = []
         self.faceImages = []
 
     def isEnabled(self):
         return False if AgeEstimationTask.enabled is None else AgeEstimationTask.enabled
         
-    def processQueueEnd(self):
-        return True
+    def getBatchSize(self):
+        return batchSize
+        
+    def getBatchMaxWait(self):
+        return batchMaxWait
         
     def getConfigurables(self):
         from iped.engine.config import DefaultTaskPropertiesConfig
         return [DefaultTaskPropertiesConfig(enableProp, configFile)]
     
     def init(self, configuration):
+        metrics.start()
         # check if age estimation task is enabled
         taskConfig = configuration.getTaskConfigurable(configFile)
         if AgeEstimationTask.enabled is None:
@@ -142,7 +152,7 @@ def init(self, configuration):
 
         # load task configuration properties
         extraProps = taskConfig.getConfiguration()
-        global batchSize, categorizationThreshold, skipHashDBFiles, device, deviceError
+        global batchSize, batchMaxWait, categorizationThreshold, skipHashDBFiles, device, deviceError
 
         if extraProps.getProperty(batchSizeProp) is not None:
             try:
@@ -152,6 +162,14 @@ def init(self, configuration):
             except ValueError:
                 logger.warn("AgeEstimationTask: Invalid value for property 'batchSize': " + extraProps.getProperty(batchSizeProp))
                 logger.warn("AgeEstimationTask: Using default value for property 'batchSize': " + str(batchSize))
+        if extraProps.getProperty(batchMaxWaitProp) is not None:
+            try:
+                batchMaxWait = float(extraProps.getProperty(batchMaxWaitProp))
+                if batchMaxWait < 0:
+                    raise ValueError("AgeEstimationTask: Value for property 'batchMaxWait' must be >=0")
+            except ValueError:
+                logger.warn("AgeEstimationTask: Invalid value for property 'batchMaxWait': " + extraProps.getProperty(batchMaxWaitProp))
+                logger.warn("AgeEstimationTask: Using default value for property 'batchMaxWait': " + str(batchMaxWait))
         if extraProps.getProperty(categorizationThresholdProp) is not None:
             try:
                 categorizationThreshold = int(extraProps.getProperty(categorizationThresholdProp))
@@ -212,199 +230,173 @@ def init(self, configuration):
 
 
     def finish(self):
-        num_finishes = caseData.getCaseObject('age_estimation_num_finishes')
-        if num_finishes is None:
-            num_finishes = 0
-        num_finishes += 1
-        caseData.putCaseObject('age_estimation_num_finishes', num_finishes)
-
-        if num_finishes == numThreads:
+        if metrics.isFirstFinish():
             # clear age estimation cache
             cache.clear()
 
-            # total time to perform age estimation for faces
-            age_estimation_time = predictTime / numThreads
-
             # summary statistics
-            totClassifications = classificationSuccess + classificationFail
-            totSkipCount = skipHashDBFilesCount + skipDuplicatesCount
-            logger.info('AgeEstimationTask: Total count of files processed: ' + str(totClassifications + totSkipCount - skipDuplicatesCount))
+            success = classificationSuccess.get()
+            fail = classificationFail.get()
+            skipHashDB = skipHashDBFilesCount.get()
+            skipDuplicates = skipDuplicatesCount.get()
+            totClassifications = success + fail
+            totSkipCount = skipHashDB + skipDuplicates
+            logger.info('AgeEstimationTask: Total count of files processed: ' + str(totClassifications + totSkipCount - skipDuplicates))
 
             # statistics for files for age estimation
             if totClassifications > 0:
-                logger.info('AgeEstimationTask:  Files for age estimation: ' + str(totClassifications - skipDuplicatesCount))
-                logger.info('AgeEstimationTask:   Successful age estimation: ' + str(classificationSuccess - skipDuplicatesCount))
-                logger.info('AgeEstimationTask:   Failed age estimation: ' + str(classificationFail))
-                if predictCount > 0:
-                    logger.info('AgeEstimationTask:   Total time to perform age estimation for faces (s): ' + str(round(age_estimation_time, 3)))
-                    logger.info('AgeEstimationTask:   Faces with age estimation performed: ' + str(predictCount))
-                    logger.info('AgeEstimationTask:   Average age estimation time (ms/face): ' + str(round(age_estimation_time * 1000 / predictCount, 3)))
-                    logger.info('AgeEstimationTask:   Average age estimation throughput (faces/s): ' + str(round(predictCount / age_estimation_time)))
+                logger.info('AgeEstimationTask:  Files for age estimation: ' + str(totClassifications - skipDuplicates))
+                logger.info('AgeEstimationTask:   Successful age estimation: ' + str(success - skipDuplicates))
+                logger.info('AgeEstimationTask:   Failed age estimation: ' + str(fail))
+                if predictTimer.calls.sum() > 0:
+                    logger.info('AgeEstimationTask:   ' + predictTimer.format())
 
             # statistics for files with skipped age estimation
             if totSkipCount > 0:
                 logger.info('AgeEstimationTask:  Files with skipped age estimation: ' + str(totSkipCount))
-                logger.info('AgeEstimationTask:   Skipped age estimation by hashDBFiles: ' + str(skipHashDBFilesCount))
-                logger.info('AgeEstimationTask:   Skipped age estimation by duplicates: ' + str(skipDuplicatesCount))
+                logger.info('AgeEstimationTask:   Skipped age estimation by hashDBFiles: ' + str(skipHashDB))
+                logger.info('AgeEstimationTask:   Skipped age estimation by duplicates: ' + str(skipDuplicates))
             
 
-    def sendToNextTask(self, item):        
-        if not item.isQueueEnd() and item not in self.itemList and item not in self.nextTaskList:
-            self.javaTask.sendToNextTaskSuper(item)
-        
-        if len(self.nextTaskList) > 0:
-            localList = list(self.nextTaskList)
-            self.nextTaskList.clear()
-            for i in localList:
-                self.javaTask.sendToNextTaskSuper(i)
-            
-        if item.isQueueEnd():
-            self.javaTask.sendToNextTaskSuper(item)
-    
-
-    def isToProcessBatch(self, item):
-        size = len(self.itemList)
-        return (size >= batchSize) or (size > 0 and item.isQueueEnd())
-    
-    
+    # Returns True if the item faces were held to be processed by processBatch()
     def process(self, item):        
     
         # does not process item if any condition is met
-        if (not self.isEnabled()) or (not item.isQueueEnd() and not supported(item)) or (not item.isToAddToCase()):
-            return
+        if (not self.isEnabled()) or (not supported(item)) or (not item.isToAddToCase()):
+            return False
 
-        if not item.isQueueEnd():
-            # does not process image without faces
-            from iped.properties import ExtraProperties
-            face_count = item.getExtraAttribute(ExtraProperties.FACE_COUNT)
-            if face_count is None or face_count == 0:
-                return
+        # does not process image without faces
+        from iped.properties import ExtraProperties
+        face_count = item.getExtraAttribute(ExtraProperties.FACE_COUNT)
+        if face_count is None or face_count == 0:
+            return False
 
-            img = None
-            global classificationSuccess, classificationFail, skipHashDBFilesCount, skipDuplicatesCount
+        img = None
 
+        try:
+            # skip age estimation for faces within images with hits on IPED hashesDB database (see 'skipHashDBFiles' config property)
+            from iped.engine.task import HashDBLookupTask
+            if (skipHashDBFiles and item.getExtraAttribute(HashDBLookupTask.STATUS_ATTRIBUTE) is not None):
+                # add skip age estimation info
+                item.setExtraAttribute('faceAge:estimationStatus', 'skipped_hashdb')
+                skipHashDBFilesCount.add()
+                return False
+
+            # skip age estimation for faces within images duplicates if age estimation data exists in cache
+            # retrieve age estimation data from cache
+            age_estimation_data = cache.get(item.getHashValue())
+            if age_estimation_data is not None:
+                # age estimation data exists in cache
+                # add age estimation scores and labels
+                item.setExtraAttribute('faceAge:scores', age_estimation_data['faceAgeScores'])
+                item.setExtraAttribute('faceAge:labels', age_estimation_data['faceAgeLabels'])
+                # add face labels counts ('faceAge:count:<label>')
+                for label in age_estimation_data['faceAgeLabelsCounts']:
+                    item.setExtraAttribute('faceAge:count:' + uncapitalize(label), age_estimation_data['faceAgeLabelsCounts'][label])
+                # add the highest score for each label across faces ('faceAge:maxScore:<label>')
+                for label in age_estimation_data['faceAgeLabelsScores']:
+                    item.setExtraAttribute('faceAge:maxScore:' + uncapitalize(label), age_estimation_data['faceAgeLabelsScores'][label])
+                # add age estimation status
+                item.setExtraAttribute('faceAge:estimationStatus', 'success')
+                classificationSuccess.add()
+                skipDuplicatesCount.add()
+                return False
+            
+            logger.debug('AgeEstimationTask: Processing item: ' + item.getPath())
+            logger.debug('AgeEstimationTask: face_count: ' + str(face_count))
+
+            # handle tiff:Orientation attribute
             try:
-                # skip age estimation for faces within images with hits on IPED hashesDB database (see 'skipHashDBFiles' config property)
-                from iped.engine.task import HashDBLookupTask
-                if (skipHashDBFiles and item.getExtraAttribute(HashDBLookupTask.STATUS_ATTRIBUTE) is not None):
-                    # add skip age estimation info
-                    item.setExtraAttribute('faceAge:estimationStatus', 'skipped_hashdb')
-                    skipHashDBFilesCount += 1
-                    return
-
-                # skip age estimation for faces within images duplicates if age estimation data exists in cache
-                # retrieve age estimation data from cache
-                age_estimation_data = cache.get(item.getHashValue())
-                if age_estimation_data is not None:
-                    # age estimation data exists in cache
-                    # add age estimation scores and labels
-                    item.setExtraAttribute('faceAge:scores', age_estimation_data['faceAgeScores'])
-                    item.setExtraAttribute('faceAge:labels', age_estimation_data['faceAgeLabels'])
-                    # add face labels counts ('faceAge:count:<label>')
-                    for label in age_estimation_data['faceAgeLabelsCounts']:
-                        item.setExtraAttribute('faceAge:count:' + uncapitalize(label), age_estimation_data['faceAgeLabelsCounts'][label])
-                    # add the highest score for each label across faces ('faceAge:maxScore:<label>')
-                    for label in age_estimation_data['faceAgeLabelsScores']:
-                        item.setExtraAttribute('faceAge:maxScore:' + uncapitalize(label), age_estimation_data['faceAgeLabelsScores'][label])
-                    # add age estimation status
-                    item.setExtraAttribute('faceAge:estimationStatus', 'success')
-                    classificationSuccess += 1
-                    skipDuplicatesCount += 1
-                    return
-                
-                logger.debug('AgeEstimationTask: Processing item: ' + item.getPath())
-                logger.debug('AgeEstimationTask: face_count: ' + str(face_count))
-
-                # handle tiff:Orientation attribute
-                try:
-                    # get tiff:Orientation attribute
-                    tiff_orient = int(item.getMetadata().get("image:tiff:Orientation"))
-                except:
-                    # if item has no tiff:Orientation attribute
+                # get tiff:Orientation attribute
+                tiff_orient = int(item.getMetadata().get("image:tiff:Orientation"))
+            except:
+                # if item has no tiff:Orientation attribute
+                tiff_orient = 1
+
+            # get absolute path for image or video or quit processing if another media type
+            img_path = None
+            mediaType = item.getMediaType().toString()
+            if item.getViewFile() is not None and os.path.exists(item.getViewFile().getAbsolutePath()):
+                img_path = item.getViewFile().getAbsolutePath()
+            elif item.hasPreview():
+                from iped.engine.preview import PreviewRepositoryManager
+                img_path = PreviewRepositoryManager.get(moduleDir).readPreview(item, True).getFile().getAbsolutePath()
+
+            if mediaType.startswith('image'):
+                if img_path is not None:
                     tiff_orient = 1
-
-                # get absolute path for image or video or quit processing if another media type
-                img_path = None
-                mediaType = item.getMediaType().toString()
-                if item.getViewFile() is not None and os.path.exists(item.getViewFile().getAbsolutePath()):
-                    img_path = item.getViewFile().getAbsolutePath()
-                elif item.hasPreview():
-                    from iped.engine.preview import PreviewRepositoryManager
-                    img_path = PreviewRepositoryManager.get(moduleDir).readPreview(item, True).getFile().getAbsolutePath()
-
-                if mediaType.startswith('image'):
-                    if img_path is not None:
-                        tiff_orient = 1
-                    else:
-                        img_path = item.getTempFile().getAbsolutePath()
-                elif mediaType.startswith('video') and not AgeEstimationTask.videoSubitems:
-                    if img_path is None:
-                        return
-                else:
-                    return
-
-                # allows usage of functions defined in 'FaceRecognitionProcess'
-                import FaceRecognitionProcess
-
-                # load image
-                img = PilImage.open(img_path)
-                img = FaceRecognitionProcess.convertToRGB(img)
-                
-                # image rotation, when necessary
-                img = np.array(img)
-                img = FaceRecognitionProcess.rotateImg(img, tiff_orient)
-                img = PilImage.fromarray(img)
-
-                # get face_locations
-                face_locations = item.getExtraAttribute(ExtraProperties.FACE_LOCATIONS)
-                if face_locations is not None and len(face_locations) > 0:
-                    # iterate through face_locations
-                    for face_location in face_locations:
-                        logger.debug('AgeEstimationTask: face_location: ' + str(face_location))
-
-                        # get face locaction and image dimensions
-                        top, right, bottom, left = face_location
-                        width, height = img.size
-
-                        # calculate margins, as proportions of the face rectangle
-                        mTop = int(topMargin * (bottom - top))
-                        mBottom = int(bottomMargin * (bottom - top))
-                        mSides = int(sidesMargin * (right - left))
-
-                        # add margins, trying to include the whole person's head
-                        top = max(0, top - mTop)
-                        bottom = min(img.height, bottom + mBottom)
-                        left = max(0, left - mSides)
-                        right = min(img.width, right + mSides)
-
-                        # extract the portion of the image corresponding to the face + border
-                        face_img = img.crop((left, top, right, bottom))
-                        
-                        # add face item and face image to the corresponding lists
-                        self.faceItems.append(item)
-                        self.faceImages.append(face_img)
-                
-                self.itemList.append(item)
-                
-            except Exception as e:
-                classificationFail += 1
-                if img is None:
-                    # load image problem
-                    # add age estimation status
-                    item.setExtraAttribute('faceAge:estimationStatus', 'failed_invalid_image')
-                    logger.warn("AgeEstimationTask: 'faceAge:estimationStatus -> failed_invalid_image' for item: " + item.getPath())
                 else:
-                    # other problem
-                    # add age estimation status
-                    item.setExtraAttribute('faceAge:estimationStatus', 'failed_preprocessing')
-                    logger.warn("AgeEstimationTask: 'faceAge:estimationStatus -> failed_preprocessing' for item: " + item.getPath())
-                raise e
+                    img_path = item.getTempFile().getAbsolutePath()
+            elif mediaType.startswith('video') and not AgeEstimationTask.videoSubitems:
+                if img_path is None:
+                    return False
+            else:
+                return False
+
+            # allows usage of functions defined in 'FaceRecognitionProcess'
+            import FaceRecognitionProcess
+
+            # load image
+            img = PilImage.open(img_path)
+            img = FaceRecognitionProcess.convertToRGB(img)
+            
+            # image rotation, when necessary
+            img = np.array(img)
+            img = FaceRecognitionProcess.rotateImg(img, tiff_orient)
+            img = PilImage.fromarray(img)
+
+            # get face_locations
+            face_locations = item.getExtraAttribute(ExtraProperties.FACE_LOCATIONS)
+            if face_locations is not None and len(face_locations) > 0:
+                # iterate through face_locations
+                for face_location in face_locations:
+                    logger.debug('AgeEstimationTask: face_location: ' + str(face_location))
+
+                    # get face locaction and image dimensions
+                    top, right, bottom, left = face_location
+                    width, height = img.size
+
+                    # calculate margins, as proportions of the face rectangle
+                    mTop = int(topMargin * (bottom - top))
+                    mBottom = int(bottomMargin * (bottom - top))
+                    mSides = int(sidesMargin * (right - left))
+
+                    # add margins, trying to include the whole person's head
+                    top = max(0, top - mTop)
+                    bottom = min(img.height, bottom + mBottom)
+                    left = max(0, left - mSides)
+                    right = min(img.width, right + mSides)
+
+                    # extract the portion of the image corresponding to the face + border
+                    face_img = img.crop((left, top, right, bottom))
+                    
+                    # add face item and face image to the corresponding lists
+                    self.faceItems.append(item)
+                    self.faceImages.append(face_img)
+            
+        except Exception as e:
+            classificationFail.add()
+            if img is None:
+                # load image problem
+                # add age estimation status
+                item.setExtraAttribute('faceAge:estimationStatus', 'failed_invalid_image')
+                logger.warn("AgeEstimationTask: 'faceAge:estimationStatus -> failed_invalid_image' for item: " + item.getPath())
+            else:
+                # other problem
+                # add age estimation status
+                item.setExtraAttribute('faceAge:estimationStatus', 'failed_preprocessing')
+                logger.warn("AgeEstimationTask: 'faceAge:estimationStatus -> failed_preprocessing' for item: " + item.getPath())
+            raise e
         
+        return True
+
+
+    def processBatch(self, items):
         # process faces for age estimation
-        if self.isToProcessBatch(item):
-            processImages(self.faceItems, self.faceImages)
-            self.nextTaskList.extend(self.itemList)
-            self.itemList.clear()
+        try:
+            if len(self.faceItems) > 0:
+                processImages(self.faceItems, self.faceImages)
+        finally:
             self.faceItems.clear()
             self.faceImages.clear()
     
@@ -535,8 +527,7 @@ def processImages(itemList, imageList):
             for label in item_faces_labels_max_scores_dict:
                 itemList[i].setExtraAttribute('faceAge:maxScore:' + uncapitalize(label), item_faces_labels_max_scores_dict[label])
 
-            global classificationSuccess
-            classificationSuccess += 1
+            classificationSuccess.add()
 
             # store age estimation data in cache
             age_estimation_data = {'faceAgeScores': itemList[i].getExtraAttribute('faceAge:scores'),
@@ -558,8 +549,7 @@ def processImages(itemList, imageList):
 def makePrediction(imageList):
     logger.debug('AgeEstimationTask: Making predictions for batch of ' + str(len(imageList)) + ' faces.')
     
-    global predictCount, predictTime
-    t = time.time()
+    t = time.perf_counter_ns()
     # load model and processor
     [model, processor] = loadModelAndProcessor()
     inputs = processor(images=imageList, return_tensors="pt")
@@ -574,8 +564,7 @@ def makePrediction(imageList):
             logits = outputs.logits
             # store probabilities associated with each age class for the face
             preds = torch.nn.functional.softmax(logits, dim=1).tolist()
-            predictCount += len(imageList)
-        predictTime += time.time() - t
+        predictTimer.add(t, len(imageList))
     finally:
         if semaphore is not None:
             semaphore.release()
@@ -24,6 +24,17 @@
 from iped.utils import ImageUtil
 from iped.parsers.util import MetadataUtil
 import math
+import PythonTaskMetrics
+
+# --- Metrics shared by all processing threads ---
+metrics = PythonTaskMetrics.get('CSAMDetectorTask')
+loadImgTimer = metrics.timer('Time to load images', 'images')
+videoFramesTimer = metrics.timer('Time to get video frames', 'videos')
+frameConvTimer = metrics.timer('Time to convert video frames', 'frames')
+predictTimer = metrics.timer('Time to CSAM prediction', 'images')
+cachedCount = metrics.counter('Results found in cache')
+skippedCount = metrics.counter('Skipped items')
+failedCount = metrics.counter('Failed items')
 
 # --- Placeholders for Late Loading ---
 tf = None
@@ -69,6 +80,7 @@
 # Configurable parameters defaults
 CSAM_MODELFILE = 'tensorflow_B0_v3_1.keras'
 CSAM_BATCH_SIZE = 64
+CSAM_BATCH_MAX_WAIT = 60  # in seconds
 CSAM_MINIMUM_IMAGE_SIZE = 0  # in bytes
 CSAM_SKIP_DIMENSION = 0  # in pixels
 CSAM_SKIP_HASHDB_FILES = 'false'  # skip files with hits on IPED HashDB database
@@ -84,6 +96,7 @@
 
 CSAM_MODELFILE_PROPERTY = 'ModelFile'
 CSAM_BATCH_SIZE_PROPERTY = 'BatchSize'
+CSAM_BATCH_MAX_WAIT_PROPERTY = 'BatchMaxWait'
 CSAM_MINIMUM_IMAGE_SIZE_PROPERTY = 'MinimumImageSize'
 CSAM_SKIP_DIMENSION_PROPERTY = 'SkipDimension'
 CSAM_SKIP_HASHDB_FILES_PROPERTY = 'SkipHashDBFiles'
@@ -464,27 +477,29 @@ class CSAMDetectorTask:
     enabled = None
     
     def __init__(self):
-        self.itemList = []
-        self.nextTaskList = []
         self.imageBytes = []
         modelo_tflite = None               
 
     def isEnabled(self):
         return False if CSAMDetectorTask.enabled is None else CSAMDetectorTask.enabled
 
-    def processQueueEnd(self):
-        return True
+    def getBatchSize(self):
+        return CSAM_BATCH_SIZE
+
+    def getBatchMaxWait(self):
+        return CSAM_BATCH_MAX_WAIT
        
     def getConfigurables(self):
         from iped.engine.config import DefaultTaskPropertiesConfig
         return [DefaultTaskPropertiesConfig(PLUGIN_ENABLE_PROP, CSAM_CONFIG_FILE)]        
 
     def init(self, configuration):
-        global MOTOR_IA, CSAM_MODELFILE, CACHE, CSAM_BATCH_SIZE, CSAM_MINIMUM_IMAGE_SIZE, CSAM_SKIP_DIMENSION, CSAM_SKIP_HASHDB_FILES 
+        global MOTOR_IA, CSAM_MODELFILE, CACHE, CSAM_BATCH_SIZE, CSAM_BATCH_MAX_WAIT, CSAM_MINIMUM_IMAGE_SIZE, CSAM_SKIP_DIMENSION, CSAM_SKIP_HASHDB_FILES 
         global tf, keras, torch, nn, timm, transforms, Image, tflite, ort, np, CSAM_IMG_SIZE, ONNX_MODEL_TYPE, CSAM_CREATE_BOOKMARKS, CSAM_SKIP_HASHDB_FILES_PROPERTY
         # --- NEW VIDEO GLOBALS ---
         global CSAM_THRESHOLD, PORN_THRESHOLD, CSAM_MIN_FRAMES, PORN_MIN_FRAMES, CSAM_AMBIGUITY_MAX_HITS_PERCENTAGE, CSAM_PORN_OVERRIDE_RATIO
         
+        metrics.start()
         taskConfig = configuration.getTaskConfigurable(CSAM_CONFIG_FILE)
         
         if CSAMDetectorTask.enabled is None:
@@ -503,6 +518,7 @@ def init(self, configuration):
         if(extraProps):
             CSAM_MODELFILE = extraProps.getProperty(CSAM_MODELFILE_PROPERTY, str(CSAM_MODELFILE))
             CSAM_BATCH_SIZE = int(extraProps.getProperty(CSAM_BATCH_SIZE_PROPERTY, str(CSAM_BATCH_SIZE)))
+            CSAM_BATCH_MAX_WAIT = float(extraProps.getProperty(CSAM_BATCH_MAX_WAIT_PROPERTY, str(CSAM_BATCH_MAX_WAIT)))
             CSAM_MINIMUM_IMAGE_SIZE = int(extraProps.getProperty(CSAM_MINIMUM_IMAGE_SIZE_PROPERTY, str(CSAM_MINIMUM_IMAGE_SIZE)))
             CSAM_SKIP_DIMENSION = int(extraProps.getProperty(CSAM_SKIP_DIMENSION_PROPERTY, str(CSAM_SKIP_DIMENSION)))
             skipDBFiles = extraProps.getProperty(CSAM_SKIP_HASHDB_FILES_PROPERTY, str(CSAM_SKIP_HASHDB_FILES))
@@ -657,35 +673,32 @@ def init(self, configuration):
             createSemaphore()
         
 
+    # Returns True if the item image was held to be classified by processBatch()
     def process(self, item):
         
         logger.debug(f"CSAMDetector: called process for item {item.getPath()} {item.getId()}")
         
-        if not item.isQueueEnd() and not supported(item):
+        if not supported(item):
             logger.debug(f"CSAMDetector: Item not supported: {item.getPath()} {item.getId()}")
-            return
+            return False
 
         try:
             # don't process it again (in the report generation for example)
             csamscore = item.getExtraAttribute(CSAM_SCORE)
             if csamscore is not None:
                 logger.debug(f"CSAMDetector: Item has already csam score: {item.getPath()} {item.getId()}")
-                return                      
+                return False
             
-            isAnimationImage = False
-            isImage = False
-            isVideo = False
-            
-            if(not item.isQueueEnd()):
-                isAnimationImage = isItemAnimatedImage(item)
-                isImage = isItemImage(item)
-                isVideo = isItemVideo(item)
-        
+            isAnimationImage = isItemAnimatedImage(item)
+            isImage = isItemImage(item)
+            isVideo = isItemVideo(item)
+
             # Skip very small images in bytes
             if item.getLength() is not None and item.getLength() < CSAM_MINIMUM_IMAGE_SIZE:                
                 logger.debug(f"CSAMDetector: skipping very small image {item.getName()} {item.getLength()} bytes")
                 item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_SKIP_SIZE)                
-                return
+                skippedCount.add(1)
+                return False
 
             # Skip very small dimensions
             if(CSAM_SKIP_DIMENSION>0):
@@ -706,7 +719,8 @@ def process(self, item):
                     if(width is not None and height is not None and (width<CSAM_SKIP_DIMENSION or height<CSAM_SKIP_DIMENSION)):
                         logger.debug(f"CSAMDetector: skipping very small image {item.getName()} {width}x{height}")
                         item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_SKIP_DIMENSION)
-                        return
+                        skippedCount.add(1)
+                        return False
                 except ValueError:
                     logger.warn(f"CSAMDetector: invalid dimensions for item {item.getName()} {width_meta}x{height_meta}")                        
 
@@ -714,7 +728,8 @@ def process(self, item):
             if (CSAM_SKIP_HASHDB_FILES and item.getExtraAttribute(HashDBLookupTask.STATUS_ATTRIBUTE) is not None):
                 logger.debug(f"CSAMDetector: skipping item with HashDB hit {item.getName()}")
                 item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_SKIP_HASHDB)
-                return
+                skippedCount.add(1)
+                return False
             
             
             if item.getHash():                
@@ -737,127 +752,116 @@ def process(self, item):
                             item.setExtraAttribute('ai:csamDetector:avgConfidence', avg_conf_formatted)
                             
                         item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_SUCCESS)
-                        return
+                        cachedCount.add(1)
+                        return False
                     except (TypeError, ValueError) as err:
                         logger.info(f"CSAMDetector: Outdated cache format for hash {item.getHash()}. Reprocessing. {err}")
 
             img_tensor = None
             
-            if(not item.isQueueEnd()):
-                # Process the images normally, adding to batch
-                if(isImage and not isAnimationImage):
+            # Process the images normally, adding to batch
+            if(isImage and not isAnimationImage):
+                with loadImgTimer.time():
                     img_tensor = processar_imagem(item)            
-                    if img_tensor is None:    
-                        item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_FAIL_NO_RESULTS)
-                        logger.error(f"CSAMDetector: error processing image: {item.getName()}, id {item.getId()}")
-                        return
+                if img_tensor is None:    
+                    item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_FAIL_NO_RESULTS)
+                    failedCount.add(1)
+                    logger.error(f"CSAMDetector: error processing image: {item.getName()}, id {item.getId()}")
+                    return False
+                
+                self.imageBytes.append(img_tensor)
+                return True
+                
+            elif(isVideo or isAnimationImage):
+                # Processes videos and animated images frames immediately                
+                frames = None
+
+                t = time.perf_counter_ns()
+                viewFile = item.getViewFile()
+                if (viewFile is not None and viewFile.exists()):
+                    frames = ImageUtil.getFrames(viewFile)
+                elif item.hasPreview():
+                    logger.debug(f"CSAMDetector: no view file for video/animation {item.getPath()}")
+                    from iped.engine.preview import PreviewRepositoryManager
+                    stream = PreviewRepositoryManager.get(moduleDir).readPreview(item, False)
+                    frames = ImageUtil.getFrames(stream)
+                videoFramesTimer.add(t)
+
+                if(frames is None):
+                    logger.warn(f"CSAMDetector: no frames extracted for video/animation {item.getPath()}")
+                else:                
+                    logger.debug(f"CSAMDetector: Processing {len(frames)} frames from video file {item.getPath()}")
+
+                    predictions_array = []
+                    # Processes the frames respecting batch size
+                    for i in range(0, len(frames), CSAM_BATCH_SIZE):
+                        current_batch = frames[i : i + CSAM_BATCH_SIZE]
+                        with frameConvTimer.time(len(current_batch)):
+                            tensores = processFrameTensors(current_batch)
+                        predictions = self.fazer_predicao(tensores)
+                        predictions_array.extend(predictions)
                     
-                    self.itemList.append(item)
-                    self.imageBytes.append(img_tensor)
+                    # 1. Calls the new function, which returns a rich object
+                    video_result = self.classify_video_with_full_scores(predictions_array)
                     
-                elif(isVideo or isAnimationImage):
-                    # Processes videos and animated images frames immediately                
-                    frames = None
-
-                    viewFile = item.getViewFile()
-                    if (viewFile is not None and viewFile.exists()):
-                        frames = ImageUtil.getFrames(viewFile)
-                    elif item.hasPreview():
-                        logger.debug(f"CSAMDetector: no view file for video/animation {item.getPath()}")
-                        from iped.engine.preview import PreviewRepositoryManager
-                        stream = PreviewRepositoryManager.get(moduleDir).readPreview(item, False)
-                        frames = ImageUtil.getFrames(stream)
-
-                    if(frames is None):
-                        logger.warn(f"CSAMDetector: no frames extracted for video/animation {item.getPath()}")
-                    else:                
-                        logger.debug(f"CSAMDetector: Processing {len(frames)} frames from video file {item.getPath()}")
-
-                        predictions_array = []
-                        # Processes the frames respecting batch size
-                        for i in range(0, len(frames), CSAM_BATCH_SIZE):
-                            current_batch = frames[i : i + CSAM_BATCH_SIZE]
-                            tensores = processFrameTensors(current_batch)
-                            predictions = self.fazer_predicao(tensores)
-                            predictions_array.extend(predictions)
-                        
-                        # 1. Calls the new function, which returns a rich object
-                        video_result = self.classify_video_with_full_scores(predictions_array)
-                        
-                        # 2. Extracts classification and risk data
-                        class_info = video_result['classification']
-                        risk_meta = video_result['risk_metadata']
-                        
-                        # 3. Uses the winning frame's probability vector for get_scores_from_prediction
-                        # This fills csam_score_formatado, porn_score_formatado, etc.
-                        results = get_scores_from_prediction(class_info['probabilities'])
-                            
-                        # 4. Sets the old attributes (scores)
-                        item.setExtraAttribute(CSAM_SCORE, results['csam_score_formatado'])
-                        item.setExtraAttribute(PORN_SCORE, results['porn_score_formatado'])
-                        item.setExtraAttribute(OTHER_SCORE, results['other_score_formatado'])
-                        
-                        # 5. Sets the category based on the hierarchical class (more reliable)
-                        item.setExtraAttribute(CSAMDETECTOR_CATEGORY, class_info['class'])
-                        
-                        # 6. Sets the NEW risk metadata attributes
-                        item.setExtraAttribute('ai:csamDetector:triggerFrame', class_info['trigger_frame_index'])
-                        
-                        # These two properties are not essential, as hitPercentage already provides what is needed
-                        #item.setExtraAttribute('ai:csamDetector:totalFrames', risk_meta['total_frames'])
-                        #item.setExtraAttribute('ai:csamDetector:hitCount', risk_meta['hit_count'])
-                        
-                        # Formats to integer percentage (0 to 100)
-                        hit_perc_formatted = int(risk_meta['hit_percentage']*100)
-                        avg_conf_formatted = int(risk_meta['avg_confidence']*100)
+                    # 2. Extracts classification and risk data
+                    class_info = video_result['classification']
+                    risk_meta = video_result['risk_metadata']
+                    
+                    # 3. Uses the winning frame's probability vector for get_scores_from_prediction
+                    # This fills csam_score_formatado, porn_score_formatado, etc.
+                    results = get_scores_from_prediction(class_info['probabilities'])
                         
-                        item.setExtraAttribute('ai:csamDetector:hitPercentage', hit_perc_formatted)
-                        item.setExtraAttribute('ai:csamDetector:avgConfidence', avg_conf_formatted)
+                    # 4. Sets the old attributes (scores)
+                    item.setExtraAttribute(CSAM_SCORE, results['csam_score_formatado'])
+                    item.setExtraAttribute(PORN_SCORE, results['porn_score_formatado'])
+                    item.setExtraAttribute(OTHER_SCORE, results['other_score_formatado'])
+                    
+                    # 5. Sets the category based on the hierarchical class (more reliable)
+                    item.setExtraAttribute(CSAMDETECTOR_CATEGORY, class_info['class'])
+                    
+                    # 6. Sets the NEW risk metadata attributes
+                    item.setExtraAttribute('ai:csamDetector:triggerFrame', class_info['trigger_frame_index'])
+                    
+                    # These two properties are not essential, as hitPercentage already provides what is needed
+                    #item.setExtraAttribute('ai:csamDetector:totalFrames', risk_meta['total_frames'])
+                    #item.setExtraAttribute('ai:csamDetector:hitCount', risk_meta['hit_count'])
+                    
+                    # Formats to integer percentage (0 to 100)
+                    hit_perc_formatted = int(risk_meta['hit_percentage']*100)
+                    avg_conf_formatted = int(risk_meta['avg_confidence']*100)
+                    
+                    item.setExtraAttribute('ai:csamDetector:hitPercentage', hit_perc_formatted)
+                    item.setExtraAttribute('ai:csamDetector:avgConfidence', avg_conf_formatted)
 
-                        # 7. Sets the success status
-                        item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_SUCCESS)
-                        
-                        # 8. Updates the cache (Using the correct hierarchical class)
-                        CACHE.put(item.getHash(), (results['csam_score_formatado'], results['porn_score_formatado'], results['other_score_formatado'], class_info['class'], class_info['trigger_frame_index'], hit_perc_formatted, avg_conf_formatted))
+                    # 7. Sets the success status
+                    item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_SUCCESS)
+                    
+                    # 8. Updates the cache (Using the correct hierarchical class)
+                    CACHE.put(item.getHash(), (results['csam_score_formatado'], results['porn_score_formatado'], results['other_score_formatado'], class_info['class'], class_info['trigger_frame_index'], hit_perc_formatted, avg_conf_formatted))
 
         except Exception as e:
             logger.error(f"CSAMDetector: exception processing item {item.getPath()} id {item.getId()}: {e}")
             item.setExtraAttribute(AI_CLASSIFICATION_STATUS_ATTR, AI_CLASSIFICATION_FAIL_NO_RESULTS)
+            failedCount.add(1)
             raise e
 
-        # Check if the batch needs to be flushed.
-        # This happens if the batch is full, or if the end of the queue is signaled.
-        if (self.isToProcessBatch(item)):
-            logger.debug(f"CSAMDetector: processing batch of {len(self.itemList)} items.")
-            self.processar_lote_de_imagens(self.itemList, self.imageBytes)
-            self.nextTaskList.extend(self.itemList)
-            self.itemList.clear()
-            self.imageBytes.clear()
-
+        return False
 
-    def sendToNextTask(self, item):
-        if not item.isQueueEnd() and item not in self.itemList and item not in self.nextTaskList:
-            self.javaTask.sendToNextTaskSuper(item)
-        
-        if len(self.nextTaskList) > 0:
-            localList = list(self.nextTaskList)
-            self.nextTaskList.clear()
-            for i in localList:
-                self.javaTask.sendToNextTaskSuper(i)
-            
-        if item.isQueueEnd():
-            self.javaTask.sendToNextTaskSuper(item)
 
-
-    def isToProcessBatch(self, item):
-        size = len(self.itemList)
-        return size >= CSAM_BATCH_SIZE or (size > 0 and item.isQueueEnd())    
+    def processBatch(self, items):
+        logger.debug(f"CSAMDetector: processing batch of {len(items)} items.")
+        try:
+            self.processar_lote_de_imagens(items, self.imageBytes)
+        finally:
+            self.imageBytes.clear()
 
 
     def finish(self):              
         global CSAM_CREATE_BOOKMARKS, CSAM_SCORE, CSAMDETECTOR_CATEGORY
         
         logger.debug("CSAMDetector: CSAM analysis finished.")                
+        metrics.log(logger)
         
         if not CSAM_CREATE_BOOKMARKS:
             return
@@ -945,6 +949,7 @@ def fazer_predicao(self, tensores):
         """Runs batch prediction, returning the full probability array."""
         global MODEL_SEMAPHORE, MOTOR_IA, DEVICE, MODELO_CARREGADO,  ONNX_INPUT_NAME, ONNX_OUTPUT_NAME
         
+        t = time.perf_counter_ns()
         try:
             if MODEL_SEMAPHORE is not None:
                 MODEL_SEMAPHORE.acquire()
@@ -1007,6 +1012,7 @@ def fazer_predicao(self, tensores):
                     return stacked_outputs # Returns direct probabilities
 
         finally:
+            predictTimer.add(t, len(tensores))
             if MODEL_SEMAPHORE is not None:
                 MODEL_SEMAPHORE.release()
 
@@ -10,6 +10,7 @@
 from PIL import Image
 import numpy as np
 import traceback
+import base64
 
 PIL.ImageFile.LOAD_TRUNCATED_IMAGES = True
 
@@ -18,6 +19,9 @@
 ping = "ping"
 video = "video"
 
+# size of face encodings, sent for all faces of an image as one line of base64 encoded float32 values
+encoding_size = 128
+
 max_files = 2000
 processed_files = 0
 
@@ -130,9 +134,8 @@ def main():
         
         face_encodings = fr.face_encodings(img, face_locations)
         
-        for i in range(num_faces):
-            for j in range(128):
-                print(str(face_encodings[i][j]), file=stdout, flush=True)
+        encodings = np.asarray(face_encodings, dtype=np.float32).tobytes()
+        print(base64.b64encode(encodings).decode('ascii'), file=stdout, flush=True)
     return
     
 if __name__ == "__main__":
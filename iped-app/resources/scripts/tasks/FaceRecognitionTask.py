@@ -7,10 +7,10 @@
 
 import os
 import time
-import subprocess
-import threading, queue
-import traceback
+import base64
+import threading
 import platform
+import SubprocessPool
 
 # configuration properties
 enableProp = 'enableFaceRecognition'
@@ -20,14 +20,13 @@
 faceDetectionModelProp = 'faceDetectionModel'
 upSamplingProp = 'upSampling'
 minSizeProp = 'minSize'
+processTimeoutProp = 'processTimeout'
 
 # External process script
 processScript = 'FaceRecognitionProcess.py'
 
 # Maximum number of face recognition processes to run simultaneously
 maxProcesses = None
-numCreatedProcs = 0
-numCreatedProcsLock = threading.Lock()
 
 from java.lang import System
 ipedRoot = System.getProperty('iped.root')
@@ -38,61 +37,27 @@
 max_size = 1024
 up_sampling = 1
 min_size = 48
+process_timeout = SubprocessPool.default_timeout
 
 firstInstance = True
-processQueue = None
+processPool = None
 cache = {}
 
-timeLock = threading.Lock()
 initLock = threading.Lock()
-detectTime = 0
-featureTime = 0
 
-def createProcessQueue():
-    global processQueue, maxProcesses
-    if processQueue is None:
+import PythonTaskMetrics
+metrics = PythonTaskMetrics.get('FaceRecognitionTask')
+detectTimer = metrics.timer('Time to detect faces', 'images')
+featureTimer = metrics.timer('Time to get face features', 'faces')
+
+def createProcessPool():
+    global processPool, maxProcesses
+    if processPool is None:
         if maxProcesses is None:
             maxProcesses = int(max(1, numThreads / 2))
-        processQueue = queue.Queue(maxProcesses)
-
-def log_stderr(proc):
-    for line in iter(proc.stderr.readline, b''):
-        if proc.poll() is not None:
-            break
-        line = line.strip()
-        if line:
-            logger.info("[FaceRecognitionTask] Process-" + str(proc.pid) + " stderr: " + line)
-    proc.stderr.close()
-
-# Start external process, check if it is alive and ping to test communication
-def createExternalProcess():
-    proc = None
-    for i in range(3):
-        if proc is None or proc.poll() is not None:
-            proc = subprocess.Popen([bin, os.path.join(ipedRoot, 'scripts', 'tasks', processScript), str(max_size), detection_model, str(up_sampling)], 
-                                    stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-        
-        if pingExternalProcess(proc):
-            from threading import Thread
-            t = Thread(target=log_stderr, args=(proc,))
-            t.daemon = True
-            t.start()
-            return proc
-        else:
-            proc.kill()
-            proc = None
-            
-    raise Exception("Error creating external face recognition process!")
-
-def pingExternalProcess(proc):
-    try:
-        print(ping, file=proc.stdin, flush=True)
-        line = proc.stdout.readline().strip()
-        if line == ping:
-            return True
-    except:
-        traceback.print_exc()
-    return False
+        args = [bin, os.path.join(ipedRoot, 'scripts', 'tasks', processScript), str(max_size), detection_model, str(up_sampling)]
+        # crashed processes are always restarted, as some images may crash them
+        processPool = SubprocessPool.SubprocessPool('FaceRecognitionTask', args, maxProcesses, logger, timeout=process_timeout, max_restarts=None, ping=ping, terminate=terminate)
 
 class FaceRecognitionTask:
 
@@ -108,6 +73,7 @@ def getConfigurables(self):
     
     # This method is executed before starting the processing of items.
     def init(self, configuration):
+        metrics.start()
         # check if face recognition task is enabled
         taskConfig = configuration.getTaskConfigurable(configFile)
         if FaceRecognitionTask.enabled is None:
@@ -184,7 +150,7 @@ def init(self, configuration):
         if maxProcesses is None and numProcs is not None:
             maxProcesses = int(numProcs)
         maxResolution = extraProps.getProperty(maxResolutionProp)
-        global max_size, detection_model, up_sampling, min_size
+        global max_size, detection_model, up_sampling, min_size, process_timeout
         if maxResolution is not None:
             max_size = int(maxResolution)
         faceDetectionModel = extraProps.getProperty(faceDetectionModelProp)
@@ -196,32 +162,18 @@ def init(self, configuration):
         minSize = extraProps.getProperty(minSizeProp)
         if minSize is not None:
             min_size = int(minSize)
+        processTimeout = extraProps.getProperty(processTimeoutProp)
+        if processTimeout is not None:
+            process_timeout = int(processTimeout)
         
-        createProcessQueue()
+        createProcessPool()
         return
             
     # It is executed after processing all items in case.
     def finish(self):
-        #terminate subprocess
-        if not processQueue.empty():
-            proc = processQueue.get(block=True)
-            if proc.poll() is None:
-                try:
-                    print(terminate, file=proc.stdin, flush=True)
-                    proc.wait(2)
-                except:
-                    proc.kill()
-                with numCreatedProcsLock:
-                    global numCreatedProcs
-                    numCreatedProcs -= 1
-        
-        with timeLock:
-            global detectTime, featureTime
-            if detectTime + featureTime >= 0:
-                logger.info('[FaceRecognitionTask] Time(s) to detect faces: ' + str(detectTime / maxProcesses))
-                logger.info('[FaceRecognitionTask] Time(s) to get face features: ' + str(featureTime / maxProcesses))
-                detectTime = -1
-                featureTime = -1
+        #terminate subprocesses
+        processPool.shutdown()
+        metrics.log(logger)
     
     # Needed because tuples cause ClassNotFoundException on java side later
     def convertTuplesToList(self, tuples):
@@ -301,82 +253,50 @@ def process(self, item):
         else:
             return
 
-        # creates process in parallel
-        numCreatedProcsLock.acquire()
-        global numCreatedProcs
-        if numCreatedProcs < maxProcesses:
-            numCreatedProcs += 1
-            numCreatedProcsLock.release()
-            proc = createExternalProcess()
-            processQueue.put(proc, block=True)
-        else:
-            numCreatedProcsLock.release()
-        
-        try:
-            proc = processQueue.get(block=True)
-            if not pingExternalProcess(proc):
-                proc.kill()
-                proc = createExternalProcess()
+        def detectFaces(proc):
+            proc.send(img_path, fp.video if isVideo else str(tiff_orient))
+            t1 = time.perf_counter_ns()
             
-            print(img_path, file=proc.stdin, flush=True)
-            if not isVideo:
-                print(str(tiff_orient), file=proc.stdin, flush=True)
-            else:
-                print(fp.video, file=proc.stdin, flush=True)
-                    
-            t1 = time.time()
-            
-            line = proc.stdout.readline().strip()
-
-            if not line:
-                time.sleep(3)
-                status = str(proc.poll())
-                logger.warn("[FaceRecognitionTask] Unexpected error from external process while processing {} ({} bytes) exit status=" + status, item.getPath(), item.getLength())
-                proc.kill()
-                proc = createExternalProcess()
-                return
-
+            line = proc.readline().strip()
             if line == imgError:
-                logger.info("[FaceRecognitionTask] Error loading image {} ({} bytes)", item.getPath(), item.getLength())
-                self.cacheResults(hash, [], [], -1)
-                return
-                
-            num_faces = int(line)
-            
-            t2 = time.time()
-            with timeLock:
-                global detectTime
-                detectTime += t2 - t1
+                return None, None
             
-            if num_faces == 0:
-                item.setExtraAttribute(ExtraProperties.FACE_COUNT, 0)
-                self.cacheResults(hash, [], [], 0)
-                return
+            num_faces = int(line)
+            detectTimer.add(t1)
+            t2 = time.perf_counter_ns()
             
             face_locations = []
             for i in range(num_faces):
-                line = proc.stdout.readline()
+                line = proc.readline()
                 face_locations.append(eval(line))
             
-            face_encodings = []
-            for i in range(num_faces):
-                encodings_list = []
-                for j in range(128):
-                    line = proc.stdout.readline()
-                    encodings_list.append(float(line))
-                np_array = np.array(encodings_list)
-                face_encodings.append(np_array)
-            
-            t3 = time.time()
-            with timeLock:
-                global featureTime
-                featureTime += t3 - t2
+            # encodings of all faces in a single float32 array
+            face_encodings = None
+            if num_faces > 0:
+                face_encodings = np.frombuffer(base64.b64decode(proc.readline()), dtype=np.float32)
+                featureTimer.add(t2, num_faces)
+            return face_locations, face_encodings
         
-        finally:
-            processQueue.put(proc, block=True)
+        # liveness of processes is checked by the pool just after failures or idle periods
+        try:
+            face_locations, face_encodings = processPool.call(detectFaces, retries=0)
+        except SubprocessPool.WorkerError:
+            logger.warn("[FaceRecognitionTask] Unexpected error from external process while processing {} ({} bytes)", item.getPath(), item.getLength())
+            return
+        
+        if face_locations is None:
+            logger.info("[FaceRecognitionTask] Error loading image {} ({} bytes)", item.getPath(), item.getLength())
+            self.cacheResults(hash, [], [], -1)
+            return
+        
+        if len(face_locations) == 0:
+            item.setExtraAttribute(ExtraProperties.FACE_COUNT, 0)
+            self.cacheResults(hash, [], [], 0)
+            return
         
         face_locations = self.convertTuplesToList(face_locations)
-        face_encodings = list(map(javaConverter.toKnnVector, face_encodings))
+        # converted to java at once and split by face in java side
+        face_encodings = javaConverter.toKnnVectors(face_encodings, fp.encoding_size)
         face_count = len(face_locations)
 
         item.setExtraAttribute(ExtraProperties.FACE_LOCATIONS, face_locations)
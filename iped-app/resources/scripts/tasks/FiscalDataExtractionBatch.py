@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Command line batch mode of FiscalDataExtractionTask, it is not an executable IPED task.
+
+Extracts fiscal fields from already parsed texts out of IPED, with a pool of processes using
+all cores, so improved extraction can be re-run over exported documents without reprocessing
+the case. Input is a folder of parsed texts (.txt plain text or .json positional JSON, e.g.
+exported from the parsed text cache) or a JSONL file with one document per line:
+
+    {"id": "...", "text": "...", "mediaType": "application/pdf"}
+
+'mediaType' is optional and defaults to application/pdf. Output is CSV, or Parquet if the
+output file ends with .parquet (requires pyarrow), written a row group per batch of documents.
+
+Usage:
+    python FiscalDataExtractionBatch.py <input folder or .jsonl> <output.csv|.parquet>
+                                        [--processes N] [--all] [--text-field text] [--id-field id]
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+COLUMNS = ['id', 'docType', 'remetCNPJ', 'remetName', 'remetCity', 'remetUF',
+           'destCNPJ', 'destName', 'destCity', 'destUF', 'value', 'icms', 'error']
+
+# Documents sent to the pool at a time, bounds the memory used by pending tasks
+BATCH_SIZE = 10000
+
+# Instance of the task in each pool process
+task = None
+
+
+def init_worker():
+    global task
+    from FiscalDataExtractionTask import FiscalDataExtractionTask
+    task = FiscalDataExtractionTask()
+    task.init(None)
+
+
+def process_document(doc):
+    '''
+    Extracts the fields of a document, given by ('file', path, root) or by ('jsonl', (line number, line), options).
+    Texts are read and decoded in the pool processes, so the parent just dispatches them.
+    '''
+    from FiscalDataExtractionTask import StandaloneItem
+    kind, value, options = doc
+    try:
+        if kind == 'file':
+            doc_id = os.path.relpath(value, options)
+            with open(value, 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+            media_type = "application/pdf"
+        else:
+            # documents without id or with invalid JSON are identified by the line number
+            doc_id = str(value[0])
+            text_field, id_field = options
+            obj = json.loads(value[1])
+            doc_id = str(obj.get(id_field, doc_id))
+            text = obj.get(text_field) or ''
+            media_type = obj.get('mediaType', "application/pdf")
+
+        item = StandaloneItem(doc_id, text, media_type)
+        task.process(item)
+        row = item.metadata.values
+    except Exception as e:
+        row = {'error': repr(e)}
+
+    row['id'] = doc_id
+    return row
+
+
+def read_documents(input_path, text_field, id_field):
+    if os.path.isdir(input_path):
+        for root, dirs, files in os.walk(input_path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith('.txt') or name.endswith('.json'):
+                    yield ('file', os.path.join(root, name), input_path)
+    else:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    yield ('jsonl', (line_number, line), (text_field, id_field))
+
+
+class CsvWriter:
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    '''
+    Writes a row group for the rows of each batch, so memory is bounded by BATCH_SIZE.
+    '''
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            print("[ERROR] Parquet output requires pyarrow: pip install pyarrow")
+            sys.exit(1)
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+    def flush(self):
+        if not self.rows:
+            return
+        import pyarrow
+        columns = {column: [None if row.get(column) is None else str(row[column]) for row in self.rows] for column in COLUMNS}
+        self.writer.write_table(pyarrow.Table.from_pydict(columns, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extracts fiscal data (NFe/CTe) from parsed texts with all cores.")
+    parser.add_argument("input", help="folder of .txt/.json parsed texts or .jsonl file")
+    parser.add_argument("output", help="output .csv or .parquet file")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="number of processes, default is the number of cores")
+    parser.add_argument("--all", action="store_true", help="outputs rows for non fiscal documents too")
+    parser.add_argument("--text-field", default="text", help="JSONL field with the parsed text")
+    parser.add_argument("--id-field", default="id", help="JSONL field with the document id")
+    args = parser.parse_args()
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+    writer = ParquetWriter(args.output) if args.output.lower().endswith('.parquet') else CsvWriter(args.output)
+    documents = read_documents(args.input, args.text_field, args.id_field)
+
+    total = fiscal = errors = 0
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes, initializer=init_worker) as pool:
+        while True:
+            batch = list(itertools.islice(documents, BATCH_SIZE))
+            if not batch:
+                break
+            for row in pool.imap(process_document, batch, chunksize=16):
+                total += 1
+                if row.get('error'):
+                    errors += 1
+                elif row.get('docType'):
+                    fiscal += 1
+                elif not args.all:
+                    continue
+                writer.write(row)
+            writer.flush()
+            elapsed = time.perf_counter() - start
+            print(f"[INFO] {total} documents, {fiscal} fiscal, {errors} errors, {total / elapsed:.1f} documents/s")
+    writer.close()
+
+    print(f"[INFO] Finished in {time.perf_counter() - start:.1f}s, results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@
 import re
 import json
 import os
+from bisect import bisect_left, bisect_right
 try:
     from java.lang import System
 except ImportError:
@@ -20,17 +21,138 @@ def getProperty(self, key): return ""
 except:
     # Fallback for testing
     class ExtraProperties:
+        # Same values of the java class, also used by processView() out of the JVM
         FISCAL_DOCTYPE = "fiscal:docType"
-        FISCAL_REMET_CNPJ = "fiscal:remetCNPJ"
+        FISCAL_REMET_CNPJ = "fiscal:remetCnpj"
         FISCAL_REMET_NAME = "fiscal:remetName"
-        FISCAL_DEST_CNPJ = "fiscal:destCNPJ"
+        FISCAL_DEST_CNPJ = "fiscal:destCnpj"
         FISCAL_DEST_NAME = "fiscal:destName"
         FISCAL_VALUE = "fiscal:value"
         FISCAL_ICMS = "fiscal:icms"
         FISCAL_REMET_CITY = "fiscal:remetCity"
-        FISCAL_REMET_UF = "fiscal:remetUF"
+        FISCAL_REMET_UF = "fiscal:remetUf"
         FISCAL_DEST_CITY = "fiscal:destCity"
-        FISCAL_DEST_UF = "fiscal:destUF"
+        FISCAL_DEST_UF = "fiscal:destUf"
+
+# Metadata key of each extracted field, in the order they are set
+METADATA_KEYS = {
+    'docType': ExtraProperties.FISCAL_DOCTYPE,
+    'remetCNPJ': ExtraProperties.FISCAL_REMET_CNPJ,
+    'remetName': ExtraProperties.FISCAL_REMET_NAME,
+    'destCNPJ': ExtraProperties.FISCAL_DEST_CNPJ,
+    'destName': ExtraProperties.FISCAL_DEST_NAME,
+    'value': ExtraProperties.FISCAL_VALUE,
+    'icms': ExtraProperties.FISCAL_ICMS,
+    'remetCity': ExtraProperties.FISCAL_REMET_CITY,
+    'remetUF': ExtraProperties.FISCAL_REMET_UF,
+    'destCity': ExtraProperties.FISCAL_DEST_CITY,
+    'destUF': ExtraProperties.FISCAL_DEST_UF,
+}
+
+# Category of each document type
+CATEGORIES = {
+    "NFe": "Tax Invoices",
+    "CTe": "Eletronic Transport Documents",
+}
+
+# Media types processed, generic PDFs or already typed NFe/CTe
+MEDIA_TYPES = ("application/pdf", "application/x-nfe+pdf", "application/x-cte+pdf")
+
+import PythonTaskMetrics
+
+import logging
+
+class StandaloneLogger:
+    """
+    Logger with the methods of the IPED (slf4j) logger used by this script,
+    used when running out of IPED.
+    """
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+    def isDebugEnabled(self):
+        return self.logger.isEnabledFor(logging.DEBUG)
+    def debug(self, msg):
+        self.logger.debug(msg)
+    def info(self, msg):
+        self.logger.info(msg)
+    def warn(self, msg):
+        self.logger.warning(msg)
+
+# Replaced by the IPED logger when running as a task
+logger = StandaloneLogger('FiscalDataExtractionTask')
+
+# Field name of each metadata key
+FIELD_OF_KEY = {key: field for field, key in METADATA_KEYS.items()}
+
+class StandaloneMetadata:
+    """
+    Metadata of StandaloneItem, keeping the first value of each field by its field name.
+    """
+    def __init__(self):
+        self.values = {}
+    def add(self, key, value):
+        self.values.setdefault(FIELD_OF_KEY.get(key, key), value)
+
+class StandaloneItem:
+    """
+    Item with the methods of the IPED item used by process(), used when running
+    out of IPED by FiscalDataExtractionBatch.py and the benchmarks.
+    """
+    def __init__(self, path, text, media_type="application/pdf"):
+        self.path = path
+        self.text = text
+        self.media_type = media_type
+        self.metadata = StandaloneMetadata()
+        self.categories = []
+    def getMediaType(self):
+        return self.media_type
+    def getParsedTextCache(self):
+        return self.text
+    def getMetadata(self):
+        return self.metadata
+    def addCategory(self, category):
+        self.categories.append(category)
+    def getPath(self):
+        return self.path
+    def getName(self):
+        return os.path.basename(self.path)
+
+metrics = PythonTaskMetrics.get('FiscalDataExtractionTask')
+checkedCount = metrics.counter('PDFs checked')
+rejectedCount = metrics.counter('PDFs rejected by pre-filter')
+decodeTimer = metrics.timer('Positional JSON decoding', 'documents')
+detectTimer = metrics.timer('Document type detection', 'documents')
+regexTimer = metrics.timer('Regex extraction', 'documents')
+spatialTimer = metrics.timer('Spatial extraction', 'documents')
+
+class SpatialIndex:
+    """
+    Positional items indexed by page and sorted by y, so the spatial finders
+    look up just the rows near a label instead of scanning all items.
+    Lookups return a superset of positions in the items list, callers still
+    apply their exact conditions.
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self.upper = [item.get('t', '').upper() for item in items]
+        pages = {}
+        for pos, item in enumerate(items):
+            pages.setdefault(item.get('p'), []).append((item.get('y'), pos))
+        self.pages = {}
+        for page, rows in pages.items():
+            rows.sort()
+            self.pages[page] = ([y for y, pos in rows], [pos for y, pos in rows])
+
+    def rows(self, page, min_y, max_y):
+        """Positions of the page items with min_y <= y <= max_y, sorted by y and then by position."""
+        ys, positions = self.pages.get(page, ((), ()))
+        return positions[bisect_left(ys, min_y):bisect_right(ys, max_y)]
+
+    def rows_in_order(self, page, min_y, max_y):
+        """Same as rows(), sorted by position in the items list."""
+        return sorted(self.rows(page, min_y, max_y))
+
 
 class FiscalDataExtractionTask:
 
@@ -41,16 +163,25 @@ def getConfigurables(self):
         return []
 
     def init(self, configuration):
-        pass
+        metrics.start()
 
     def finish(self):
-        pass
+        if metrics.isFirstFinish():
+            checked = checkedCount.get()
+            if checked > 0:
+                rejected = rejectedCount.get()
+                logger.info('FiscalDataExtractionTask: PDFs checked: ' + str(checked))
+                logger.info('FiscalDataExtractionTask: PDFs rejected by pre-filter: ' + str(rejected) +
+                            f' ({100 * rejected / checked:.1f}%)')
+            for timer in (decodeTimer, detectTimer, regexTimer, spatialTimer):
+                if timer.calls.sum() > 0:
+                    logger.info('FiscalDataExtractionTask: ' + timer.format())
 
     def _parse_cnpj(self, text):
         if not text: return None
         # Remove spaces and non-digits (except . / -)
-        clean = re.sub(r'\s+', '', text)
-        m = re.search(r'(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})', clean)
+        clean = self.WHITESPACE_REGEX.sub('', text)
+        m = self.LOOSE_CNPJ_REGEX.search(clean)
         if m: 
             val = m.group(1)
             # Add mask if missing
@@ -59,100 +190,158 @@ def _parse_cnpj(self, text):
             return val
         
         # Second attempt: handle extra spaces between digits even more aggressively
-        raw_digits = re.sub(r'[^\d]', '', text)
+        raw_digits = self.NOT_DIGIT_REGEX.sub('', text)
         if len(raw_digits) == 14:
             return f"{raw_digits[:2]}.{raw_digits[2:5]}.{raw_digits[5:8]}/{raw_digits[8:12]}-{raw_digits[12:]}"
         
         return None
 
     def process(self, item):
-        # Only process generic PDFs or already typed NFe/CTe
+        view = self.getItemView(item)
+        if view is None:
+            return
+        result = self._extract(view['mediaType'], view['text'], view['path'])
+        if result is not None:
+            self._populate_metadata(item, *result)
+
+    def getItemView(self, item):
+        """
+        Returns the media type and parsed text of the PDFs to process, or None to
+        skip the item. Also used by the out of process mode of PythonTaskProcessPool,
+        so the pre-filter runs in the JVM and rejected texts are not sent to other processes.
+        """
         # We rely on ParsingTask having extracted text
         media_type = str(item.getMediaType())
-        if not (media_type == "application/pdf" or \
-                media_type == "application/x-nfe+pdf" or \
-                media_type == "application/x-cte+pdf"):
-            return
+        if media_type not in MEDIA_TYPES:
+            return None
 
         text_cache = item.getParsedTextCache()
         if not text_cache:
-            return
+            return None
+        text = str(text_cache)
 
-        text = str(text_cache) # Get the text string
-        
+        # Most PDFs are not fiscal documents, reject them by looking just at the start of the text
+        if media_type == "application/pdf":
+            checkedCount.add(1)
+            is_json = self.JSON_START_REGEX.match(text) is not None
+            if not self._is_fiscal_candidate(self._json_first_page(text) if is_json else text, is_json):
+                rejectedCount.add(1)
+                return None
+
+        return {'path': item.getPath(), 'mediaType': media_type, 'text': text}
+
+    def processView(self, view):
+        """
+        Out of process version of process(), enabled with the processes attribute
+        in TaskInstaller.xml, so extraction of many PDFs is not limited by the GIL.
+        """
+        result = self._extract(view['mediaType'], view['text'], view['path'])
+        if result is None:
+            return None
+        doc_type, data = result
+        metadata = {METADATA_KEYS[field]: str(data[field]) for field in METADATA_KEYS if field != 'docType' and data.get(field)}
+        metadata[ExtraProperties.FISCAL_DOCTYPE] = doc_type
+        return {'metadata': metadata, 'categories': [CATEGORIES[doc_type]] if doc_type in CATEGORIES else []}
+
+    def _extract(self, media_type, text, path):
+        """
+        Returns the document type and the extracted fields of the parsed text,
+        or None if it is not a fiscal document.
+        """
+        is_json = self.JSON_START_REGEX.match(text) is not None
         
         # Try to parse as JSON for positional data
         try:
-            if text.strip().startswith("[{"):
+            if is_json:
                 
-                json_items = json.loads(text)
-                # Reconstruct text for regex compatibility
-                # Add spaces between items on same line, newlines for different lines (approx)
-                text = self._reconstruct_text_from_json(json_items)
+                # Just the first page items are decoded for the spatial extraction, only the
+                # text and y of the items of other pages are read for detection and regexes
+                with decodeTimer.time():
+                    page_2 = text.find(self.JSON_PAGE_2)
+                    json_items = json.loads(self._json_first_page(text))
+                    # Reconstruct text for regex compatibility
+                    # Add spaces between items on same line, newlines for different lines (approx)
+                    rows = [(item.get('t', ''), item.get('y', 0)) for item in json_items]
+                    if page_2 != -1:
+                        rows.extend(self._json_text_rows(text, page_2))
+                    text = self._reconstruct_text(rows)
                 
-                doc_type = self._detect_doc_type(text)
+                with detectTimer.time():
+                    doc_type = self._detect_doc_type(text)
                 if doc_type:
-                    item.getMetadata().add(ExtraProperties.FISCAL_DOCTYPE, doc_type)
-                    if doc_type == "NFe":
-                        item.addCategory("Tax Invoices")
-                    elif doc_type == "CTe":
-                        item.addCategory("Eletronic Transport Documents")
-                        
                     data = self._extract_fiscal_data_spatial(json_items, doc_type, text)
-                    print("DEBUG_FISCAL_SPATIAL: " + str(data))
-                    self._populate_metadata(item, data)
-                    return
+                    if logger.isDebugEnabled():
+                        logger.debug('FiscalDataExtractionTask: Spatial data of ' + path + ': ' + str(data))
+                    return doc_type, data
+                # Not a fiscal document, the text would be detected again below
+                return None
         except Exception as e:
-            print("DEBUG_FISCAL_ERROR: " + str(e))
-            pass
+            if logger.isDebugEnabled():
+                logger.debug('FiscalDataExtractionTask: Error extracting positional data of ' + path + ': ' + str(e))
             
-        doc_type = self._detect_doc_type(text)
+        with detectTimer.time():
+            doc_type = self._detect_doc_type(text)
         
-        if doc_type:
-            # Set Doc Type
-            item.getMetadata().add(ExtraProperties.FISCAL_DOCTYPE, doc_type)
-            
-            # Categorize
-            if doc_type == "NFe":
-                item.addCategory("Tax Invoices")
-                # item.getMetadata().set("Generico", "NFe Detected") # Debug
-            elif doc_type == "CTe":
-                item.addCategory("Eletronic Transport Documents")
-                
-            # Extract Data
+        if not doc_type:
+            return None
+
+        with regexTimer.time():
             data = self._extract_fiscal_data(text, doc_type)
-            
-            # Populate Metadata
-            # Populate Metadata
-            self._populate_metadata(item, data)
-
-    def _populate_metadata(self, item, data):
-        if data.get('remetCNPJ'):
-            item.getMetadata().add(ExtraProperties.FISCAL_REMET_CNPJ, data['remetCNPJ'])
-        if data.get('remetName'):
-            item.getMetadata().add(ExtraProperties.FISCAL_REMET_NAME, data['remetName'])
-        if data.get('destCNPJ'):
-            item.getMetadata().add(ExtraProperties.FISCAL_DEST_CNPJ, data['destCNPJ'])
-        if data.get('destName'):
-            item.getMetadata().add(ExtraProperties.FISCAL_DEST_NAME, data['destName'])
-        if data.get('value'):
-            item.getMetadata().add(ExtraProperties.FISCAL_VALUE, str(data['value']))
-        if data.get('icms'):
-            item.getMetadata().add(ExtraProperties.FISCAL_ICMS, str(data['icms']))
-        if data.get('remetCity'):
-            item.getMetadata().add(ExtraProperties.FISCAL_REMET_CITY, data['remetCity'])
-        if data.get('remetUF'):
-            item.getMetadata().add(ExtraProperties.FISCAL_REMET_UF, data['remetUF'])
-        if data.get('destCity'):
-            item.getMetadata().add(ExtraProperties.FISCAL_DEST_CITY, data['destCity'])
-        if data.get('destUF'):
-            item.getMetadata().add(ExtraProperties.FISCAL_DEST_UF, data['destUF'])
+        return doc_type, data
+
+    def _populate_metadata(self, item, doc_type, data):
+        item.getMetadata().add(ExtraProperties.FISCAL_DOCTYPE, doc_type)
+        if doc_type in CATEGORIES:
+            item.addCategory(CATEGORIES[doc_type])
+        for field, key in METADATA_KEYS.items():
+            if field != 'docType' and data.get(field):
+                item.getMetadata().add(key, str(data[field]))
+
+
+    # Bounded prefix of plain text examined by the pre-filter
+    PREFILTER_CHARS = 16384
+    # Every marker checked by _detect_doc_type contains one of these words
+    PREFILTER_MARKERS = ("auxiliar", "danfe", "dacte", "ct-e")
+    # Start of the second page in positional JSON written by PDFPositionalTextParser
+    JSON_PAGE_2 = '{"p":2,'
+    JSON_START_REGEX = re.compile(r'\s*\[\{')
+    # y and text of an item written by PDFPositionalTextParser
+    JSON_ITEM_TEXT_REGEX = re.compile(r'"y":([^,]*),"w":[^,]*,"h":[^,]*,"t":"([^"\\]*(?:\\.[^"\\]*)*)"')
+
+    def _json_first_page(self, text):
+        """
+        Returns the JSON array of the first page items. PDFPositionalTextParser
+        writes items page by page, so the array is cut before the first item of
+        page 2. If it is not found, e.g. single page PDFs, the whole text is returned.
+        """
+        end = text.find(self.JSON_PAGE_2)
+        if end == -1:
+            return text
+        return text[:end].rstrip().rstrip(',') + ']'
 
+    def _json_text_rows(self, text, start):
+        """
+        Returns (text, y) of the items after start, without decoding them.
+        """
+        for match in self.JSON_ITEM_TEXT_REGEX.finditer(text, start):
+            t = match.group(2)
+            if '\\' in t:
+                t = json.loads('"' + t + '"')
+            yield t, float(match.group(1))
+
+    def _is_fiscal_candidate(self, text, is_json):
+        """
+        Cheap check of the first page JSON array, or of a bounded prefix of
+        plain text, for the words required by _detect_doc_type.
+        """
+        prefix = text if is_json else text[:self.PREFILTER_CHARS]
+        prefix = prefix.lower()
+        return any(marker in prefix for marker in self.PREFILTER_MARKERS)
 
     def _detect_doc_type(self, text):
         text_lower = text.lower()
         # Normalize whitespace to single space to handle line breaks in headers
-        text_clean = re.sub(r'\s+', ' ', text_lower)
+        text_clean = self.WHITESPACE_REGEX.sub(' ', text_lower)
         
         if "documento auxiliar da nota fiscal" in text_clean or \
            ("danfe" in text_clean and "chave de acesso" in text_clean):
@@ -176,62 +365,79 @@ def _detect_doc_type(self, text):
                   "DANFE", "SERIE", "CONSELHEIRO", "NATUREZA", "DOCUMENTO", "AUXILIAR", "CONTA",
                   "ESTADUAL", "FEDERAL", "MUNICIPAL", "SUBTRIB", "SUBSTITUICAO", "SUBSTITUIÇÃO", "ENDEREÇO", "ENDERECO"]
 
+    # Patterns that indicate a line is NOT a company name
+    INVALID_NAME_PATTERNS = [
+        r'^S[ÉE]RIE\s*:',           # "Série:"
+        r'^NOTA\s+FISCAL',         # "NOTA FISCAL ELETRÔNICA"
+        r'^DOCUMENTO',              # "DOCUMENTO AUXILIAR"
+        r'^\d+\s*:',                # "123:"
+        r'^[A-Z]{2,4}\s*:',         # "Nº Fat:", "UF:"
+        r'^\d+\s*-\s*[A-Z]+',       # "1-SAÍDA", "0-ENTRADA"
+        r'^N[º°]\s*FAT',            # "Nº Fat:"
+        r'^CHAVE\s+DE\s+ACESSO',    # "Chave de acesso"
+        r'^PROTOCOLO',              # "Protocolo"
+        r'^INSCRI[ÇC][ÃA]O\s+ESTADUAL',  # "INSCRIÇÃO ESTADUAL"
+        r'^INSCRI\s+ESTADUAL',      # "INSCRI ESTADUAL"
+        r'^INSC\.?\s*EST\.?',       # "INSC. EST." ou "INSC EST"
+        r'^IE\s*:',                 # "IE:"
+        r'^I\.E\.',                 # "I.E."
+    ]
+
+    # Patterns compiled once when the class is loaded, instead of on every call.
+    # Skip terms are matched as whole words by a single alternation, e.g. "ROD"
+    # should match "RODOVIA" but NOT "PRODUTOS".
+    INVALID_NAME_REGEX = re.compile('|'.join(map('(?:{})'.format, INVALID_NAME_PATTERNS)))
+    SKIP_TERMS_REGEX = re.compile(r'\b(?:' + '|'.join(map(re.escape, SKIP_TERMS)) + r')\b')
+    LETTER_REGEX = re.compile(r'[A-Za-z]')
+    CITY_DASH_UF_REGEX = re.compile(r'\s-\s[A-Z]{2}\b')
+    CITY_SLASH_UF_REGEX = re.compile(r'/[A-Z]{2}\b')
+    PHONE_AREA_REGEX = re.compile(r'\(\d{2,4}\)')
+    NOT_LETTER_OR_SPACE_REGEX = re.compile(r'[^A-Za-z\s]')
+    LETTER_OR_SPACE_REGEX = re.compile(r'[A-Za-z\s]')
+    WHITESPACE_REGEX = re.compile(r'\s+')
+    NOT_DIGIT_REGEX = re.compile(r'[^\d]')
+    DIGIT_REGEX = re.compile(r'\d')
+    CNPJ_REGEX = re.compile(r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}')
+    LOOSE_CNPJ_REGEX = re.compile(r'(\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2})')
+    MONEY_REGEX = re.compile(r'(\d{1,3}(?:[.,]\d{3})*[.,]\d{2})')
+    MONEY_ONLY_REGEX = re.compile(r'^[\d.,\s]+$')
+    ONLY_DIGITS_REGEX = re.compile(r'^[\d]+$')
+    CITY_UF_VALUE_REGEX = re.compile(r'([^-]+)\s*-\s*([A-Z]{2})')
+    CITY_UF_ITEM_REGEX = re.compile(r'([A-Za-z\s]+)[/-]\s*([A-Z]{2})\b')
+
     def _is_valid_name_line(self, line):
         if not line or len(line) < 3: return False
         
         # Must contain at least one letter
-        if not re.search(r'[A-Za-z]', line):
+        if not self.LETTER_REGEX.search(line):
              return False
 
         l_upper = line.upper().strip()
         
         # Check for common invalid patterns FIRST (before skip terms)
-        # Patterns that indicate this is NOT a company name
-        invalid_patterns = [
-            r'^S[ÉE]RIE\s*:',           # "Série:"
-            r'^NOTA\s+FISCAL',         # "NOTA FISCAL ELETRÔNICA"
-            r'^DOCUMENTO',              # "DOCUMENTO AUXILIAR"
-            r'^\d+\s*:',                # "123:"
-            r'^[A-Z]{2,4}\s*:',         # "Nº Fat:", "UF:"
-            r'^\d+\s*-\s*[A-Z]+',       # "1-SAÍDA", "0-ENTRADA"
-            r'^N[º°]\s*FAT',            # "Nº Fat:"
-            r'^CHAVE\s+DE\s+ACESSO',    # "Chave de acesso"
-            r'^PROTOCOLO',              # "Protocolo"
-            r'^INSCRI[ÇC][ÃA]O\s+ESTADUAL',  # "INSCRIÇÃO ESTADUAL"
-            r'^INSCRI\s+ESTADUAL',      # "INSCRI ESTADUAL"
-            r'^INSC\.?\s*EST\.?',       # "INSC. EST." ou "INSC EST"
-            r'^IE\s*:',                 # "IE:"
-            r'^I\.E\.',                 # "I.E."
-        ]
-        for pattern in invalid_patterns:
-            if re.search(pattern, l_upper):
-                return False
+        if self.INVALID_NAME_REGEX.search(l_upper):
+            return False
         
         # Check against skip terms using word boundaries to avoid false positives
-        # Example: "ROD" should match "RODOVIA" but NOT "PRODUTOS"
-        for t in self.SKIP_TERMS:
-            # Use word boundary regex to match whole words only
-            # This prevents "ROD" from matching "PRODUTOS"
-            pattern = r'\b' + re.escape(t) + r'\b'
-            if re.search(pattern, l_upper):
-                return False
+        if self.SKIP_TERMS_REGEX.search(l_upper):
+            return False
         
         # Check against City - UF pattern (e.g., "City - UF")
-        if re.search(r'\s-\s[A-Z]{2}\b', line): 
+        if self.CITY_DASH_UF_REGEX.search(line): 
              return False
              
         # Check against City/UF pattern (e.g., "City/UF")
-        if re.search(r'/[A-Z]{2}\b', line):
+        if self.CITY_SLASH_UF_REGEX.search(line):
              return False
              
         # Check for Phone number pattern (XX)XXXX or similar
         # Handles (XX), (XXX), (XXXX) common in some prints
-        if re.search(r'\(\d{2,4}\)', line): 
+        if self.PHONE_AREA_REGEX.search(line): 
              return False
         
         # Additional validation: reject lines that are too short or look like codes
         # Reject lines that are mostly numbers or special characters
-        if len(re.sub(r'[A-Za-z\s]', '', l_upper)) > len(re.sub(r'[^A-Za-z\s]', '', l_upper)) * 0.5:
+        if len(self.LETTER_OR_SPACE_REGEX.sub('', l_upper)) > len(self.NOT_LETTER_OR_SPACE_REGEX.sub('', l_upper)) * 0.5:
             return False
              
         return True
@@ -276,8 +482,7 @@ def _extract_fiscal_data(self, text, doc_type):
     def _extract_nfe_data(self, text):
         data = {}
         
-        cnpj_pattern = r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}'
-        cnpjs = re.findall(cnpj_pattern, text)
+        cnpjs = self.CNPJ_REGEX.findall(text)
         
         
         # Name Heuristics for NFe
@@ -564,8 +769,7 @@ def _is_valid_uf(self, uf):
     def _extract_cte_data(self, text):
         data = {}
         
-        cnpj_pattern = r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}'
-        cnpjs = re.findall(cnpj_pattern, text)
+        cnpjs = self.CNPJ_REGEX.findall(text)
         
         # Regex Blocks - Multi-line safe
         # Remetente - Requires colon or newline delimiter to avoid "Remetente Nao"
@@ -573,13 +777,13 @@ def _extract_cte_data(self, text):
         if remet_block:
             block = remet_block.group(1)
             # Find CNPJ in block
-            cnpj_m = re.search(cnpj_pattern, block)
+            cnpj_m = self.CNPJ_REGEX.search(block)
             if cnpj_m: data['remetCNPJ'] = cnpj_m.group(0)
             
             # Find Name (usually first line of block or after label)
             lines = [l.strip() for l in block.splitlines() if l.strip()]
             for l in lines:
-                if not re.search(cnpj_pattern, l) and self._is_valid_name_line(l):
+                if not self.CNPJ_REGEX.search(l) and self._is_valid_name_line(l):
                     data['remetName'] = l
                     break
         
@@ -587,12 +791,12 @@ def _extract_cte_data(self, text):
         dest_block = re.search(r'(?:DESTINAT.RIO|DESTINO)[ \t]*(?:[:\r\n]|:\s*)([\s\S]{0,200}?)(?:EXPED|RECEB|TOMADOR|VALOR)', text, re.IGNORECASE)
         if dest_block:
             block = dest_block.group(1)
-            cnpj_m = re.search(cnpj_pattern, block)
+            cnpj_m = self.CNPJ_REGEX.search(block)
             if cnpj_m: data['destCNPJ'] = cnpj_m.group(0)
             
             lines = [l.strip() for l in block.splitlines() if l.strip()]
             for l in lines:
-                 if not re.search(cnpj_pattern, l) and self._is_valid_name_line(l):
+                 if not self.CNPJ_REGEX.search(l) and self._is_valid_name_line(l):
                     data['destName'] = l
                     break
 
@@ -709,7 +913,7 @@ def _extract_name_near_cnpj(self, text, cnpj):
                     
                     # If line contains a CNPJ (likely the Other Party's CNPJ), STOP searching.
                     # This prevents crossing from Destinatario block up into Remetente block.
-                    if re.search(r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}', l): 
+                    if self.CNPJ_REGEX.search(l): 
                         break
                     
                     candidates.append(l)
@@ -719,7 +923,7 @@ def _extract_name_near_cnpj(self, text, cnpj):
                 # Also try looking DOWN from CNPJ (sometimes name comes after)
                 for k in range(1, min(10, len(lines) - cnpj_line_idx - 1)):
                     l = lines[cnpj_line_idx + k]
-                    if re.search(r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}', l):
+                    if self.CNPJ_REGEX.search(l):
                         break
                     if self._is_valid_name_line(l):
                         return l
@@ -739,13 +943,14 @@ def _parse_money(self, value_str):
             return 0.0
 
     def _reconstruct_text_from_json(self, json_items):
-        # Merge items info somewhat readable text
+        return self._reconstruct_text((item.get('t', ''), item.get('y', 0)) for item in json_items)
+
+    def _reconstruct_text(self, rows):
+        # Merge (text, y) of items info somewhat readable text
         # Assuming items are sorted by Y then X or similar from parser
         sb = []
         last_y = -1
-        for item in json_items:
-            t = item.get('t', '')
-            y = item.get('y', 0)
+        for t, y in rows:
             if last_y != -1 and abs(y - last_y) > 5: # New line threshold
                 sb.append('\n')
             elif last_y != -1:
@@ -760,14 +965,18 @@ def _extract_fiscal_data_spatial(self, items, doc_type, full_text):
         items.sort(key=lambda x: (x.get('y', 0), x.get('x', 0)))
 
         # 1. Base extraction (includes Regex Swap)
-        data = self._extract_fiscal_data(full_text, doc_type)
+        with regexTimer.time():
+            data = self._extract_fiscal_data(full_text, doc_type)
         
         # 2. Spatial Extraction (Raw from PDF structure)
         spatial_data = {}
-        if doc_type == "NFe":
-             spatial_data = self._extract_nfe_spatial_raw(items)
-        elif doc_type == "CTe":
-             spatial_data = self._extract_cte_spatial_raw(items)
+        with spatialTimer.time():
+            if doc_type == "NFe":
+                 spatial_data = self._extract_nfe_spatial_raw(items)
+            elif doc_type == "CTe":
+                 spatial_data = self._extract_cte_spatial_raw(items)
+        # release the indexes of this document
+        self._spatial_indexes = {}
         
         # 3. Apply Swap to Spatial Data if needed
         # IMPORTANT: The swap logic is complex and depends on NFe type (Entrada vs Saída)
@@ -851,6 +1060,7 @@ def _extract_fiscal_data_spatial(self, items, doc_type, full_text):
         return data
 
     def _extract_cte_spatial_raw(self, items):
+        self._spatial_indexes = {}
         spatial_data = {}
         import re
         
@@ -865,7 +1075,7 @@ def _extract_cte_spatial_raw(self, items):
         if origem_label:
             val = self._find_text_below(items, origem_label, type="value", max_offset_y=50)
             if val:
-                m = re.match(r'([^-]+)\s*-\s*([A-Z]{2})', val)
+                m = self.CITY_UF_VALUE_REGEX.match(val)
                 if m:
                     spatial_data['remetCity'] = m.group(1).strip()
                     spatial_data['remetUF'] = m.group(2).strip()
@@ -874,7 +1084,7 @@ def _extract_cte_spatial_raw(self, items):
         if destino_label:
             val = self._find_text_below(items, destino_label, type="value", max_offset_y=50)
             if val:
-                m = re.match(r'([^-]+)\s*-\s*([A-Z]{2})', val)
+                m = self.CITY_UF_VALUE_REGEX.match(val)
                 if m:
                     spatial_data['destCity'] = m.group(1).strip()
                     spatial_data['destUF'] = m.group(2).strip()
@@ -937,7 +1147,7 @@ def _extract_cte_spatial_raw(self, items):
                       
                       if val:
                           # Try to parse City - UF
-                          m = re.match(r'([^-]+)\s*-\s*([A-Z]{2})', val)
+                          m = self.CITY_UF_VALUE_REGEX.match(val)
                           if m:
                               spatial_data['remetCity'] = m.group(1).strip()
                               spatial_data['remetUF'] = m.group(2).strip()
@@ -969,7 +1179,7 @@ def _extract_cte_spatial_raw(self, items):
                       if not val: val = self._find_text_right(items, mun_label, type="value")
                       
                       if val:
-                          m = re.match(r'([^-]+)\s*-\s*([A-Z]{2})', val)
+                          m = self.CITY_UF_VALUE_REGEX.match(val)
                           if m:
                               spatial_data['destCity'] = m.group(1).strip()
                               spatial_data['destUF'] = m.group(2).strip()
@@ -1001,7 +1211,7 @@ def _extract_cte_spatial_raw(self, items):
             # Check for "ICMS Outra UF [value]" pattern - value on same line
             if "ICMS" in t and "OUTRA" in t:
                 # Try to extract money value from the same text
-                m = re.search(r'(\d{1,3}(?:[.,]\d{3})*[.,]\d{2})', t)
+                m = self.MONEY_REGEX.search(t)
                 if m:
                     icms_from_same_line = m.group(1)
                 else:
@@ -1026,7 +1236,7 @@ def _extract_cte_spatial_raw(self, items):
                 # Must be to the right, on same row (or slightly below), and within reasonable distance
                 if ix > lx and abs(iy - ly) < 15 and (ix - lx) < 300:
                     # Check if it's a money value
-                    if re.search(r'^[\d.,\s]+$', t) and len(t) > 2:
+                    if self.MONEY_ONLY_REGEX.search(t) and len(t) > 2:
                         candidates.append((ix, item))
             
             if candidates:
@@ -1041,6 +1251,7 @@ def _extract_cte_spatial_raw(self, items):
 
         return spatial_data
     def _extract_nfe_spatial_raw(self, items):
+        self._spatial_indexes = {}
         spatial_data = {}
         import re
         
@@ -1124,12 +1335,12 @@ def _extract_nfe_spatial_raw(self, items):
                 # Search from emit_y to emit_y + 100, aligned with emit block (x near emit_x)
                 if iy > emit_y and iy < emit_y + 100 and abs(ix - emit_x) < 100:
                     t = item.get('t', '')
-                    m = re.search(r'([A-Za-z\s]+)[/-]\s*([A-Z]{2})\b', t)
+                    m = self.CITY_UF_ITEM_REGEX.search(t)
                     if m and len(m.group(1).strip()) > 2:
                         city = m.group(1).strip()
                         uf = m.group(2)
                         if "CEP" in t.upper() or "FOLHA" in t.upper(): continue
-                        if re.match(r'^[\d]+$', city): continue
+                        if self.ONLY_DIGITS_REGEX.match(city): continue
                         spatial_data['remetCity'] = city
                         spatial_data['remetUF'] = uf
                         found_city = True
@@ -1262,13 +1473,13 @@ def _extract_nfe_spatial_raw(self, items):
                     iy = item.get('y', 0)
                     if iy > dest_y + 10 and iy < dest_y + 120:
                         t = item.get('t', '')
-                        m = re.search(r'([A-Za-z\s]+)[/-]\s*([A-Z]{2})\b', t)
+                        m = self.CITY_UF_ITEM_REGEX.search(t)
                         if m and len(m.group(1).strip()) > 2:
                             city = m.group(1).strip()
                             uf = m.group(2)
                             if city == spatial_data.get('remetCity'): continue
                             if "CEP" in t.upper() or "FOLHA" in t.upper(): continue
-                            if re.match(r'^[\d]+$', city): continue
+                            if self.ONLY_DIGITS_REGEX.match(city): continue
                             spatial_data['destCity'] = city
                             spatial_data['destUF'] = uf
                             found_dest_city = True
@@ -1309,26 +1520,36 @@ def _find_label_check_top(self, items):
         # Check for simple "EMITENTE" label near top of page 1
         return self._find_label_rect(items, ["EMITENTE"], [], max_y=300)
 
+    def _spatial_index(self, items):
+        # Indexes are cached per items list while a document is extracted.
+        # The index references the list, so its id is not reused meanwhile.
+        indexes = getattr(self, '_spatial_indexes', None)
+        if indexes is None:
+            indexes = self._spatial_indexes = {}
+        index = indexes.get(id(items))
+        if index is None:
+            index = SpatialIndex(items)
+            indexes[id(items)] = index
+        return index
+
     def _find_label_rect(self, items, keywords, simple_keywords, max_y=9999):
+        upper = self._spatial_index(items).upper
         # Find item containing all keywords
-        for item in items:
-            if item.get('y') > max_y: continue
-            t = item.get('t', '').upper()
+        for item, t in zip(items, upper):
             if all(k in t for k in keywords):
+                if item.get('y') > max_y: continue
                 return item
         # Fallback
         if simple_keywords:
-            for item in items:
-                if item.get('y') > max_y: continue
-                t = item.get('t', '').upper()
+            for item, t in zip(items, upper):
                 if any(k in t for k in simple_keywords):
+                    if item.get('y') > max_y: continue
                     return item
         return None
 
     def _find_all_labels(self, items, keywords):
         res = []
-        for item in items:
-            t = item.get('t', '').upper()
+        for item, t in zip(items, self._spatial_index(items).upper):
             if all(k in t for k in keywords):
                 res.append(item)
         return res
@@ -1341,13 +1562,15 @@ def _find_label_rect_in_block(self, items, parent_rect, keywords, search_depth,
         best = None
         min_dist = 9999
         
-        for item in items:
+        index = self._spatial_index(items)
+        for pos in index.rows_in_order(pp, py, py + search_depth):
+            item = items[pos]
             if item.get('p') != pp: continue
             iy = item.get('y')
             ix = item.get('x')
             
             if iy > py and iy < py + search_depth:
-                t = item.get('t', '').upper()
+                t = index.upper[pos]
                 if all(k in t for k in keywords):
                     if align_x:
                         # Stricter X check
@@ -1367,8 +1590,10 @@ def _find_text_below(self, items, label_rect, type="name", max_offset_y=150):
          label_p = label_rect.get('p')
          label_w = label_rect.get('w')
          
+         # Rows are returned sorted by y, keeping the items order for the same y
          candidates = []
-         for item in items:
+         for pos in self._spatial_index(items).rows(label_p, label_y - 6, label_y + max_offset_y + 1):
+             item = items[pos]
              if item.get('p') != label_p: continue
              iy = item.get('y')
              ix = item.get('x')
@@ -1380,8 +1605,6 @@ def _find_text_below(self, items, label_rect, type="name", max_offset_y=150):
                  if ix >= label_x - 30 and ix < label_x + label_w + 200: 
                      candidates.append(item)
          
-         candidates.sort(key=lambda i: i.get('y'))
-         
          for cand in candidates:
              t = cand.get('t', '').strip()
              if not t: continue
@@ -1396,7 +1619,7 @@ def _find_text_below(self, items, label_rect, type="name", max_offset_y=150):
                        continue
                   return t
              elif type == "money":
-                  if re.search(r'\d', t) and any(c in t for c in ",."):
+                  if self.DIGIT_REGEX.search(t) and any(c in t for c in ",."):
                        return t
              elif type == "cnpj":
                   res = self._parse_cnpj(t)
@@ -1412,7 +1635,8 @@ def _find_text_right(self, items, label_rect, max_dist_x=500, type="any"):
         best = None
         min_dist = 9999
         
-        for item in items:
+        for pos in self._spatial_index(items).rows_in_order(lp, ly - 6, ly + 6):
+            item = items[pos]
             if item.get('p') != lp: continue
             ix = item.get('x')
             iy = item.get('y')
@@ -1439,7 +1663,7 @@ def _find_text_right(self, items, label_rect, max_dist_x=500, type="any"):
                          # More lenient garbage check for values
                          if self._is_garbage(t, strict=False): continue
                      elif type == "money":
-                         if not (re.search(r'\d', t) and any(c in t for c in ",.")): continue
+                         if not (self.DIGIT_REGEX.search(t) and any(c in t for c in ",.")): continue
 
                      min_dist = dist
                      best = item
@@ -1447,7 +1671,7 @@ def _find_text_right(self, items, label_rect, max_dist_x=500, type="any"):
         if best:
              val = best.get('t', '').strip()
              if type == "cnpj":
-                 m = re.search(r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}', val)
+                 m = self.CNPJ_REGEX.search(val)
                  if m: return m.group(0)
              return val
         return None
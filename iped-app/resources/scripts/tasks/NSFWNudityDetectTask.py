@@ -21,13 +21,18 @@
 
 enableProp = 'enableYahooNSFWDetection'
 targetSize = (224, 224)
-videoFramesTime = 0
-arrayConvTime = 0
-predictTime = 0
-loadImgTime = 0
+import PythonTaskMetrics
+metrics = PythonTaskMetrics.get('NSFWNudityDetectTask')
+videoFramesTimer = metrics.timer('Time to get video frames', 'videos')
+arrayConvTimer = metrics.timer('Time to convert java arrays', 'frames')
+loadImgTimer = metrics.timer('Time to load images', 'images')
+predictTimer = metrics.timer('Time to NSFW prediction', 'images')
 enabled = False
 semaphore = None
 
+# imported lazily by processing methods, preloaded once at startup
+preloadModules = ['keras.preprocessing.image', 'keras.applications.imagenet_utils', 'tensorflow.keras.utils']
+
 def loadModel():
     model = caseData.getCaseObject('nsfw_model')
     if model is None:
@@ -66,19 +71,14 @@ def supported(item):
     return item.getLength() is not None and item.getLength() > 0 and (isImage(item) or isSupportedVideo(item))
 
 def convertJavaByteArray(byteArray):
-    global arrayConvTime
-    t = time.time()
-    result =  bytes(b % 256 for b in byteArray)
-    arrayConvTime += time.time() - t
-    return result
+    with arrayConvTimer.time():
+        return bytes(b % 256 for b in byteArray)
     
 def loadRawImage(input):
-    global loadImgTime 
-    t = time.time()
-    img = PilImage.open(io.BytesIO(input))
-    img = img.convert('RGB')
-    img = img.resize(targetSize, PilImage.NEAREST)
-    loadImgTime += time.time() - t
+    with loadImgTimer.time():
+        img = PilImage.open(io.BytesIO(input))
+        img = img.convert('RGB')
+        img = img.resize(targetSize, PilImage.NEAREST)
     return img
 
 '''
@@ -87,15 +87,13 @@ def loadRawImage(input):
 class NSFWNudityDetectTask:
     
     def __init__(self):
-        self.itemList = []
-        self.nextTaskList = []
         self.imageList = []
 
     def isEnabled(self):
         return enabled
         
-    def processQueueEnd(self):
-        return True
+    def getBatchSize(self):
+        return batchSize
         
     def getConfigurables(self):
         from iped.engine.config import EnableTaskProperty
@@ -103,6 +101,7 @@ def getConfigurables(self):
     
     def init(self, configuration):
         global enabled
+        metrics.start()
         enabled = configuration.getEnableTaskProperty(enableProp)
         if not enabled:
             return
@@ -113,41 +112,14 @@ def init(self, configuration):
         createSemaphore()
     
     def finish(self):
-        num_finishes = caseData.getCaseObject('num_finishes')
-        if num_finishes is None:
-            num_finishes = 0;
-        num_finishes += 1
-        caseData.putCaseObject('num_finishes', num_finishes)
-        
-        if num_finishes == numThreads:
-            logger.info('Time(s) to get video frames: ' + str(videoFramesTime / numThreads))
-            logger.info('Time(s) to convert java arrays: ' + str(arrayConvTime / numThreads))
-            logger.info('Time(s) to NSFW prediction: ' + str(predictTime / numThreads))
-            logger.info('Time(s) to load images: ' + str(loadImgTime / numThreads))
-    
-    
-    def sendToNextTask(self, item):
-        if not item.isQueueEnd() and item not in self.itemList and item not in self.nextTaskList:
-            self.javaTask.sendToNextTaskSuper(item)
-        
-        if len(self.nextTaskList) > 0:
-            localList = list(self.nextTaskList)
-            self.nextTaskList.clear()
-            for i in localList:
-                self.javaTask.sendToNextTaskSuper(i)
-            
-        if item.isQueueEnd():
-            self.javaTask.sendToNextTaskSuper(item)
-    
-    def isToProcessBatch(self, item):
-        size = len(self.itemList)
-        return size >= batchSize or (size > 0 and item.isQueueEnd())
+        metrics.log(logger)
     
     
+    # Returns True if the item image was held to be classified by processBatch()
     def process(self, item):
     
-        if not item.isQueueEnd() and not supported(item):
-            return
+        if not supported(item):
+            return False
             
         try:
             if item.getHash() is not None:
@@ -155,14 +127,14 @@ def process(self, item):
                 score = cache.get(item.getHash())
                 if score is not None:
                     item.setExtraAttribute('nsfw_nudity_score', score)
-                    return
+                    return False
             
             #print('Processing ' + item.getPath())
             img = None
             
             if isSupportedVideo(item):
                 processVideoFrames(item)
-                return
+                return False
                 
             from keras.preprocessing import image
                 
@@ -174,29 +146,29 @@ def process(self, item):
                 input = convertJavaByteArray(item.getThumb())
                 img = loadRawImage(input)
                 
-            if not item.isQueueEnd():
-                if img is None:    
-                    item.setExtraAttribute('nsfw_error', 1)
-                    return
-                from tensorflow.keras import utils
-                x = utils.img_to_array(img)
-                self.imageList.append(x)
-                self.itemList.append(item)
+            if img is None:    
+                item.setExtraAttribute('nsfw_error', 1)
+                return False
+            from tensorflow.keras import utils
+            x = utils.img_to_array(img)
+            self.imageList.append(x)
             
         except Exception as e:
             item.setExtraAttribute('nsfw_error', 2)
             raise e
-            
-        if self.isToProcessBatch(item):
-            processImages(self.imageList, self.itemList)
-            self.nextTaskList.extend(self.itemList)
-            self.itemList.clear()
+        
+        return True
+    
+    
+    def processBatch(self, items):
+        try:
+            processImages(self.imageList, items)
+        finally:
             self.imageList.clear()
     
     
 def processVideoFrames(item):
-    global videoFramesTime
-    t = time.time()
+    t = time.perf_counter_ns()
     imgFile = None
     if item.getViewFile() is not None and os.path.exists(item.getViewFile().getAbsolutePath()):
         imgFile = item.getViewFile()
@@ -204,7 +176,7 @@ def processVideoFrames(item):
         from iped.engine.preview import PreviewRepositoryManager
         imgFile = PreviewRepositoryManager.get(moduleDir).readPreview(item, True).getFile()
     frames = ImageUtil.getBmpFrames(imgFile)
-    videoFramesTime += time.time() - t 
+    videoFramesTimer.add(t)
     list = []
     scores = []
     numFrames = frames.size()
@@ -249,8 +221,7 @@ def processImages(imageList, itemList):
         cache.put(itemList[i].getHash(), score)
 
 def makePrediction(list):
-    global predictTime 
-    t = time.time()
+    t = time.perf_counter_ns()
     x = np.stack(list, axis=0)
     from keras.applications.imagenet_utils import preprocess_input
     x = preprocess_input(x)
@@ -260,7 +231,7 @@ def makePrediction(list):
             semaphore.acquire()
 
         preds = model.predict(x)
-        predictTime += time.time() - t
+        predictTimer.add(t, len(list))
         return preds
     finally:
         if semaphore is not None:
@@ -81,4 +81,40 @@ def process(self, item):
         
         # Create extra attribute/column example
         if item.getParsedTextCache() is not None and ".com" in item.getParsedTextCache().lower():
-            item.setExtraAttribute("containsDotCom", True)
\ No newline at end of file
+            item.setExtraAttribute("containsDotCom", True)
+    
+    # Optional batch processing, e.g. to run a model on many images at once.
+    # If implemented, items for which process() returns True are held and passed to this method
+    # in batches, when getBatchSize() items were held, when the first item was held for more than
+    # getBatchMaxWait() seconds or when the processing queue ends.
+    # Held items are sent to the next task after this method returns.
+    #def processBatch(self, items):
+    #    return
+    
+    # Optional, returns the max number of items passed to processBatch(). Default is 50.
+    #def getBatchSize(self):
+    #    return 50
+    
+    # Optional, returns the max seconds an item is held in a partial batch. Default is 60, 0 to disable.
+    #def getBatchMaxWait(self):
+    #    return 60
+    
+    # Optional out of process execution, used instead of process() if the task is installed with
+    # the processes="N" attribute in TaskInstaller.xml. It runs in a pool of N external processes, so
+    # CPU bound python code is not limited by the GIL, but it can't access java objects. It receives a
+    # dictionary with item properties, metadata and parsed text and returns the results to set:
+    # {'metadata': {key: values}, 'extraAttributes': {key: value}, 'categories': [category]}
+    #def processView(self, view):
+    #    if view['text'] is not None and ".com" in view['text'].lower():
+    #        return {'extraAttributes': {'containsDotCom': True}}
+    
+    # Optional, returns the item view passed to processView() or None to skip the item.
+    # Default is PythonTaskProcessPool.itemView(item), use tempFile=True to include the item temp file path.
+    #def getItemView(self, item):
+    #    import PythonTaskProcessPool
+    #    return PythonTaskProcessPool.itemView(item, text=False, tempFile=True)
+    
+    # Optional, returns the JSON serializable configuration passed to init() in the external processes,
+    # which run init() before the first item. Otherwise, init() receives None out of process.
+    #def getProcessConfig(self, configuration):
+    #    return {'minSize': configuration.getTaskConfigurable('MyConfig.txt').getConfiguration().getProperty('minSize')}
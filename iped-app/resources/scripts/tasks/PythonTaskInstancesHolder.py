@@ -13,12 +13,46 @@
     in a global variable (dictionary), ensuring that each worker
     uses a single instance of each task during processing, solving
     a problem with JEP and multithreading.
+
+    It also times the calls to script functions. The statistics are
+    sent to the IPED processing statistics when the script finishes.
+
+    Scripts can list heavy modules imported lazily by their methods in
+    a module level 'preloadModules' variable. They are imported once at
+    startup, so workers don't wait for each other on the import lock.
 """
 import importlib
+import io
+import time
+
+# Set to a script name (e.g. 'FiscalDataExtractionTask') to profile its calls with cProfile.
+# Just 1 of each PROFILE_SAMPLING calls is profiled, to reduce the overhead.
+PROFILE_SCRIPT = None
+PROFILE_SAMPLING = 100
+PROFILE_LINES = 30
+
+# Calls are counted in buckets by the bit length of their duration in microseconds
+HISTOGRAM_BUCKETS = 40
 
 # Dictionary to save workers instances per script
 INSTANCES_PER_WORKER = {}
 
+# Dictionary to cache bound methods per (worker, script, function)
+FUNCTIONS_PER_WORKER = {}
+
+# Dictionary to save call statistics per (worker, script, function): [count, total_ns, histogram].
+# Each entry is updated just by its worker thread, so no lock is needed.
+CALL_STATS_PER_WORKER = {}
+
+# Dictionary to save cProfile objects per worker of PROFILE_SCRIPT
+PROFILES_PER_WORKER = {}
+
+# Scripts whose statistics were already reported
+REPORTED_SCRIPTS = set()
+
+# Scripts whose preloadModules were already imported
+PRELOADED_SCRIPTS = set()
+
 '''
 Main class
 '''
@@ -29,18 +63,137 @@ def __init__(self):
       
     def callFunction(self, worker_id, script_name, functionName, *args):
 
-        instance = self.getInstance(worker_id, script_name)
-        
-        # Check if the instance was created successfully before proceeding
-        if instance is None:
-            self.logger.error(f"ERROR: Cannot call function '{functionName}' because instance of '{script_name}' could not be created.")
-            return None
-
-        function_to_call = getattr(instance, functionName)
+        function_to_call = FUNCTIONS_PER_WORKER.get((worker_id, script_name, functionName))
+        if function_to_call is None:
+            function_to_call = self.getFunction(worker_id, script_name, functionName)
+            if function_to_call is None:
+                return None
 
         return function_to_call(*args)
 
 
+    def getFunction(self, worker_id, script_name, functionName):
+        '''
+        Gets the bound method of the worker instance, resolving it just once.
+        The returned callable can be invoked directly from Java.
+        '''
+        key = (worker_id, script_name, functionName)
+        function = FUNCTIONS_PER_WORKER.get(key)
+        if function is None:
+            instance = self.getInstance(worker_id, script_name)
+
+            # Check if the instance was created successfully before proceeding
+            if instance is None:
+                self.logger.error(f"ERROR: Cannot call function '{functionName}' because instance of '{script_name}' could not be created.")
+                return None
+
+            function = self.timed(key, getattr(instance, functionName))
+            FUNCTIONS_PER_WORKER[key] = function
+
+        return function
+
+
+    def getProcessPoolFunction(self, worker_id, script_dir, script_name, num_processes):
+        '''
+        Gets the function processing items of the worker instance in the external
+        processes of PythonTaskProcessPool, used instead of the process() method.
+        '''
+        key = (worker_id, script_name, 'processView')
+        function = FUNCTIONS_PER_WORKER.get(key)
+        if function is None:
+            import PythonTaskProcessPool
+            PythonTaskProcessPool.logger = self.logger
+            instance = self.getInstance(worker_id, script_name)
+            pool = PythonTaskProcessPool.getPool(script_dir, script_name, num_processes, instance)
+            function = self.timed(key, lambda item: pool.process(instance, item))
+            FUNCTIONS_PER_WORKER[key] = function
+
+        return function
+
+
+    def timed(self, key, function):
+        '''
+        Wraps the function to collect its call statistics.
+        '''
+        stats = CALL_STATS_PER_WORKER.setdefault(key, [0, 0, [0] * HISTOGRAM_BUCKETS])
+        histogram = stats[2]
+        perf_counter_ns = time.perf_counter_ns
+
+        profile = None
+        if key[1] == PROFILE_SCRIPT:
+            import cProfile
+            profile = PROFILES_PER_WORKER.setdefault(key[0], cProfile.Profile())
+
+        def timed_function(*args):
+            start = perf_counter_ns()
+            try:
+                if profile is not None and stats[0] % PROFILE_SAMPLING == 0:
+                    return profile.runcall(function, *args)
+                return function(*args)
+            finally:
+                elapsed = perf_counter_ns() - start
+                stats[0] += 1
+                stats[1] += elapsed
+                histogram[min((elapsed // 1000).bit_length(), HISTOGRAM_BUCKETS - 1)] += 1
+
+        return timed_function
+
+
+    def reportStats(self, script_name, statistics):
+        '''
+        Aggregates the call statistics of all workers for the script and sends
+        them to the processing statistics. Just the first call per script reports,
+        because all items were already processed when scripts are finished.
+        '''
+        if script_name in REPORTED_SCRIPTS:
+            return
+        REPORTED_SCRIPTS.add(script_name)
+
+        aggregated = {}
+        for (worker_id, script, function_name), (count, total_ns, histogram) in list(CALL_STATS_PER_WORKER.items()):
+            if script != script_name or count == 0:
+                continue
+            agg = aggregated.setdefault(function_name, [0, 0, [0] * HISTOGRAM_BUCKETS])
+            agg[0] += count
+            agg[1] += total_ns
+            agg[2] = [a + b for a, b in zip(agg[2], histogram)]
+
+        for function_name, (count, total_ns, histogram) in aggregated.items():
+            if statistics is not None:
+                statistics.setPythonFunctionStats(script_name, function_name, count, total_ns,
+                                                  percentile(histogram, count, 0.5), percentile(histogram, count, 0.99))
+
+        if script_name == PROFILE_SCRIPT and len(PROFILES_PER_WORKER) > 0:
+            import pstats
+            out = io.StringIO()
+            profiles = list(PROFILES_PER_WORKER.values())
+            stats = pstats.Stats(profiles[0], stream=out)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+            self.logger.info(f"Sampled profile of '{script_name}':\n{out.getvalue()}")
+
+
+    def preload(self, script_name):
+        '''
+        Imports the modules listed in 'preloadModules' of the script, just once.
+        '''
+        if script_name in PRELOADED_SCRIPTS:
+            return
+        PRELOADED_SCRIPTS.add(script_name)
+
+        module = importlib.import_module(script_name)
+        for module_name in getattr(module, 'preloadModules', []):
+            start = time.perf_counter()
+            try:
+                importlib.import_module(module_name)
+            except ImportError as e:
+                # missing modules are reported by the script itself
+                self.logger.debug(f"Module '{module_name}' of '{script_name}' not preloaded: {e}")
+                continue
+            self.logger.info(f"Module '{module_name}' of '{script_name}' preloaded in {time.perf_counter() - start:.2f}s")
+
+
     def getInstance(self, worker_id, script_name):
         '''
         Gets or creates an instance, assuming module_name and class_name are the same.
@@ -69,4 +222,17 @@ def getInstance(self, worker_id, script_name):
                 self.logger.error(f"An unexpected error occurred while instantiating '{script_name}': {e}")
                 raise
             
-        return INSTANCES_PER_WORKER[worker_id][script_key]
\ No newline at end of file
+        return INSTANCES_PER_WORKER[worker_id][script_key]
+
+
+def percentile(histogram, count, fraction):
+    '''
+    Returns the upper bound in nanoseconds of the histogram bucket containing the percentile.
+    '''
+    target = fraction * count
+    accumulated = 0
+    for bucket, bucket_count in enumerate(histogram):
+        accumulated += bucket_count
+        if accumulated >= target:
+            return (1 << bucket) * 1000
+    return (1 << (len(histogram) - 1)) * 1000
\ No newline at end of file
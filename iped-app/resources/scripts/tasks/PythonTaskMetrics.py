@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+Helper module with thread safe statistics for task scripts, it is not an executable IPED task.
+
+Python modules are shared by the jep interpreters of all processing threads and '+=' on module
+globals is not atomic, so counters incremented by many threads lose updates. The accumulators
+here are backed by java LongAdder objects and report throughput using the wall clock interval
+of measured calls, instead of assuming each thread contributed equally.
+
+Usage:
+    import PythonTaskMetrics
+    metrics = PythonTaskMetrics.get('MyTask')
+    predictTimer = metrics.timer('Prediction', 'images')
+    ...
+    metrics.start() # in init(), resets the metrics of a previous processing
+    with predictTimer.time(len(images)):
+        model.predict(images)
+    metrics.counter('Failed images').add(1)
+    ...
+    metrics.log(logger) # in finish(), logs just once
+
+Scripts running out of the JVM with PythonTaskProcessPool.py also use the metrics in the external
+processes. Accumulated values are sent with each result by drainAll() and added to the metrics of
+the JVM by mergeAll(), so they are logged by finish() of the script like the ones measured in the JVM.
+"""
+import threading
+import time
+
+try:
+    from java.util.concurrent.atomic import AtomicBoolean, AtomicLong, LongAdder
+except ImportError:
+    # used out of the JVM, e.g. by scripts running standalone or in external processes
+    class LongAdder:
+        def __init__(self):
+            self.value = 0
+            self.lock = threading.Lock()
+        def add(self, value):
+            with self.lock:
+                self.value += value
+        def increment(self):
+            self.add(1)
+        def sum(self):
+            return self.value
+
+    class AtomicLong(LongAdder):
+        def get(self):
+            return self.value
+        def compareAndSet(self, expected, value):
+            with self.lock:
+                if self.value != expected:
+                    return False
+                self.value = value
+                return True
+
+    class AtomicBoolean:
+        def __init__(self):
+            self.value = False
+            self.lock = threading.Lock()
+        def getAndSet(self, value):
+            with self.lock:
+                old, self.value = self.value, value
+                return old
+
+# Calls are counted in buckets by the bit length of their duration in microseconds
+HISTOGRAM_BUCKETS = 40
+
+# Dictionary to save the metrics of each script
+METRICS = {}
+metricsLock = threading.Lock()
+
+
+def get(script_name):
+    '''
+    Gets the metrics shared by all threads of the script.
+    '''
+    with metricsLock:
+        metrics = METRICS.get(script_name)
+        if metrics is None:
+            metrics = Metrics(script_name)
+            METRICS[script_name] = metrics
+        return metrics
+
+
+def drainAll():
+    '''
+    Returns the values accumulated by all scripts since the last call, JSON serializable,
+    and resets them. Used by single threaded external processes.
+    '''
+    with metricsLock:
+        metrics_list = list(METRICS.values())
+    result = {}
+    for metrics in metrics_list:
+        values = metrics.drain()
+        if values:
+            result[metrics.script_name] = values
+    return result
+
+
+def mergeAll(values):
+    '''
+    Adds values returned by drainAll() in another process to the metrics of each script.
+    '''
+    for script_name, script_values in values.items():
+        get(script_name).merge(script_values)
+
+
+def updateMin(atomic, value):
+    current = atomic.get()
+    while (current == 0 or value < current) and not atomic.compareAndSet(current, value):
+        current = atomic.get()
+
+
+def updateMax(atomic, value):
+    current = atomic.get()
+    while value > current and not atomic.compareAndSet(current, value):
+        current = atomic.get()
+
+
+class Counter:
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.adder = LongAdder()
+
+    def add(self, value=1):
+        self.adder.add(value)
+
+    def get(self):
+        return self.adder.sum()
+
+    def isEmpty(self):
+        return self.get() == 0
+
+    def values(self):
+        return {'type': 'counter', 'value': self.get()}
+
+    def merge(self, values):
+        self.add(values['value'])
+
+    def format(self):
+        return f"{self.name}: {self.get()}"
+
+
+class Histogram:
+    '''
+    Counts values in buckets by their bit length.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.buckets = [LongAdder() for i in range(HISTOGRAM_BUCKETS)]
+
+    def add(self, value):
+        self.buckets[min(int(value).bit_length(), HISTOGRAM_BUCKETS - 1)].increment()
+
+    def count(self):
+        return sum(b.sum() for b in self.buckets)
+
+    def isEmpty(self):
+        return self.count() == 0
+
+    def values(self):
+        return {'type': 'histogram', 'buckets': [b.sum() for b in self.buckets]}
+
+    def merge(self, values):
+        for bucket, value in zip(self.buckets, values['buckets']):
+            bucket.add(value)
+
+    def percentile(self, fraction):
+        '''
+        Returns the upper bound of the bucket containing the percentile.
+        '''
+        counts = [b.sum() for b in self.buckets]
+        target = fraction * sum(counts)
+        accumulated = 0
+        for bucket, bucket_count in enumerate(counts):
+            accumulated += bucket_count
+            if accumulated >= target:
+                return 1 << bucket
+        return 1 << (HISTOGRAM_BUCKETS - 1)
+
+    def format(self):
+        return f"{self.name}: {self.count()} values, p50<{self.percentile(0.5)}, p99<{self.percentile(0.99)}"
+
+
+class Timer:
+    '''
+    Measures the time of calls processing a number of units (items, images, faces, frames...).
+    '''
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.reset()
+
+    def reset(self):
+        self.calls = LongAdder()
+        self.units = LongAdder()
+        self.nanos = LongAdder()
+        self.first_start = AtomicLong()
+        self.last_end = AtomicLong()
+        self.histogram = Histogram(self.name)
+
+    def add(self, start_ns, units=1):
+        '''
+        Accounts a call started at start_ns, a time.perf_counter_ns() value, and ended now.
+        '''
+        end = time.perf_counter_ns()
+        elapsed = end - start_ns
+        self.calls.increment()
+        self.units.add(units)
+        self.nanos.add(elapsed)
+        self.histogram.add(elapsed // 1000)
+        updateMin(self.first_start, start_ns)
+        updateMax(self.last_end, end)
+
+    def time(self, units=1):
+        return TimerContext(self, units)
+
+    def isEmpty(self):
+        return self.calls.sum() == 0
+
+    def values(self):
+        # perf_counter_ns() is a system wide monotonic clock, so start and end are comparable between processes
+        return {'type': 'timer', 'unit': self.unit, 'calls': self.calls.sum(), 'units': self.units.sum(),
+                'nanos': self.nanos.sum(), 'firstStart': self.first_start.get(), 'lastEnd': self.last_end.get(),
+                'buckets': self.histogram.values()['buckets']}
+
+    def merge(self, values):
+        self.calls.add(values['calls'])
+        self.units.add(values['units'])
+        self.nanos.add(values['nanos'])
+        self.histogram.merge(values)
+        updateMin(self.first_start, values['firstStart'])
+        updateMax(self.last_end, values['lastEnd'])
+
+    def format(self):
+        calls = self.calls.sum()
+        units = self.units.sum()
+        busy = self.nanos.sum() / 1e9
+        wall = (self.last_end.get() - self.first_start.get()) / 1e9
+        msg = f"{self.name}: {units} {self.unit} in {calls} calls, busy time {busy:.3f}s"
+        if busy > 0:
+            msg += f", {units / busy:.1f} {self.unit}/s per thread"
+        if wall > 0:
+            msg += f", {units / wall:.1f} {self.unit}/s overall"
+        if calls > 0:
+            msg += f", call time p50<{self.histogram.percentile(0.5) / 1000:.3f}ms p99<{self.histogram.percentile(0.99) / 1000:.3f}ms"
+        return msg
+
+
+class TimerContext:
+
+    def __init__(self, timer, units):
+        self.timer = timer
+        self.units = units
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *args):
+        self.timer.add(self.start, self.units)
+
+
+class Metrics:
+
+    def __init__(self, script_name):
+        self.script_name = script_name
+        self.accumulators = {}
+        self.lock = threading.Lock()
+        self.finished = AtomicBoolean()
+
+    def getOrCreate(self, name, factory):
+        accumulator = self.accumulators.get(name)
+        if accumulator is None:
+            with self.lock:
+                accumulator = self.accumulators.get(name)
+                if accumulator is None:
+                    accumulator = factory()
+                    self.accumulators[name] = accumulator
+        return accumulator
+
+    def counter(self, name):
+        return self.getOrCreate(name, lambda: Counter(name))
+
+    def histogram(self, name):
+        return self.getOrCreate(name, lambda: Histogram(name))
+
+    def timer(self, name, unit='items'):
+        return self.getOrCreate(name, lambda: Timer(name, unit))
+
+    def start(self):
+        '''
+        Called from the init() method of the script. Modules outlive a processing in the same JVM,
+        so the accumulators are reset by the first call after a finished processing.
+        '''
+        if self.finished.getAndSet(False):
+            with self.lock:
+                for accumulator in self.accumulators.values():
+                    accumulator.reset()
+
+    def drain(self):
+        '''
+        Returns the values of the accumulators not empty and resets them.
+        '''
+        with self.lock:
+            result = {}
+            for name, accumulator in self.accumulators.items():
+                if not accumulator.isEmpty():
+                    result[name] = accumulator.values()
+                    accumulator.reset()
+            return result
+
+    def merge(self, values):
+        '''
+        Adds the values returned by drain() to the accumulators with the same names.
+        '''
+        for name, accumulator_values in values.items():
+            accumulator_type = accumulator_values['type']
+            if accumulator_type == 'counter':
+                accumulator = self.counter(name)
+            elif accumulator_type == 'histogram':
+                accumulator = self.histogram(name)
+            else:
+                accumulator = self.timer(name, accumulator_values['unit'])
+            accumulator.merge(accumulator_values)
+
+    def isFirstFinish(self):
+        '''
+        Returns True just for the first call, from the finish() method of the first finished thread.
+        All items were already processed when scripts are finished, so the accumulators are complete.
+        '''
+        return not self.finished.getAndSet(True)
+
+    def log(self, logger):
+        '''
+        Logs all accumulators just once, subsequent calls do nothing.
+        '''
+        if not self.isFirstFinish():
+            return
+        for accumulator in list(self.accumulators.values()):
+            logger.info(f"[{self.script_name}] {accumulator.format()}")
@@ -0,0 +1,59 @@
+'''
+# External process used by PythonTaskProcessPool.py to run processView() of task scripts out of the JVM,
+# to bypass python GIL and allow CPU bound scripts to scale over all cores.
+# Each line received in stdin is a JSON item view, each line written in stdout is a JSON result.
+# init() of the script runs before answering the first ping, so before the first item, receiving the
+# JSON configuration returned by getProcessConfig(configuration) of the script in IPED, or None.
+# Values of PythonTaskMetrics accumulated while processing each item are sent with its result, in
+# the 'metrics' key, to be logged by IPED.
+'''
+import sys
+stdout = sys.stdout
+sys.stdout = sys.stderr
+
+import importlib
+import json
+import traceback
+
+import PythonTaskMetrics
+
+terminate = 'terminate_process'
+ping = 'ping'
+
+def main():
+    script_dir = sys.argv[1]
+    script_name = sys.argv[2]
+    config = json.loads(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    sys.path.append(script_dir)
+    module = importlib.import_module(script_name)
+    instance = getattr(module, script_name)()
+    if hasattr(instance, 'init'):
+        instance.init(config)
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if line == terminate:
+            break
+        if line == ping:
+            print(ping, file=stdout, flush=True)
+            continue
+
+        try:
+            result = instance.processView(json.loads(line))
+        except Exception as e:
+            traceback.print_exc()
+            result = {'error': repr(e)}
+
+        if result is None:
+            result = {}
+        metrics = PythonTaskMetrics.drainAll()
+        if metrics:
+            result['metrics'] = metrics
+        print(json.dumps(result), file=stdout, flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Helper module for the `PythonTask.java` Java class, it is not an executable IPED task.
+
+Runs task scripts installed with the "processes" attribute in TaskInstaller.xml out of the JVM,
+so CPU bound pure python code is not serialized by the GIL between processing threads.
+
+Items are converted to a JSON view with getItemView(item) of the script instance, or with itemView(item)
+if it is not implemented. The view is processed by processView(view) of the script in a pool of
+PythonTaskProcess.py external processes, which returns a result dictionary applied to the item:
+
+    {'metadata': {key: value or list of values}, 'extraAttributes': {key: value}, 'categories': [category]}
+
+processView() runs in another process, so it can't access java objects, just the item view.
+init() of the script also runs in each external process before the first item, receiving the JSON
+serializable configuration returned by getProcessConfig(configuration) of the script, or None.
+PythonTaskMetrics values measured in the external processes are added to the metrics of the JVM.
+External processes run the python interpreter embedded by jep, so they have the same packages.
+Scripts can set a 'processTimeout' attribute with the max seconds to process a view, the default
+is defaultTimeout. Processes timing out are restarted and the item is retried once.
+"""
+import json
+import os
+import platform
+import sys
+import threading
+
+from java.lang import System
+
+import PythonTaskMetrics
+import SubprocessPool
+
+# External process script
+processScript = 'PythonTaskProcess.py'
+
+terminate = 'terminate_process'
+ping = 'ping'
+
+ipedRoot = System.getProperty('iped.root')
+
+# Default max seconds to process an item view
+defaultTimeout = SubprocessPool.default_timeout
+
+
+def pythonExecutable():
+    '''
+    Returns the executable of the python interpreter running in the JVM. When running in jep,
+    sys.executable is not a python interpreter, so it is looked up in the python installation.
+    '''
+    if platform.system().lower() == 'windows':
+        return os.path.join(ipedRoot, 'python', 'pythonw')
+    names = ['python%d.%d' % sys.version_info[:2], 'python%d' % sys.version_info[0]]
+    for prefix in (sys.prefix, sys.base_prefix):
+        for name in names:
+            path = os.path.join(prefix, 'bin', name)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+    return 'python3'
+
+
+bin = pythonExecutable()
+
+# Dictionary to save the pool of each script
+POOLS = {}
+poolsLock = threading.Lock()
+
+
+def itemView(item, text=True, tempFile=False):
+    '''
+    Returns a JSON serializable view of the item properties, metadata and optionally
+    of its parsed text and temp file path, the latter could be expensive to create.
+    '''
+    metadata = item.getMetadata()
+    view = {
+        'id': item.getId(),
+        'name': item.getName(),
+        'path': item.getPath(),
+        'ext': item.getExt(),
+        'hash': item.getHash(),
+        'mediaType': str(item.getMediaType()),
+        'length': item.getLength(),
+        'categories': list(item.getCategorySet()),
+        'metadata': {name: list(metadata.getValues(name)) for name in metadata.names()},
+    }
+    if text:
+        textCache = item.getParsedTextCache()
+        view['text'] = str(textCache) if textCache is not None else None
+    if tempFile:
+        view['tempFile'] = item.getTempFile().getAbsolutePath()
+    return view
+
+
+def applyResult(item, result):
+    '''
+    Sets the results returned by processView() on the item.
+    '''
+    metadata = item.getMetadata()
+    for key, values in result.get('metadata', {}).items():
+        if not isinstance(values, list):
+            values = [values]
+        for value in values:
+            if value is not None:
+                metadata.add(key, str(value))
+    for key, value in result.get('extraAttributes', {}).items():
+        item.setExtraAttribute(key, value)
+    for category in result.get('categories', []):
+        item.addCategory(category)
+
+
+def getPool(script_dir, script_name, num_processes, instance):
+    with poolsLock:
+        pool = POOLS.get(script_name)
+        if pool is None:
+            config = None
+            if hasattr(instance, 'getProcessConfig'):
+                from iped.engine.config import ConfigurationManager
+                config = instance.getProcessConfig(ConfigurationManager.get())
+            timeout = getattr(instance, 'processTimeout', defaultTimeout)
+            pool = ProcessPool(script_dir, script_name, num_processes, timeout, config)
+            POOLS[script_name] = pool
+        return pool
+
+
+def shutdown(script_name):
+    with poolsLock:
+        pool = POOLS.pop(script_name, None)
+    if pool is not None:
+        pool.shutdown()
+
+
+class ProcessPool:
+
+    def __init__(self, script_dir, script_name, num_processes, timeout=defaultTimeout, config=None):
+        self.script_name = script_name
+        args = [bin, os.path.join(script_dir, processScript), script_dir, script_name, json.dumps(config)]
+        self.pool = SubprocessPool.SubprocessPool(script_name, args, num_processes, logger, timeout=timeout, ping=ping, terminate=terminate)
+
+    def process(self, instance, item):
+        '''
+        Processes the item view in the next free external process and applies the results to the item.
+        '''
+        if hasattr(instance, 'getItemView'):
+            view = instance.getItemView(item)
+        else:
+            view = itemView(item)
+        if view is None:
+            return
+        request = json.dumps(view)
+
+        def call(worker):
+            worker.send(request)
+            return worker.readline()
+
+        try:
+            line = self.pool.call(call)
+        except SubprocessPool.WorkerError:
+            logger.warn("[" + self.script_name + "] External process failed while processing " + item.getPath())
+            return
+
+        result = json.loads(line)
+        PythonTaskMetrics.mergeAll(result.pop('metrics', {}))
+        if 'error' in result:
+            logger.warn("[" + self.script_name + "] Error processing " + item.getPath() + ": " + result['error'])
+            return
+        applyResult(item, result)
+
+    def shutdown(self):
+        self.pool.shutdown()
@@ -15,6 +15,16 @@
 
 bookmarkCreated = False
 
+# regex templates used to find wallets in RegistryReport and setupapi.dev.log lines
+registryTemplate = r'{vid}.*{pid}'
+setupapiTemplate = r'Device Install.*VID_{vid}&PID_{pid}'
+
+# chars read from the item text by each call to java, instead of one call per line
+readChunkSize = 64 * 1024
+
+# line terminators of java BufferedReader.readLine()
+lineBreak = re.compile(r'\r\n|\r|\n')
+
 enableProp = 'enableSearchHardwareWallets'
 enabled = False
 
@@ -23,6 +33,8 @@
 class SearchHardwareWallets:
     
     wallets = None
+    registryMatcher = None
+    setupapiMatcher = None
 
     # Returns if this task is enabled or not. This could access options read by init() method.
     def isEnabled(self):
@@ -47,7 +59,10 @@ def init(self, configuration):
         from java.lang import System
         ipedRoot = System.getProperty('iped.root')
         with open(os.path.join(ipedRoot, 'conf', configFile)) as f:
-            SearchHardwareWallets.wallets = json.load(f)
+            wallets = json.load(f)
+        SearchHardwareWallets.registryMatcher = WalletMatcher(wallets, registryTemplate)
+        SearchHardwareWallets.setupapiMatcher = WalletMatcher(wallets, setupapiTemplate)
+        SearchHardwareWallets.wallets = wallets
         return
 
     
@@ -87,38 +102,111 @@ def process(self, item):
         subItemID = 0
         # search for setupapi.dev.log or setupapi.dev.YYYYMMDD_hhmmss.log
         setupapi_regex = regex = r'(?i)setupapi\.dev\.[0-9_\.]*log'
+        # found devices as (wallet index, line number, device info), the text is streamed line by line
+        devices = []
         if item.getName() == 'SYSTEM' + reportSuffix:
-            ParsedText = item.getParsedTextCache().split('\n')
             # search for wallet in RegistryReport
-            for w in SearchHardwareWallets.wallets:
-                regex = r'(?i).*' + str(w.get('VendorID')) + '.*' + str(w.get('ProductID')) + '.*'
-                indices = [i for i, x in enumerate(ParsedText) if re.match(regex, x)]
+            matcher = SearchHardwareWallets.registryMatcher
+            openDevices = []
+            for lineNo, line in enumerate(readLines(item)):
                 # read info for Device (until empty line)
-                for i in indices:
-                    hwInfo = ''
-                    lineNo = i
-                    while len(ParsedText[lineNo]) > 1:
-                        hwInfo += ParsedText[lineNo] + '\n'
-                        lineNo += 1
-                    newSubItem(self, item, hwInfo, subItemID, w)
-                    subItemID += 1
+                if len(line) <= 1:
+                    devices.extend(openDevices)
+                    openDevices = []
+                    continue
+                for device in openDevices:
+                    device[2].append(line)
+                for j in matcher.matches(line):
+                    openDevices.append((j, lineNo, [line]))
+            devices.extend(openDevices)
+            devices = [(j, lineNo, '\n'.join(lines) + '\n') for j, lineNo, lines in devices]
         elif re.match(setupapi_regex, item.getName()):
             ''' setupapi.dev.log examples
             >>>  [Setup online Device Install (Hardware initiated) - USB\VID_0C45&PID_64AD\6&2e9d4003&0&4]
             >>>  Section start 2014/06/26 15:43:49.248
             '''
-            ParsedText = item.getParsedTextCache().split('\n')
-            for w in SearchHardwareWallets.wallets:
-                regex = r'(?i).*Device Install.*VID_' + str(w.get('VendorID')) + '&PID_' + str(w.get('ProductID')) + '.*'
-                indices = [i for i, x in enumerate(ParsedText) if re.match(regex, x)]
-                for i in indices:
-                    # read two lines, second line contains timestamp of first seen
-                    hwInfo = ParsedText[i] + '\n'
-                    hwInfo += ParsedText[i+1]
-                    newSubItem(self, item, hwInfo, subItemID, w)
-                    subItemID += 1
+            matcher = SearchHardwareWallets.setupapiMatcher
+            previous = []
+            for lineNo, line in enumerate(readLines(item)):
+                # read two lines, second line contains timestamp of first seen
+                for j, n, first in previous:
+                    devices.append((j, n, first + '\n' + line))
+                previous = [(j, lineNo, line) for j in matcher.matches(line)]
+            for j, n, first in previous:
+                devices.append((j, n, first + '\n'))
+        else:
+            return
+
+        # Sub-items are created ordered by wallet and line, like before matching all wallets in a single
+        # pass, so their ids and names don't change. Just the matched lines are held until the end.
+        devices.sort(key=lambda device: (device[0], device[1]))
+        for j, lineNo, hwInfo in devices:
+            newSubItem(self, item, hwInfo, subItemID, matcher.wallets[j])
+            subItemID += 1
 
 
+def readLines(item):
+    '''
+    Yields the lines of the item extracted text, without loading the whole text in memory.
+    '''
+    return splitLines(readChunks(item))
+
+
+def readChunks(item):
+    '''
+    Yields the item extracted text in chunks of up to readChunkSize chars.
+    '''
+    reader = item.getTextReader()
+    if reader is None:
+        return
+    from java.nio import CharBuffer
+    buffer = CharBuffer.allocate(readChunkSize)
+    try:
+        while reader.read(buffer) != -1:
+            buffer.flip()
+            yield buffer.toString()
+            buffer.clear()
+    finally:
+        reader.close()
+
+
+def splitLines(chunks):
+    '''
+    Yields the lines of the text chunks, split like java BufferedReader.readLine().
+    '''
+    pending = ''
+    for chunk in chunks:
+        text = pending + chunk
+        # a trailing '\r' may be followed by '\n' in the next chunk
+        end = len(text) - 1 if text.endswith('\r') else len(text)
+        lines = lineBreak.split(text[:end])
+        pending = lines.pop() + text[end:]
+        yield from lines
+    if pending:
+        yield pending.rstrip('\r')
+
+
+class WalletMatcher:
+    '''
+    Finds lines matching the regex template of any wallet in a single pass.
+    The VendorID of all wallets are combined in one regex, which discards most lines
+    without testing the compiled regex of each wallet.
+    '''
+
+    def __init__(self, wallets, template):
+        self.wallets = wallets
+        self.regexes = [re.compile(r'(?i)' + template.format(vid=str(w.get('VendorID')), pid=str(w.get('ProductID')))) for w in wallets]
+        vids = '|'.join(sorted(set(str(w.get('VendorID')) for w in wallets)))
+        self.prefilter = re.compile(r'(?i)' + template.format(vid='(?:' + vids + ')', pid=''))
+
+    def matches(self, line):
+        '''
+        Returns the indexes of the wallets matching the line.
+        '''
+        if not self.prefilter.search(line):
+            return []
+        return [j for j, regex in enumerate(self.regexes) if regex.search(line)]
+
 
 def newSubItem(self, item, text, subItemID, info):
     from iped.engine.data import Item
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Helper module with a pool of external python processes for task scripts, it is not an executable IPED task.
+
+External processes are used to bypass the python GIL or to isolate native libraries. They communicate by
+text lines through stdin/stdout and must answer the ping line with the same line and exit when they receive
+the terminate line. Anything written to stderr is logged.
+
+Usage:
+    import SubprocessPool
+    pool = SubprocessPool.SubprocessPool('MyTask', [bin, 'MyProcess.py', arg], maxProcesses, logger, timeout=60)
+
+    def request(worker):
+        worker.send(path)
+        return worker.readline()
+
+    result = pool.call(request)
+    ...
+    pool.shutdown()
+
+Liveness is checked just by the process exit status, by reading responses with timeouts and by pinging
+processes idle for a long time, so requests don't pay extra round trips. Processes which crash, exit or
+time out are replaced and the request is retried once. Processes exiting by themselves with status 0, e.g. to release
+resources, are replaced without retry cost if they exit before answering the request, even if it was already written to
+their stdin pipe. Restarts caused by failures are limited by a budget,
+after which requests fail fast instead of stalling processing threads. Warm spare processes can be kept
+started, so crashed processes are replaced without waiting the process startup.
+"""
+import queue
+import subprocess
+import threading
+import time
+
+ping = 'ping'
+terminate = 'terminate_process'
+
+
+class WorkerError(Exception):
+    '''
+    Raised when an external process crashes, exits or times out while handling a request.
+    '''
+    pass
+
+
+# Default timeouts in seconds, so hung processes don't block processing threads forever
+default_timeout = 300
+default_start_timeout = 600
+
+
+class Worker:
+    '''
+    An external process and the lines read from its stdout by a background thread.
+    '''
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.request_sent = False
+        self.response_read = False
+        self.proc = subprocess.Popen(pool.args, stdout=subprocess.PIPE, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     universal_newlines=True, encoding='utf-8')
+        self.lines = queue.Queue()
+        self.last_used = time.monotonic()
+        for target in (self.read_stdout, self.log_stderr):
+            t = threading.Thread(target=target)
+            t.daemon = True
+            t.start()
+
+    def read_stdout(self):
+        for line in iter(self.proc.stdout.readline, ''):
+            self.lines.put(line)
+        self.lines.put(None)
+
+    def log_stderr(self):
+        for line in iter(self.proc.stderr.readline, ''):
+            line = line.strip()
+            if line:
+                self.pool.logger.info("[" + self.pool.name + "] Process-" + str(self.proc.pid) + " stderr: " + line)
+        self.proc.stderr.close()
+
+    def isAlive(self):
+        return self.proc.poll() is None
+
+    def send(self, *lines):
+        try:
+            for line in lines:
+                print(line, file=self.proc.stdin)
+            self.proc.stdin.flush()
+            self.request_sent = True
+        except OSError as e:
+            raise WorkerError("Error writing to process-" + str(self.proc.pid) + ": " + str(e))
+
+    def readline(self, timeout=-1):
+        '''
+        Returns the next stdout line without the line break. The default timeout is the pool timeout.
+        '''
+        if timeout == -1:
+            timeout = self.pool.timeout
+        try:
+            line = self.lines.get(timeout=timeout)
+        except queue.Empty:
+            raise WorkerError("Timeout of " + str(timeout) + "s waiting response of process-" + str(self.proc.pid))
+        if line is None:
+            self.lines.put(None)
+            raise WorkerError("Process-" + str(self.proc.pid) + " exited with status " + str(self.proc.wait()))
+        self.response_read = True
+        return line.rstrip('\n')
+
+    def ping(self, timeout):
+        try:
+            self.send(self.pool.ping)
+            return self.readline(timeout) == self.pool.ping
+        except WorkerError:
+            return False
+
+    def kill(self):
+        try:
+            self.proc.kill()
+        except Exception:
+            pass
+
+    def terminate(self):
+        try:
+            self.send(self.pool.terminate)
+            self.proc.wait(2)
+        except Exception:
+            self.kill()
+
+
+class SubprocessPool:
+
+    def __init__(self, name, args, max_processes, logger, timeout=default_timeout, start_timeout=default_start_timeout, max_restarts=20, spares=0,
+                 idle_ping=60, ping=ping, terminate=terminate):
+        '''
+        name:          name used in log messages
+        args:          command line to start the external processes
+        max_processes: max number of processes handling requests at the same time
+        timeout:       default timeout in seconds to read response lines, None to wait forever
+        start_timeout: timeout in seconds of the first ping, while the process is loading, None to wait forever
+        max_restarts:  max number of processes restarted because of failures, None for no limit
+        spares:        number of processes kept started to replace failed ones
+        idle_ping:     processes idle for more than this seconds are pinged before being used, None to disable
+        '''
+        self.name = name
+        self.args = args
+        self.max_processes = max(1, max_processes)
+        self.logger = logger
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.max_restarts = max_restarts
+        self.num_spares = spares
+        self.idle_ping = idle_ping
+        self.ping = ping
+        self.terminate = terminate
+
+        self.lock = threading.Lock()
+        self.num_created = 0
+        self.restarts = 0
+        self.closed = False
+        self.idle = queue.Queue()
+        self.spares = queue.Queue()
+        self.starting_spares = 0
+
+    def start_worker(self):
+        for i in range(3):
+            worker = Worker(self)
+            if worker.ping(self.start_timeout):
+                return worker
+            worker.kill()
+
+        raise Exception("Error creating external process for " + self.name)
+
+    def new_worker(self):
+        '''
+        Returns a warm spare process if available, otherwise starts a new one.
+        '''
+        worker = None
+        try:
+            while worker is None:
+                worker = self.spares.get_nowait()
+                if not worker.isAlive():
+                    worker = None
+        except queue.Empty:
+            pass
+
+        self.start_spares()
+
+        if worker is None:
+            worker = self.start_worker()
+        return worker
+
+    def start_spares(self):
+        with self.lock:
+            missing = self.num_spares - self.spares.qsize() - self.starting_spares
+            if missing <= 0 or self.closed:
+                return
+            self.starting_spares += missing
+        for i in range(missing):
+            t = threading.Thread(target=self.start_spare)
+            t.daemon = True
+            t.start()
+
+    def start_spare(self):
+        try:
+            self.spares.put(self.start_worker())
+        except Exception as e:
+            self.logger.warn("[" + self.name + "] Error starting spare process: " + str(e))
+        finally:
+            with self.lock:
+                self.starting_spares -= 1
+
+    def discard(self, worker, failure):
+        worker.kill()
+        with self.lock:
+            self.num_created -= 1
+            if failure:
+                self.restarts += 1
+        # wakes up a thread waiting for an idle process, so it can create a new one
+        self.idle.put(None)
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                if self.max_restarts is not None and self.restarts > self.max_restarts:
+                    raise Exception("Restart limit of " + str(self.max_restarts) + " external processes reached for " + self.name)
+                create = self.num_created < self.max_processes
+                if create:
+                    self.num_created += 1
+            if create:
+                try:
+                    return self.new_worker()
+                except Exception:
+                    with self.lock:
+                        self.num_created -= 1
+                    raise
+
+            worker = self.idle.get(block=True)
+            if worker is None:
+                continue
+            if not worker.isAlive():
+                # process exited by itself, e.g. to release resources after some requests
+                self.discard(worker, False)
+                continue
+            if self.idle_ping is not None and time.monotonic() - worker.last_used > self.idle_ping and not worker.ping(self.timeout):
+                self.logger.warn("[" + self.name + "] Idle process-" + str(worker.proc.pid) + " not responding, restarting it.")
+                self.discard(worker, True)
+                continue
+            return worker
+
+    def call(self, function, retries=1):
+        '''
+        Calls function(worker) with a free process and returns its result. If the process fails,
+        it is replaced and the function is called again, up to 'retries' times.
+        '''
+        attempt = 0
+        exited = False
+        while True:
+            worker = self.acquire()
+            worker.request_sent = False
+            worker.response_read = False
+            try:
+                result = function(worker)
+            except WorkerError as e:
+                if worker.proc.poll() == 0 and (not worker.request_sent or not worker.response_read and not exited):
+                    # process exited by itself before receiving or answering the request, e.g. after reaching a limit
+                    # of processed files while the request was being written, it is not a failure. Exiting again
+                    # without answering the same written request is.
+                    exited = exited or worker.request_sent
+                    self.discard(worker, False)
+                    continue
+                self.discard(worker, True)
+                self.logger.warn("[" + self.name + "] " + str(e))
+                if attempt == retries:
+                    raise
+                attempt += 1
+                continue
+            except BaseException:
+                self.discard(worker, True)
+                raise
+            worker.last_used = time.monotonic()
+            self.idle.put(worker)
+            return result
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+        for workers in (self.idle, self.spares):
+            while not workers.empty():
+                worker = workers.get(block=True)
+                if worker is None:
+                    continue
+                worker.terminate()
+                if workers is self.idle:
+                    with self.lock:
+                        self.num_created -= 1
@@ -2,16 +2,76 @@
 stdout = sys.stdout
 sys.stdout = sys.stderr
 
+import os
+import tempfile
+import wave
+import numpy
+
 terminate = 'terminate_process'
 model_loaded = 'wav2vec2_model_loaded'
 huggingsound_loaded = 'huggingsound_loaded'
 finished = 'transcription_finished'
 ping = 'ping'
+gpu_memory = 'gpu_memory'
+
+vad_frame_ms = 30
+vad_threshold_db = 35
+vad_min_energy_db = -60
+vad_padding_ms = 300
+vad_max_speech_ratio = 0.9
+
+def remove_silence(path):
+    # energy based voice activity detection: frames much quieter than the loudest
+    # ones are considered silence and removed, keeping some padding around speech
+    with wave.open(path, 'rb') as w:
+        if w.getnchannels() != 1 or w.getsampwidth() != 2:
+            return None, 1.0
+        params = w.getparams()
+        samples = numpy.frombuffer(w.readframes(w.getnframes()), numpy.int16)
+
+    frame_len = params.framerate * vad_frame_ms // 1000
+    num_frames = len(samples) // frame_len
+    if num_frames == 0:
+        return None, 1.0
+
+    frames = samples[:num_frames * frame_len].astype(numpy.float32).reshape(num_frames, frame_len) / 32768.0
+    energy = 10 * numpy.log10(numpy.mean(frames ** 2, axis=1) + 1e-10)
+    threshold = max(numpy.percentile(energy, 95) - vad_threshold_db, vad_min_energy_db)
+    speech = energy > threshold
+
+    padding = vad_padding_ms // vad_frame_ms
+    speech = numpy.convolve(speech, numpy.ones(2 * padding + 1), mode='same') > 0
+    speech_ratio = float(numpy.mean(speech))
+
+    if speech_ratio == 0 or speech_ratio > vad_max_speech_ratio:
+        return None, speech_ratio
+
+    fd, trimmed = tempfile.mkstemp(suffix='.wav', dir=os.path.dirname(path))
+    os.close(fd)
+    with wave.open(trimmed, 'wb') as w:
+        w.setparams(params)
+        w.writeframes(samples[:num_frames * frame_len].reshape(num_frames, frame_len)[speech].tobytes())
+
+    return trimmed, speech_ratio
+
+def print_gpu_memory(cudaCount, deviceNum):
+    # free memory of each GPU in MB, used to place the transcription processes
+    free = []
+    if cudaCount > 0:
+        try:
+            import GPUtil
+            free = [str(int(gpu.memoryFree)) for gpu in GPUtil.getGPUs()]
+        except Exception:
+            # torch creates a CUDA context in each queried GPU, so just the own GPU is queried
+            import torch
+            free = [str(torch.cuda.mem_get_info(i)[0] >> 20) if i == deviceNum else '' for i in range(cudaCount)]
+    print(gpu_memory + ' ' + ','.join(free), file=stdout, flush=True)
 
 def main():
 
     modelName = sys.argv[1]
     deviceNum = sys.argv[2]
+    vadFilter = len(sys.argv) > 3 and sys.argv[3] == 'true'
 
     from huggingsound import SpeechRecognitionModel
     
@@ -21,6 +81,7 @@ def main():
     cudaCount = torch.cuda.device_count()
 
     print(str(cudaCount), file=stdout, flush=True)
+    print_gpu_memory(cudaCount, int(deviceNum))
 
     if cudaCount > 0:
         deviceId = 'cuda:' + deviceNum
@@ -39,6 +100,7 @@ def main():
     
     print(model_loaded, file=stdout, flush=True)
     print(deviceId, file=stdout, flush=True)
+    print_gpu_memory(cudaCount, int(deviceNum))
     
     while True:
         
@@ -51,13 +113,29 @@ def main():
             continue
 
         paths = [line]
+        trimmed = None
         try:
+            if vadFilter:
+                trimmed, speech_ratio = remove_silence(line)
+                print('Speech ratio ' + '%.2f' % speech_ratio + ' in ' + line, file=sys.stderr, flush=True)
+                if speech_ratio == 0:
+                    print(finished, file=stdout, flush=True)
+                    print(str(0), file=stdout, flush=True)
+                    print('', file=stdout, flush=True)
+                    continue
+                if trimmed is not None:
+                    paths = [trimmed]
+
             transcriptions = model.transcribe(paths)
             
         except Exception as e:
             msg = repr(e).replace('\n', ' ').replace('\r', ' ')
             print(msg, file=stdout, flush=True)
             continue
+
+        finally:
+            if trimmed is not None:
+                os.remove(trimmed)
         
         text = transcriptions[0].get('transcription')
         text = text.replace('\n', ' ').replace('\r', ' ')
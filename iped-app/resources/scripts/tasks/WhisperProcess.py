@@ -3,6 +3,10 @@
 stdout = sys.stdout
 sys.stdout = sys.stderr
 
+import json
+import os
+import time
+import wave
 import numpy
 
 terminate = 'terminate_process'
@@ -10,6 +14,83 @@
 library_loaded = 'library_loaded'
 finished = 'transcription_finished'
 ping = 'ping'
+detected_languages = 'detected_languages'
+gpu_memory = 'gpu_memory'
+manifest = 'manifest.json'
+
+def get_local_model(modelName, modelsDir, download_model):
+    # models already downloaded are loaded from the local path saved in the manifest,
+    # avoiding remote hub lookups at every process startup
+    if modelsDir is None or os.path.isdir(modelName):
+        return modelName
+    manifestPath = os.path.join(modelsDir, manifest)
+    try:
+        with open(manifestPath, encoding='utf-8') as f:
+            models = json.load(f)
+    except (OSError, ValueError):
+        models = {}
+    localPath = models.get(modelName)
+    if localPath is not None:
+        localPath = os.path.join(modelsDir, localPath)
+        if os.path.isfile(os.path.join(localPath, 'model.bin')):
+            return localPath
+    localPath = download_model(modelName, cache_dir=modelsDir)
+    models[modelName] = os.path.relpath(localPath, modelsDir)
+    # processes may start concurrently, so replace the manifest atomically
+    tmpPath = manifestPath + '.' + str(os.getpid())
+    try:
+        with open(tmpPath, 'w', encoding='utf-8') as f:
+            json.dump(models, f, indent=2)
+        os.replace(tmpPath, manifestPath)
+    except OSError as e:
+        print('Failed to update models manifest: ' + repr(e), file=sys.stderr, flush=True)
+    return localPath
+
+def read_wav_start(file, seconds=30):
+    # just the audio beginning is needed for language detection
+    with wave.open(file, 'rb') as w:
+        if w.getnchannels() != 1 or w.getsampwidth() != 2 or w.getframerate() != 16000:
+            return None
+        frames = w.readframes(16000 * seconds)
+    return numpy.frombuffer(frames, numpy.int16).astype(numpy.float32) / 32768.0
+
+def group_by_language(model, files, languages, load_audio):
+    # whisperx keeps the first detected language for next audios, so language
+    # is detected for each audio and audios are transcribed grouped by language.
+    # Languages already detected before, e.g. by a failed batch, are reused.
+    groups = {}
+    for idx in range(len(files)):
+        if not languages[idx]:
+            try:
+                audio = read_wav_start(files[idx])
+            except Exception:
+                audio = None
+            if audio is None:
+                audio = load_audio(files[idx])
+            languages[idx] = model.detect_language(audio)
+        groups.setdefault(languages[idx], []).append(idx)
+    return groups
+
+def parse_request(line):
+    # each audio is sent as 'path' or 'path|language', with its language detected before
+    files = []
+    languages = []
+    for entry in line.split(","):
+        path, sep, lang = entry.partition('|')
+        files.append(path)
+        languages.append(lang or None)
+    return files, languages
+
+def print_languages(languages):
+    print(detected_languages + ' ' + ','.join(lang or '' for lang in languages), file=stdout, flush=True)
+
+def print_gpu_memory(cudaCount):
+    # free memory of each GPU in MB, used to place the transcription processes
+    free = []
+    if cudaCount > 0:
+        import GPUtil
+        free = [str(int(gpu.memoryFree)) for gpu in GPUtil.getGPUs()]
+    print(gpu_memory + ' ' + ','.join(free), file=stdout, flush=True)
 
 def main():
     modelName = sys.argv[1]
@@ -19,6 +100,7 @@ def main():
     language = sys.argv[5]
     compute_type = sys.argv[6]
     batch_size = int(sys.argv[7])
+    modelsDir = sys.argv[8] if len(sys.argv) > 8 else None
     
     if language == 'detect':
         language = None
@@ -39,11 +121,13 @@ def main():
             compute_type = 'int8'
     else:
         import GPUtil
-        cudaCount = len(GPUtil.getGPUs())
+        gpus = GPUtil.getGPUs()
+        cudaCount = len(gpus)
         if cudaCount == 0:
             raise RuntimeError('No GPU device detected!')
     
     print(str(cudaCount), file=stdout, flush=True)
+    print_gpu_memory(cudaCount)
 
     if cudaCount > 0:
         deviceId = 'cuda'
@@ -51,17 +135,38 @@ def main():
         deviceId = 'cpu'
         deviceNum = 0
     
+    loadStart = time.time()
     try:
+        from faster_whisper import download_model
+        modelPath = get_local_model(modelName, modelsDir, download_model)
+    except Exception as e:
+        print('Failed to use local models dir, loading from default cache: ' + repr(e), file=sys.stderr, flush=True)
+        modelPath = modelName
+
+    def load_model(deviceId, compute_type):
         if whisperx_found:
-            model = whisperx.load_model(modelName, device=deviceId, device_index=deviceNum, threads=threads, compute_type=compute_type, language=language)
+            return whisperx.load_model(modelPath, device=deviceId, device_index=deviceNum, threads=threads, compute_type=compute_type, language=language)
         else:
-            model = faster_whisper.WhisperModel(modelName, device=deviceId, device_index=deviceNum, cpu_threads=threads, compute_type=compute_type)
-            
+            return faster_whisper.WhisperModel(modelPath, device=deviceId, device_index=deviceNum, cpu_threads=threads, compute_type=compute_type)
+
+    try:
+        model = load_model(deviceId, compute_type)
     except Exception as e:
-        raise e
+        if deviceId != 'cpu':
+            # loading on GPU failed (OOM?), try on CPU
+            print('Failed to load model on GPU ' + str(deviceNum) + ', trying on CPU: ' + repr(e), file=sys.stderr, flush=True)
+            deviceId = 'cpu'
+            deviceNum = 0
+            if compute_type == 'float16': # not supported on CPU
+                compute_type = 'int8'
+            model = load_model(deviceId, compute_type)
+        else:
+            raise e
     
     print(model_loaded, file=stdout, flush=True)
     print(deviceId, file=stdout, flush=True)
+    print('%.2f' % (time.time() - loadStart), file=stdout, flush=True)
+    print_gpu_memory(cudaCount)
     
     while True:
         
@@ -73,7 +178,8 @@ def main():
             print(ping, file=stdout, flush=True)
             continue
         
-        files = line.split(",")
+        files, languages = parse_request(line)
+        detect = language is None
         transcription = []
         logprobs = []
         for file in files:
@@ -81,24 +187,36 @@ def main():
             logprobs.append([])
         try:
             if whisperx_found:
-                result = model.transcribe(files, batch_size=batch_size, language=language,wav=True)
-                for segment in result['segments']:
-                    idx = segment["audio"]
-                    transcription[idx] += segment['text']
-                    if 'avg_logprob' in segment:
-                        logprobs[idx].append(segment['avg_logprob'])
+                if detect:
+                    groups = group_by_language(model, files, languages, whisperx.load_audio)
+                else:
+                    groups = {language: list(range(len(files)))}
+                for lang, idxs in groups.items():
+                    result = model.transcribe([files[i] for i in idxs], batch_size=batch_size, language=lang, wav=True)
+                    for segment in result['segments']:
+                        idx = idxs[segment["audio"]]
+                        transcription[idx] += segment['text']
+                        if 'avg_logprob' in segment:
+                            logprobs[idx].append(segment['avg_logprob'])
             else:
                 for idx in range(len(files)):
-                    segments, info = model.transcribe(audio=files[idx], language=language, beam_size=5, vad_filter=True)
+                    segments, info = model.transcribe(audio=files[idx], language=languages[idx] if detect else language, beam_size=5, vad_filter=True)
+                    if detect:
+                        languages[idx] = info.language
                     for segment in segments:
                         transcription[idx] += segment.text
                         logprobs[idx].append(segment.avg_logprob)
 
         except Exception as e:
             msg = repr(e).replace('\n', ' ').replace('\r', ' ')
+            if detect:
+                # languages detected before the failure are kept by the caller for retries
+                print_languages(languages)
             print(msg, file=stdout, flush=True)
             continue
-        
+
+        if detect:
+            print_languages(languages)
         print(finished, file=stdout, flush=True)
         
         for idx in range(len(files)):
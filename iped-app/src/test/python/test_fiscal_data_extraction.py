@@ -0,0 +1,212 @@
+"""
+Tests of FiscalDataExtractionTask.py over plain and positional JSON texts, the latter like written by
+PDFPositionalTextParser. Run from the repository root with:
+    python -m unittest discover -s iped-app/src/test/python
+"""
+import csv
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TASKS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources', 'scripts', 'tasks'))
+sys.path.insert(0, TASKS_DIR)
+
+import FiscalDataExtractionTask as fiscal
+import FiscalDataExtractionBatch as batch
+
+PAGE_1 = ['RECEBEMOS DE ACME COMERCIO DE PRODUTOS LTDA OS PRODUTOS CONSTANTES DA NOTA FISCAL', 'DANFE',
+          '1 - SAIDA', 'Identificação do emitente', 'ACME COMERCIO DE PRODUTOS LTDA', 'RUA DAS FLORES, 123 - CENTRO',
+          'CURITIBA/PR  CEP 01000-000', 'NATUREZA DA OPERACAO', 'VENDA DE MERCADORIA', 'CNPJ', '11.222.333/0001-81',
+          'DESTINATÁRIO / REMETENTE', 'NOME/RAZÃO SOCIAL', 'INDUSTRIA BRASILEIRA DE PECAS SA', 'CNPJ/CPF',
+          '44.555.666/0001-72', 'MUNICÍPIO', 'SAO PAULO', 'UF', 'SP']
+
+# The access key and the totals are just in the last page, after a recipient block of another layout
+PAGE_2 = ['DESTINATÁRIO / REMETENTE', 'NOME/RAZÃO SOCIAL', 'DISTRIBUIDORA NORTE LTDA ME', 'CNPJ/CPF',
+          '77.888.999/0001-63', 'MUNICÍPIO', 'Fortaleza', 'UF', 'CE', '0001 PRODUTO ITEM 1 UN 2 10,00 20,00',
+          'CHAVE DE ACESSO', '3519 0000 0000 0000 0000 5500 1000 0000 0110 0000 0010',
+          'CALCULO DO IMPOSTO', 'VALOR DO ICMS', '2,40', 'VALOR TOTAL DA NOTA', '1.020,00']
+
+OTHER = ['RELATORIO ANUAL', 'Resultados do projeto', 'Tabela de dados']
+
+
+def positional(*pages):
+    '''
+    Positional JSON of the given lines of each page, one item per line.
+    '''
+    items = []
+    for p, lines in enumerate(pages, 1):
+        for i, line in enumerate(lines):
+            items.append({'p': p, 'x': 30.0, 'y': 20.0 + i * 9.5, 'w': len(line) * 4.5, 'h': 8.0, 't': line})
+    return json.dumps(items, separators=(',', ':'), ensure_ascii=False)
+
+
+class FiscalDataExtractionTaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.task = fiscal.FiscalDataExtractionTask()
+
+    def test_json_first_page(self):
+        text = positional(PAGE_1, PAGE_2, OTHER)
+        items = json.loads(self.task._json_first_page(text))
+        self.assertEqual([item['t'] for item in items], PAGE_1)
+        self.assertTrue(all(item['p'] == 1 for item in items))
+
+    def test_json_first_page_of_single_page(self):
+        text = positional(PAGE_1)
+        self.assertEqual(self.task._json_first_page(text), text)
+
+    def test_json_text_rows(self):
+        lines = ['RAZÃO "SOCIAL"', 'C:\\NOTAS\\1', 'VALOR TOTAL DA NOTA']
+        text = positional(PAGE_1, lines, OTHER)
+        rows = list(self.task._json_text_rows(text, text.find(self.task.JSON_PAGE_2)))
+        self.assertEqual([t for t, y in rows], lines + OTHER)
+        self.assertEqual([y for t, y in rows[:2]], [20.0, 29.5])
+
+    def test_later_pages_are_not_decoded(self):
+        text = positional(PAGE_1, PAGE_2)
+        decoded = []
+        loads = fiscal.json.loads
+        fiscal.json.loads = lambda s: decoded.append(s) or loads(s)
+        try:
+            doc_type, data = self.task._extract('application/pdf', text, 'nfe.pdf')
+        finally:
+            fiscal.json.loads = loads
+        self.assertEqual(decoded, [self.task._json_first_page(text)])
+        self.assertEqual(data['value'], 1020.0)
+
+    def test_fiscal_candidate(self):
+        self.assertTrue(self.task._is_fiscal_candidate('\n'.join(PAGE_1), False))
+        self.assertTrue(self.task._is_fiscal_candidate('Dacte\nCONHECIMENTO DE TRANSPORTE', False))
+        self.assertFalse(self.task._is_fiscal_candidate('\n'.join(OTHER), False))
+        # markers after the bounded prefix of plain text
+        padding = 'x' * self.task.PREFILTER_CHARS
+        self.assertFalse(self.task._is_fiscal_candidate(padding + 'DANFE', False))
+        # markers just in other pages of positional JSON
+        text = positional(OTHER, PAGE_1)
+        self.assertFalse(self.task._is_fiscal_candidate(self.task._json_first_page(text), True))
+
+    def test_candidates_are_detected(self):
+        # every document detected must pass the pre-filter
+        texts = ['documento auxiliar da nota fiscal', 'DANFE chave de acesso', 'CT-e',
+                 'documento auxiliar do conhecimento de transporte', 'DACTE conhecimento de transporte']
+        for text in texts:
+            self.assertIsNotNone(self.task._detect_doc_type(text), text)
+            self.assertTrue(self.task._is_fiscal_candidate(text, False), text)
+
+    def test_multi_page_json(self):
+        result = self.task._extract('application/pdf', positional(PAGE_1, PAGE_2), 'nfe.pdf')
+        self.assertIsNotNone(result)
+        doc_type, data = result
+        # detected by the access key in the second page
+        self.assertEqual(doc_type, 'NFe')
+        # totals found by regexes over the text of all pages
+        self.assertEqual(data['value'], 1020.0)
+        self.assertEqual(data['icms'], 2.4)
+        # parties found by the spatial extraction of the first page
+        self.assertEqual(data['destName'], 'INDUSTRIA BRASILEIRA DE PECAS SA')
+        self.assertEqual(data['destCNPJ'], '44.555.666/0001-72')
+
+    def test_plain_text_and_json_are_detected(self):
+        for text in ('\n'.join(PAGE_1 + PAGE_2), positional(PAGE_1 + PAGE_2)):
+            doc_type, data = self.task._extract('application/pdf', text, 'nfe.pdf')
+            self.assertEqual(doc_type, 'NFe')
+            self.assertEqual(data['value'], 1020.0)
+
+    def test_other_documents(self):
+        for text in ('\n'.join(OTHER), positional(OTHER, OTHER)):
+            self.assertIsNone(self.task._extract('application/pdf', text, 'other.pdf'))
+
+    def test_item_view_pre_filter(self):
+        checked, rejected = fiscal.checkedCount.get(), fiscal.rejectedCount.get()
+        view = self.task.getItemView(fiscal.StandaloneItem('nfe.pdf', positional(PAGE_1, PAGE_2)))
+        self.assertEqual(view['mediaType'], 'application/pdf')
+        # rejected in the JVM, so the text is not sent to external processes
+        self.assertIsNone(self.task.getItemView(fiscal.StandaloneItem('other.pdf', positional(OTHER, PAGE_1))))
+        self.assertIsNone(self.task.getItemView(fiscal.StandaloneItem('other.pdf', '\n'.join(OTHER))))
+        self.assertIsNone(self.task.getItemView(fiscal.StandaloneItem('nfe.txt', '\n'.join(PAGE_1), 'text/plain')))
+        self.assertEqual(fiscal.checkedCount.get() - checked, 3)
+        self.assertEqual(fiscal.rejectedCount.get() - rejected, 2)
+
+    def test_process_view(self):
+        view = {'path': 'nfe.pdf', 'mediaType': 'application/pdf', 'text': positional(PAGE_1, PAGE_2)}
+        result = self.task.processView(view)
+        self.assertEqual(result['categories'], ['Tax Invoices'])
+        self.assertEqual(result['metadata'][fiscal.ExtraProperties.FISCAL_DOCTYPE], 'NFe')
+        self.assertEqual(result['metadata'][fiscal.ExtraProperties.FISCAL_VALUE], '1020.0')
+        self.assertEqual(result['metadata'][fiscal.ExtraProperties.FISCAL_DEST_CNPJ], '44.555.666/0001-72')
+        # result is sent as JSON by PythonTaskProcess.py
+        json.dumps(result)
+
+        view['text'] = positional(OTHER)
+        self.assertIsNone(self.task.processView(view))
+
+
+class FiscalDataExtractionBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        batch.init_worker()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_jsonl(self):
+        path = os.path.join(self.dir, 'docs.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'id': 'nfe', 'text': positional(PAGE_1, PAGE_2)}) + '\n')
+            f.write('\n')
+            f.write('{"id": "broken", "text": "DANFE\n')
+            f.write(json.dumps({'text': '\n'.join(PAGE_1 + PAGE_2)}) + '\n')
+            f.write(json.dumps({'id': 'other', 'text': '\n'.join(OTHER)}) + '\n')
+        return path
+
+    def process(self):
+        return [batch.process_document(doc) for doc in batch.read_documents(self.write_jsonl(), 'text', 'id')]
+
+    def test_jsonl(self):
+        rows = self.process()
+        self.assertEqual([row['id'] for row in rows], ['nfe', '3', '4', 'other'])
+        self.assertEqual(rows[0]['docType'], 'NFe')
+        self.assertEqual(rows[0]['destCNPJ'], '44.555.666/0001-72')
+        # invalid JSON is identified by the line number, not by the line
+        self.assertIn('JSONDecodeError', rows[1]['error'])
+        self.assertEqual(rows[2]['docType'], 'NFe')
+        self.assertNotIn('docType', rows[3])
+
+    def test_csv(self):
+        path = os.path.join(self.dir, 'out.csv')
+        writer = batch.CsvWriter(path)
+        for row in self.process():
+            writer.write(row)
+        writer.close()
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([row['id'] for row in rows], ['nfe', '3', '4', 'other'])
+        self.assertEqual(rows[0]['value'], '1020.0')
+
+    @unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet_row_group_per_batch(self):
+        import pyarrow.parquet
+        path = os.path.join(self.dir, 'out.parquet')
+        writer = batch.ParquetWriter(path)
+        rows = self.process()
+        for row in rows[:2]:
+            writer.write(row)
+        writer.flush()
+        for row in rows[2:]:
+            writer.write(row)
+        writer.close()
+        parquet = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        table = parquet.read().to_pylist()
+        self.assertEqual([row['id'] for row in table], ['nfe', '3', '4', 'other'])
+        self.assertEqual(table[0]['value'], '1020.0')
+        self.assertIsNone(table[3]['docType'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+"""
+Regression tests of PythonParserJabber.py over pidgin html logs, with the Java classes imported by the
+script stubbed. Expected messages are the ones extracted by the previous BeautifulSoup version.
+Run from the repository root with:
+    python -m unittest discover -s iped-app/src/test/python
+"""
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+PARSERS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources', 'scripts', 'parsers'))
+sys.path.insert(0, PARSERS_DIR)
+
+
+class JavaClass:
+
+    def __init__(self, *args):
+        pass
+
+
+class XHTMLContentHandler:
+
+    def __init__(self, handler, metadata):
+        self.handler = handler
+
+    def startDocument(self):
+        pass
+
+    def endDocument(self):
+        pass
+
+    def element(self, name, value):
+        self.handler.append((name, value))
+
+
+class Metadata(dict):
+
+    def set(self, key, value):
+        self[key] = value
+
+
+class TikaInputStream:
+
+    @staticmethod
+    def get(stream, tmpResources):
+        return types.SimpleNamespace(getFile=lambda: types.SimpleNamespace(getAbsolutePath=lambda: stream))
+
+
+class TemporaryResources:
+
+    def close(self):
+        pass
+
+
+class EmbeddedDocumentExtractor:
+
+    def __init__(self):
+        self.messages = []
+
+    def parseEmbedded(self, stream, handler, metadata, outputHtml):
+        self.messages.append(dict(metadata))
+
+
+# java classes imported by the script when loaded, just the ones used by parse() are not empty
+JAVA_CLASSES = {
+    'org.apache.tika.sax': {'XHTMLContentHandler': XHTMLContentHandler},
+    'org.apache.tika.io': {'TikaInputStream': TikaInputStream, 'TemporaryResources': TemporaryResources},
+    'org.apache.tika.metadata': {'Metadata': Metadata,
+                                 'Message': types.SimpleNamespace(MESSAGE_FROM='Message-From', MESSAGE_TO='Message-To'),
+                                 'TikaCoreProperties': types.SimpleNamespace(RESOURCE_NAME_KEY='resourceName', TITLE='dc:title')},
+    'org.apache.tika.exception': {'TikaException': JavaClass},
+    'org.apache.tika.extractor': {'EmbeddedDocumentExtractor': EmbeddedDocumentExtractor},
+    'iped.properties': {'ExtraProperties': types.SimpleNamespace(MESSAGE_DATE='messageDate', MESSAGE_BODY='messageBody'),
+                        'BasicProps': types.SimpleNamespace(LENGTH='length')},
+    'iped.parsers.standard': {'StandardParser': types.SimpleNamespace(INDEXER_CONTENT_TYPE='indexerContentType')},
+    'iped.utils': {'EmptyInputStream': JavaClass},
+    'iped.parsers.whatsapp': {'Util': JavaClass},
+    'iped.parsers.util': {'IndentityHtmlParser': JavaClass},
+    'org.apache.commons.codec.binary': {'StringUtils': JavaClass},
+    'java.io': {'ByteArrayInputStream': JavaClass},
+}
+for name, classes in JAVA_CLASSES.items():
+    module = types.ModuleType(name)
+    module.__dict__.update(classes)
+    sys.modules[name] = module
+
+import PythonParserJabber as jabber
+
+HEADER = ('<html><head><meta http-equiv="content-type" content="text/html; charset=UTF-8"><title>Conversation with alice@dukgo.com '
+          'at 05/02/2017 16:32:47 on bob@xmpp.cm/ (jabber)</title></head><body><h3>Conversation with alice@dukgo.com at 05/02/2017 '
+          '16:32:47 on bob@xmpp.cm/ (jabber)</h3>')
+
+TITLE = 'Conversation with alice@dukgo.com at 05/02/2017 16:32:47 on bob@xmpp.cm/ (jabber)'
+
+FONT_LOG = [
+    HEADER,
+    '<font size="2">(16:32:51)</font><b> Tentando iniciar uma conversa privada com alice@dukgo.com...</b><br/>',
+    '<font color="#A82F2F"><font size="2">(16:33:00)</font> <b>bob@xmpp.cm/Pidgin:</b></font> <body>Já tá pronto</body><br/>',
+    '<font color="#16569E"><font size="2">(16:33:05)</font> <b>alice@dukgo.com/Res:</b></font> primeira linha<br/>segunda &#39;linha&#39;<br/>',
+    '<font color="#16569E"><font size="2">(16:33:09)</font> <b>alice@dukgo.com/Res:</b></font> caf&eacute; &lt;b&gt; &amp; <a href="http://x.y">link</a> <i>it</i><br/>',
+    '<font color="#A82F2F"><font size="2">(16:33:12)</font> <b>bob@xmpp.cm:</b></font> ação você<br/>',
+    '</body></html>',
+]
+
+# line written by windows pidgin in cp1252
+CP1252_LINE = 5
+
+SPAN_LOG = [
+    HEADER,
+    '<span style="color: #A82F2F"><span style="font-size: smaller">(16:32:58)</span> <b>bob@xmpp.cm/Pidgin:</b></span> um<br/>dois<br/>',
+    '<span style="color: #16569E"><span style="font-size: smaller">(16:32:53)</span> <b>alice@dukgo.com/Res:</b></span> olá &amp; &lt;b&gt;<br/>',
+    '</body></html>',
+]
+
+
+class LogLineParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = jabber.LogLineParser()
+
+    def test_nested_font_tree(self):
+        line = self.parser.parseLine(FONT_LOG[2])
+        self.assertEqual([child.name for child in line.children], ['font', None, 'body', 'br'])
+        message = line.find('font')
+        self.assertEqual([child.name for child in message.children], ['font', None, 'b'])
+        self.assertEqual(message.find('font').text, '(16:33:00)')
+        self.assertEqual(message.find('b').text, 'bob@xmpp.cm/Pidgin:')
+        # whitespace only strings are collapsed to a space, like BeautifulSoup
+        self.assertEqual(message.next_sibling, ' ')
+        self.assertEqual(message.next_sibling.next_sibling.text, 'Já tá pronto')
+        self.assertIsNone(line.children[-1].next_sibling)
+
+    def test_br_blocks_and_entities(self):
+        line = self.parser.parseLine(FONT_LOG[3])
+        self.assertEqual([child.name for child in line.children], ['font', None, 'br', None, 'br'])
+        self.assertEqual(line.children[1], ' primeira linha')
+        self.assertEqual(line.children[3], "segunda 'linha'")
+        # void tags have no children
+        self.assertEqual(line.children[2].children, [])
+
+        line = self.parser.parseLine(FONT_LOG[4])
+        self.assertEqual(line.children[1], ' café <b> & ')
+        self.assertEqual(line.find('a').text, 'link')
+        self.assertEqual(jabber.LogLineParser.visibleText(line), '(16:33:09) alice@dukgo.com/Res: café <b> & link it\n')
+
+    def test_span_tree(self):
+        line = self.parser.parseLine(SPAN_LOG[2])
+        message = line.find('span')
+        self.assertEqual(message.find('span').text, '(16:32:53)')
+        self.assertEqual(message.next_sibling, ' olá & <b>')
+
+    def test_header_visible_text(self):
+        line = self.parser.parseLine(HEADER)
+        self.assertEqual(line.find('title').text, TITLE)
+        self.assertEqual(line.find('body').children[0].name, 'h3')
+        # title in head is not displayed
+        self.assertEqual(jabber.LogLineParser.visibleText(line), TITLE)
+
+    def test_decode_line(self):
+        self.assertEqual(jabber.decodeLine('ação'.encode('utf-8')), 'ação')
+        self.assertEqual(jabber.decodeLine('ação'.encode('cp1252')), 'ação')
+
+
+class PythonParserJabberTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def parse(self, lines, cp1252_line=None):
+        path = os.path.join(self.dir, 'log.html')
+        with open(path, 'wb') as f:
+            for i, line in enumerate(lines):
+                f.write((line + '\n').encode('cp1252' if i == cp1252_line else 'utf-8'))
+        metadata = Metadata(resourceName='2017-02-05.163247-0200BRT.html')
+        handler = []
+        extractor = EmbeddedDocumentExtractor()
+        context = types.SimpleNamespace(get=lambda cls: extractor)
+        jabber.PythonParserJabber().parse(path, handler, metadata, context)
+        messages = [(m['Message-From'], m['Message-To'], m['messageDate'], m['messageBody']) for m in extractor.messages]
+        return messages, handler, metadata
+
+    def test_font_log(self):
+        messages, handler, metadata = self.parse(FONT_LOG, CP1252_LINE)
+        self.assertEqual(messages, [
+            ('System', None, '2017-02-05T16:32:51-02:00', ' Tentando iniciar uma conversa privada com alice@dukgo.com...'),
+            ('bob@xmpp.cm', 'alice@dukgo.com', '2017-02-05T16:33:00-02:00', 'Já tá pronto'),
+            ('alice@dukgo.com', 'bob@xmpp.cm', '2017-02-05T16:33:05-02:00', " primeira linha\nsegunda 'linha'\n\n"),
+            ('alice@dukgo.com', 'bob@xmpp.cm', '2017-02-05T16:33:09-02:00', ' café <b> & link it\n\n'),
+            ('bob@xmpp.cm', 'alice@dukgo.com', '2017-02-05T16:33:12-02:00', ' ação você\n\n'),
+        ])
+        self.assertEqual(handler, [
+            ('p', TITLE),
+            ('p', '(16:32:51) Tentando iniciar uma conversa privada com alice@dukgo.com...'),
+            ('p', '(16:33:00) bob@xmpp.cm/Pidgin: Já tá pronto'),
+            ('p', "(16:33:05) alice@dukgo.com/Res: primeira linha\nsegunda 'linha'"),
+            ('p', '(16:33:09) alice@dukgo.com/Res: café <b> & link it'),
+            ('p', '(16:33:12) bob@xmpp.cm: ação você'),
+        ])
+        self.assertEqual(metadata['dc:title'], TITLE)
+
+    def test_span_log(self):
+        messages, handler, metadata = self.parse(SPAN_LOG)
+        # messages are sorted by date
+        self.assertEqual(messages, [
+            ('alice@dukgo.com', 'bob@xmpp.cm', '2017-02-05T16:32:53-02:00', ' olá & <b>\n\n'),
+            ('bob@xmpp.cm', 'alice@dukgo.com', '2017-02-05T16:32:58-02:00', ' um\ndois\n\n'),
+        ])
+        self.assertEqual(handler[1:], [('p', '(16:32:58) bob@xmpp.cm/Pidgin: um\ndois'), ('p', '(16:32:53) alice@dukgo.com/Res: olá & <b>')])
+
+    def test_single_sender_receives_from_participants(self):
+        messages, handler, metadata = self.parse(SPAN_LOG[:2] + SPAN_LOG[3:])
+        self.assertEqual(messages, [('bob@xmpp.cm', 'alice@dukgo.com', '2017-02-05T16:32:58-02:00', ' um\ndois\n\n')])
+
+
+if __name__ == '__main__':
+    unittest.main()
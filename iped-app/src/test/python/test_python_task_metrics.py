@@ -0,0 +1,161 @@
+"""
+Tests of PythonTaskMetrics.py, with the accumulators used out of the JVM. Run from the repository root with:
+    python -m unittest discover -s iped-app/src/test/python
+"""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+TASKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources', 'scripts', 'tasks')
+sys.path.insert(0, os.path.normpath(TASKS_DIR))
+
+import PythonTaskMetrics
+
+
+class Logger:
+
+    def __init__(self):
+        self.messages = []
+
+    def info(self, msg):
+        self.messages.append(msg)
+
+
+class PythonTaskMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = PythonTaskMetrics.Metrics('TestTask')
+
+    def test_get_returns_same_metrics(self):
+        self.assertIs(PythonTaskMetrics.get('SameTask'), PythonTaskMetrics.get('SameTask'))
+        self.assertIsNot(PythonTaskMetrics.get('SameTask'), PythonTaskMetrics.get('OtherTask'))
+
+    def test_same_accumulator_by_name(self):
+        self.assertIs(self.metrics.counter('Items'), self.metrics.counter('Items'))
+        self.assertIs(self.metrics.timer('Prediction', 'images'), self.metrics.timer('Prediction'))
+
+    def test_counter_from_many_threads(self):
+        counter = self.metrics.counter('Items')
+
+        def run():
+            for i in range(1000):
+                counter.add(1)
+
+        threads = [threading.Thread(target=run) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(counter.get(), 8000)
+        self.assertEqual(counter.format(), 'Items: 8000')
+
+    def test_histogram_percentiles(self):
+        histogram = self.metrics.histogram('Sizes')
+        for value in [1] * 90 + [1000] * 10:
+            histogram.add(value)
+        self.assertEqual(histogram.count(), 100)
+        self.assertEqual(histogram.percentile(0.5), 2)
+        self.assertEqual(histogram.percentile(0.99), 1024)
+
+    def test_timer(self):
+        timer = self.metrics.timer('Prediction', 'images')
+        with timer.time(4):
+            time.sleep(0.01)
+        start = time.perf_counter_ns()
+        timer.add(start, 2)
+
+        self.assertEqual(timer.calls.sum(), 2)
+        self.assertEqual(timer.units.sum(), 6)
+        self.assertGreaterEqual(timer.nanos.sum(), 10000000)
+        self.assertGreaterEqual(timer.last_end.get() - timer.first_start.get(), 10000000)
+        self.assertTrue(timer.format().startswith('Prediction: 6 images in 2 calls'))
+
+    def test_log_just_once(self):
+        self.metrics.counter('Items').add(3)
+        logger = Logger()
+        self.metrics.log(logger)
+        self.metrics.log(logger)
+        self.assertEqual(logger.messages, ['[TestTask] Items: 3'])
+
+    def test_is_first_finish(self):
+        self.assertTrue(self.metrics.isFirstFinish())
+        self.assertFalse(self.metrics.isFirstFinish())
+
+    def test_start_resets_finished_processing(self):
+        counter = self.metrics.counter('Items')
+        timer = self.metrics.timer('Prediction', 'images')
+        histogram = self.metrics.histogram('Sizes')
+
+        # first processing
+        self.metrics.start()
+        counter.add(5)
+        timer.add(time.perf_counter_ns(), 3)
+        histogram.add(10)
+        self.metrics.log(Logger())
+
+        # next processing in the same JVM, init() of all threads call start()
+        self.metrics.start()
+        self.metrics.start()
+        self.assertEqual(counter.get(), 0)
+        self.assertEqual(timer.calls.sum(), 0)
+        self.assertEqual(timer.first_start.get(), 0)
+        self.assertEqual(histogram.count(), 0)
+
+        # accumulators are still referenced by the script globals
+        counter.add(2)
+        logger = Logger()
+        self.metrics.log(logger)
+        self.assertIn('[TestTask] Items: 2', logger.messages)
+
+    def test_start_does_not_reset_running_processing(self):
+        counter = self.metrics.counter('Items')
+        self.metrics.start()
+        counter.add(5)
+        # init() of another thread
+        self.metrics.start()
+        self.assertEqual(counter.get(), 5)
+
+    def test_drain_and_merge(self):
+        self.metrics.counter('Items').add(3)
+        self.metrics.counter('Empty')
+        self.metrics.histogram('Sizes').add(10)
+        timer = self.metrics.timer('Prediction', 'images')
+        start = time.perf_counter_ns()
+        timer.add(start, 4)
+
+        values = self.metrics.drain()
+        self.assertEqual(set(values), {'Items', 'Sizes', 'Prediction'})
+        self.assertEqual(self.metrics.counter('Items').get(), 0)
+        self.assertEqual(timer.calls.sum(), 0)
+        self.assertEqual(self.metrics.drain(), {})
+
+        # values are sent as JSON by external processes
+        values = json.loads(json.dumps(values))
+        other = PythonTaskMetrics.Metrics('TestTask')
+        other.counter('Items').add(1)
+        other.merge(values)
+        other.merge(values)
+        self.assertEqual(other.counter('Items').get(), 7)
+        self.assertEqual(other.histogram('Sizes').count(), 2)
+        merged = other.timer('Prediction')
+        self.assertEqual(merged.unit, 'images')
+        self.assertEqual(merged.calls.sum(), 2)
+        self.assertEqual(merged.units.sum(), 8)
+        self.assertEqual(merged.first_start.get(), start)
+        self.assertGreater(merged.last_end.get(), start)
+
+    def test_drain_all_and_merge_all(self):
+        PythonTaskMetrics.get('DrainedTask').counter('Items').add(2)
+        values = PythonTaskMetrics.drainAll()
+        self.assertEqual(values['DrainedTask'], {'Items': {'type': 'counter', 'value': 2}})
+        self.assertNotIn('DrainedTask', PythonTaskMetrics.drainAll())
+
+        PythonTaskMetrics.mergeAll(values)
+        self.assertEqual(PythonTaskMetrics.get('DrainedTask').counter('Items').get(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
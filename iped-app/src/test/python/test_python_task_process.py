@@ -0,0 +1,138 @@
+"""
+Tests of the out of process mode of task scripts, run by PythonTaskProcess.py. Run from the repository root with:
+    python -m unittest discover -s iped-app/src/test/python
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+
+TASKS_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources', 'scripts', 'tasks'))
+sys.path.insert(0, TASKS_DIR)
+
+import SubprocessPool
+
+# java class imported by PythonTaskProcessPool.py when loaded
+lang = types.ModuleType('java.lang')
+lang.System = types.SimpleNamespace(getProperty=lambda name: None)
+sys.modules.setdefault('java', types.ModuleType('java'))
+sys.modules['java.lang'] = lang
+
+import FiscalDataExtractionTask
+import PythonTaskMetrics
+import PythonTaskProcessPool
+
+# Script returning the configuration received by init() and the number of processed views
+SCRIPT = '''
+class ConfigScriptTask:
+
+    def init(self, configuration):
+        self.configuration = configuration
+        self.views = 0
+
+    def processView(self, view):
+        self.views += 1
+        return {'extraAttributes': {'configuration': self.configuration, 'views': self.views, 'name': view['name']}}
+'''
+
+NFE_TEXT = '''DANFE
+DOCUMENTO AUXILIAR DA NOTA FISCAL ELETRONICA
+0 - ENTRADA 1 - SAIDA
+CHAVE DE ACESSO
+NATUREZA DA OPERACAO VENDA
+'''
+
+
+class Logger:
+
+    def info(self, msg):
+        pass
+
+    def warn(self, msg):
+        pass
+
+
+class PythonTaskProcessTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.shutdown()
+        shutil.rmtree(self.dir)
+
+    def createPool(self, script_dir, script_name, config):
+        # same command line of PythonTaskProcessPool.ProcessPool
+        args = [sys.executable, os.path.join(TASKS_DIR, 'PythonTaskProcess.py'), script_dir, script_name, json.dumps(config)]
+        pool = SubprocessPool.SubprocessPool(script_name, args, 1, Logger(), timeout=30, start_timeout=30)
+        self.pools.append(pool)
+        return pool
+
+    def processView(self, pool, view):
+        def call(worker):
+            worker.send(json.dumps(view))
+            return json.loads(worker.readline())
+        return pool.call(call)
+
+    def test_init_runs_before_first_item(self):
+        with open(os.path.join(self.dir, 'ConfigScriptTask.py'), 'w') as f:
+            f.write(SCRIPT)
+        pool = self.createPool(self.dir, 'ConfigScriptTask', {'minSize': 48})
+
+        result = self.processView(pool, {'name': 'a.jpg'})
+        self.assertEqual(result['extraAttributes'], {'configuration': {'minSize': 48}, 'views': 1, 'name': 'a.jpg'})
+        result = self.processView(pool, {'name': 'b.jpg'})
+        self.assertEqual(result['extraAttributes']['views'], 2)
+
+    def test_init_without_configuration(self):
+        with open(os.path.join(self.dir, 'ConfigScriptTask.py'), 'w') as f:
+            f.write(SCRIPT)
+        pool = self.createPool(self.dir, 'ConfigScriptTask', None)
+        result = self.processView(pool, {'name': 'a.jpg'})
+        self.assertIsNone(result['extraAttributes']['configuration'])
+
+    def test_fiscal_data_extraction_out_of_process(self):
+        pool = self.createPool(TASKS_DIR, 'FiscalDataExtractionTask', None)
+        result = self.processView(pool, {'path': 'nfe.pdf', 'mediaType': 'application/pdf', 'text': NFE_TEXT})
+        self.assertEqual(result['metadata']['fiscal:docType'], 'NFe')
+        self.assertEqual(result['categories'], ['Tax Invoices'])
+        metrics = result['metrics']['FiscalDataExtractionTask']
+        self.assertEqual(metrics['Document type detection']['calls'], 1)
+        self.assertEqual(metrics['Regex extraction']['calls'], 1)
+
+        # metrics of each result are the ones measured since the previous result
+        result = self.processView(pool, {'path': 'other.pdf', 'mediaType': 'application/pdf', 'text': 'Relatorio anual'})
+        metrics = result.pop('metrics')['FiscalDataExtractionTask']
+        self.assertEqual(list(metrics), ['Document type detection'])
+        self.assertEqual(metrics['Document type detection']['calls'], 1)
+        self.assertEqual(result, {})
+
+    def test_process_pool_merges_metrics(self):
+        PythonTaskProcessPool.logger = Logger()
+        self.assertTrue(os.path.isfile(PythonTaskProcessPool.bin), PythonTaskProcessPool.bin)
+        pool = PythonTaskProcessPool.ProcessPool(TASKS_DIR, 'FiscalDataExtractionTask', 1, timeout=30)
+        self.pools.append(pool)
+        task = FiscalDataExtractionTask.FiscalDataExtractionTask()
+        metrics = PythonTaskMetrics.get('FiscalDataExtractionTask')
+        detection = metrics.timer('Document type detection')
+        calls, checked, rejected = detection.calls.sum(), metrics.counter('PDFs checked').get(), metrics.counter('PDFs rejected by pre-filter').get()
+
+        item = FiscalDataExtractionTask.StandaloneItem('nfe.pdf', NFE_TEXT)
+        pool.process(task, item)
+        self.assertEqual(item.metadata.values['docType'], 'NFe')
+        self.assertEqual(item.categories, ['Tax Invoices'])
+        pool.process(task, FiscalDataExtractionTask.StandaloneItem('other.pdf', 'Relatorio anual'))
+
+        # the pre-filter runs here, detection in the external process
+        self.assertEqual(metrics.counter('PDFs checked').get() - checked, 2)
+        self.assertEqual(metrics.counter('PDFs rejected by pre-filter').get() - rejected, 1)
+        self.assertEqual(detection.calls.sum() - calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,295 @@
+"""
+Tests that WalletMatcher of SearchHardwareWallets.py finds the same wallets of the previous per wallet
+'(?i).*VID.*PID.*' loop, over all wallets in hardwarewallets.json. Run from the repository root with:
+    python -m unittest discover -s iped-app/src/test/python
+"""
+import json
+import os
+import random
+import re
+import sys
+import types
+import unittest
+
+BASE_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+TASKS_DIR = os.path.join(BASE_DIR, 'resources', 'scripts', 'tasks')
+WALLETS_FILE = os.path.join(BASE_DIR, 'resources', 'config', 'conf', 'hardwarewallets.json')
+sys.path.insert(0, TASKS_DIR)
+
+# java classes imported by the script when loaded
+registry = types.ModuleType('iped.parsers.registry')
+registry.RegRipperParser = types.SimpleNamespace(FULL_REPORT_SUFFIX='_Full_Report')
+for name in ('iped', 'iped.parsers'):
+    sys.modules.setdefault(name, types.ModuleType(name))
+sys.modules['iped.parsers.registry'] = registry
+
+import SearchHardwareWallets as hw
+
+NOISE = ['Device Parameters', 'LastWrite Time: 2023-01-10 12:00:00Z', 'FriendlyName: USB Input Device',
+         'ParentIdPrefix: 7&1a2b3c4d&0', 'Service: HidUsb', 'Mfg: (Standard system devices)', ' ', '>>>  Section end 2014/06/26 15:43:51.210',
+         '<<<  [Exit status: SUCCESS]', 'dvi: {Build Driver List} 15:43:49.263']
+
+
+def old_registry_regex(wallet):
+    return r'(?i).*' + str(wallet.get('VendorID')) + '.*' + str(wallet.get('ProductID')) + '.*'
+
+
+def old_setupapi_regex(wallet):
+    return r'(?i).*Device Install.*VID_' + str(wallet.get('VendorID')) + '&PID_' + str(wallet.get('ProductID')) + '.*'
+
+
+def old_registry_devices(wallets, text):
+    '''
+    Sub-items created by the previous code for the SYSTEM registry report.
+    '''
+    devices = []
+    lines = text.split('\n')
+    for w in wallets:
+        regex = old_registry_regex(w)
+        for i in [i for i, x in enumerate(lines) if re.match(regex, x)]:
+            info = ''
+            lineNo = i
+            while len(lines[lineNo]) > 1:
+                info += lines[lineNo] + '\n'
+                lineNo += 1
+            devices.append((info, w))
+    return devices
+
+
+def old_setupapi_devices(wallets, text):
+    '''
+    Sub-items created by the previous code for setupapi.dev.log.
+    '''
+    devices = []
+    lines = text.split('\n')
+    for w in wallets:
+        regex = old_setupapi_regex(w)
+        for i in [i for i, x in enumerate(lines) if re.match(regex, x)]:
+            devices.append((lines[i] + '\n' + lines[i + 1], w))
+    return devices
+
+
+def random_id(rnd):
+    return ''.join(rnd.choice('0123456789abcdefABCDEF') for i in range(4))
+
+
+def vid_pid(rnd, wallets):
+    '''
+    Ids of a wallet, sometimes changing case, of another wallet or random ones.
+    '''
+    choice = rnd.random()
+    if choice < 0.6:
+        w = rnd.choice(wallets)
+        vid, pid = str(w.get('VendorID')), str(w.get('ProductID'))
+        if rnd.random() < 0.3:
+            vid, pid = vid.swapcase(), pid.swapcase()
+        return vid, pid
+    if choice < 0.8:
+        return str(rnd.choice(wallets).get('VendorID')), str(rnd.choice(wallets).get('ProductID'))
+    return random_id(rnd), random_id(rnd)
+
+
+def registry_report(rnd, wallets, devices=400):
+    lines = []
+    for d in range(devices):
+        vid, pid = vid_pid(rnd, wallets)
+        formats = [f'USB\\VID_{vid}&PID_{pid}\\{random_id(rnd)}', f'  VID_{vid}&PID_{pid}', f'HID\\VID_{vid}&PID_{pid}&MI_00',
+                   f'{pid} {vid}', f'DeviceDesc: {vid}:{pid} device', f'USBSTOR\\Disk&Ven_{vid}&Prod_{pid}&Rev_1.00']
+        lines.append(rnd.choice(formats))
+        for i in range(rnd.randint(0, 4)):
+            lines.append(rnd.choice(NOISE) if rnd.random() < 0.8 else rnd.choice(formats))
+        lines.append(rnd.choice(['', 'x']) if rnd.random() < 0.1 else '')
+    # the previous code reads device blocks until an empty line
+    return '\n'.join(lines) + '\n\n'
+
+
+def setupapi_log(rnd, wallets, devices=400):
+    lines = ['[Device Install Log]', '     OS Version = 10.0.19045']
+    for d in range(devices):
+        vid, pid = vid_pid(rnd, wallets)
+        formats = [f'>>>  [Setup online Device Install (Hardware initiated) - USB\\VID_{vid}&PID_{pid}\\6&2e9d4003&0&4]',
+                   f'>>>  [Device Install (DiInstallDriver) - USB\\VID_{vid}&PID_{pid}&MI_01]',
+                   f'>>>  [Setup Import Driver Package - USB\\VID_{vid}&PID_{pid}]',
+                   f'     dvi: Device Install USB\\vid_{vid}&pid_{pid}']
+        lines.append(rnd.choice(formats))
+        lines.append('>>>  Section start 2014/06/26 15:43:49.248')
+        for i in range(rnd.randint(0, 3)):
+            lines.append(rnd.choice(NOISE))
+    # the previous code reads the line after each match
+    return '\n'.join(lines) + '\n'
+
+
+class ReportItem:
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+
+    def getName(self):
+        return self.name
+
+
+class SearchHardwareWalletsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(WALLETS_FILE) as f:
+            cls.wallets = json.load(f)
+
+    def setUp(self):
+        self.created = []
+        self.saved = hw.newSubItem, hw.readLines
+        hw.newSubItem = lambda task, item, text, subItemID, info: self.created.append((subItemID, text, info))
+        hw.readLines = lambda item: iter(item.text.split('\n'))
+        hw.SearchHardwareWallets.registryMatcher = hw.WalletMatcher(self.wallets, hw.registryTemplate)
+        hw.SearchHardwareWallets.setupapiMatcher = hw.WalletMatcher(self.wallets, hw.setupapiTemplate)
+
+    def tearDown(self):
+        hw.newSubItem, hw.readLines = self.saved
+
+    def assertSameMatches(self, matcher, old_regex, text):
+        for line in text.split('\n'):
+            expected = [j for j, w in enumerate(self.wallets) if re.match(old_regex(w), line)]
+            self.assertEqual(matcher.matches(line), expected, line)
+
+    def test_every_wallet_is_matched(self):
+        matcher = hw.SearchHardwareWallets.registryMatcher
+        for j, w in enumerate(self.wallets):
+            line = f'USB\\VID_{w.get("VendorID")}&PID_{w.get("ProductID")}\\5&1234'
+            self.assertIn(j, matcher.matches(line))
+            self.assertIn(j, matcher.matches(line.lower()))
+        matcher = hw.SearchHardwareWallets.setupapiMatcher
+        for j, w in enumerate(self.wallets):
+            line = f'>>>  [Device Install (Hardware initiated) - USB\\VID_{w.get("VendorID")}&PID_{w.get("ProductID")}]'
+            self.assertIn(j, matcher.matches(line))
+
+    def test_registry_matches(self):
+        for seed in range(5):
+            text = registry_report(random.Random(seed), self.wallets)
+            self.assertSameMatches(hw.SearchHardwareWallets.registryMatcher, old_registry_regex, text)
+
+    def test_setupapi_matches(self):
+        for seed in range(5):
+            text = setupapi_log(random.Random(seed), self.wallets)
+            self.assertSameMatches(hw.SearchHardwareWallets.setupapiMatcher, old_setupapi_regex, text)
+
+    def test_registry_sub_items(self):
+        for seed in range(5):
+            text = registry_report(random.Random(seed), self.wallets)
+            self.created = []
+            hw.SearchHardwareWallets().process(ReportItem('SYSTEM_Full_Report', text))
+            expected = old_registry_devices(self.wallets, text)
+            self.assertGreater(len(expected), 0)
+            self.assertEqual(self.created, [(i, info, w) for i, (info, w) in enumerate(expected)])
+
+    def test_setupapi_sub_items(self):
+        for seed in range(5):
+            text = setupapi_log(random.Random(seed), self.wallets)
+            for name in ('setupapi.dev.log', 'setupapi.dev.20140626_154349.log'):
+                self.created = []
+                hw.SearchHardwareWallets().process(ReportItem(name, text))
+                expected = old_setupapi_devices(self.wallets, text)
+                self.assertGreater(len(expected), 0)
+                self.assertEqual(self.created, [(i, info, w) for i, (info, w) in enumerate(expected)])
+
+    def test_other_items_are_ignored(self):
+        hw.SearchHardwareWallets().process(ReportItem('SOFTWARE_Full_Report', 'USB\\VID_0C45&PID_64AD'))
+        self.assertEqual(self.created, [])
+
+
+def read_line_split(text):
+    '''
+    Lines returned by java BufferedReader.readLine() until it returns null.
+    '''
+    lines = re.split(r'\r\n|\r|\n', text)
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+class CharBuffer:
+    '''
+    The methods of java.nio.CharBuffer used by readChunks().
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.chars = ''
+
+    @staticmethod
+    def allocate(size):
+        return CharBuffer(size)
+
+    def flip(self):
+        return self
+
+    def toString(self):
+        return self.chars
+
+    def clear(self):
+        self.chars = ''
+        return self
+
+
+class TextReader:
+
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+        self.calls = 0
+        self.closed = False
+
+    def read(self, buffer):
+        self.calls += 1
+        if self.pos == len(self.text):
+            return -1
+        buffer.chars = self.text[self.pos:self.pos + buffer.size]
+        self.pos += len(buffer.chars)
+        return len(buffer.chars)
+
+    def close(self):
+        self.closed = True
+
+
+class ReadLinesTest(unittest.TestCase):
+
+    TEXTS = ['', '\n', 'a', 'a\n', 'a\r', 'a\r\n', '\r\n\r\n', 'a\rb\r\nc\n\nd', 'a\r\r\nb\n\r', 'x' * 10 + '\r\n' + 'y' * 3]
+
+    def test_split_lines(self):
+        for text in self.TEXTS:
+            self.assertEqual(list(hw.splitLines([text])), read_line_split(text), repr(text))
+
+    def test_split_lines_across_chunks(self):
+        rnd = random.Random(0)
+        texts = self.TEXTS + [''.join(rnd.choice('ab\r\n') for i in range(200)) for n in range(50)]
+        for text in texts:
+            for size in (1, 2, 3, 7, 64):
+                chunks = [text[i:i + size] for i in range(0, len(text), size)]
+                self.assertEqual(list(hw.splitLines(chunks)), read_line_split(text), repr(text))
+
+    def test_read_lines_in_chunks(self):
+        java_nio = types.ModuleType('java.nio')
+        java_nio.CharBuffer = CharBuffer
+        saved = sys.modules.get('java.nio'), hw.readChunkSize
+        sys.modules['java.nio'] = java_nio
+        hw.readChunkSize = 1000
+        try:
+            with open(WALLETS_FILE) as f:
+                text = registry_report(random.Random(0), json.load(f))
+            reader = TextReader(text)
+            item = types.SimpleNamespace(getTextReader=lambda: reader)
+            self.assertEqual(list(hw.readLines(item)), read_line_split(text))
+            # one call to java by chunk, not by line, plus the last one returning -1
+            self.assertEqual(reader.calls, -(-len(text) // 1000) + 1)
+            self.assertTrue(reader.closed)
+            self.assertEqual(list(hw.readLines(types.SimpleNamespace(getTextReader=lambda: None))), [])
+        finally:
+            hw.readChunkSize = saved[1]
+            if saved[0] is None:
+                del sys.modules['java.nio']
+            else:
+                sys.modules['java.nio'] = saved[0]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Tests of the restart, timeout and failure paths of SubprocessPool.py. Run from the repository root with:
+    python -m unittest discover -s iped-app/src/test/python
+"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+TASKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources', 'scripts', 'tasks')
+sys.path.insert(0, os.path.normpath(TASKS_DIR))
+
+import SubprocessPool
+
+# External process answering 'echo <text>', crashing on 'crash', hanging on 'hang', exiting with
+# status 0 without answering on 'exit' and exiting with status 0 after answering on 'last <text>'.
+# 'retire <text>' answers and exits with status 0 a moment later, without reading the next request.
+# 'crash_once <file>' crashes just if the file does not exist, creating it.
+PROCESS_SCRIPT = '''
+import os
+import sys
+import time
+
+for line in iter(sys.stdin.readline, ''):
+    line = line.strip()
+    if line == 'terminate_process':
+        break
+    cmd, sep, arg = line.partition(' ')
+    if cmd == 'ping':
+        print('ping', flush=True)
+    elif cmd == 'echo':
+        print(arg, flush=True)
+    elif cmd == 'last':
+        print(arg, flush=True)
+        sys.exit(0)
+    elif cmd == 'retire':
+        print(arg, flush=True)
+        time.sleep(0.5)
+        sys.exit(0)
+    elif cmd == 'crash':
+        sys.exit(1)
+    elif cmd == 'crash_once':
+        if not os.path.exists(arg):
+            open(arg, 'w').close()
+            sys.exit(1)
+        print('recovered', flush=True)
+    elif cmd == 'hang':
+        time.sleep(60)
+    elif cmd == 'exit':
+        sys.exit(0)
+'''
+
+
+class Logger:
+
+    def __init__(self):
+        self.warnings = []
+
+    def info(self, msg):
+        pass
+
+    def warn(self, msg):
+        self.warnings.append(msg)
+
+
+def request(line):
+    def call(worker):
+        worker.send(line)
+        return worker.readline()
+    return call
+
+
+class SubprocessPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.script = os.path.join(self.dir, 'process.py')
+        with open(self.script, 'w') as f:
+            f.write(PROCESS_SCRIPT)
+        self.logger = Logger()
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.shutdown()
+        shutil.rmtree(self.dir)
+
+    def createPool(self, max_processes=1, **kwargs):
+        kwargs.setdefault('timeout', 10)
+        kwargs.setdefault('start_timeout', 10)
+        pool = SubprocessPool.SubprocessPool('Test', [sys.executable, self.script], max_processes, self.logger, **kwargs)
+        self.pools.append(pool)
+        return pool
+
+    def test_default_timeouts_are_finite(self):
+        pool = SubprocessPool.SubprocessPool('Test', [sys.executable, self.script], 1, self.logger)
+        self.assertIsNotNone(pool.timeout)
+        self.assertIsNotNone(pool.start_timeout)
+
+    def test_call(self):
+        pool = self.createPool()
+        self.assertEqual(pool.call(request('echo hello')), 'hello')
+        self.assertEqual(pool.call(request('echo world')), 'world')
+        self.assertEqual(pool.num_created, 1)
+        self.assertEqual(pool.restarts, 0)
+
+    def test_crashed_process_is_restarted_and_request_retried(self):
+        pool = self.createPool()
+        flag = os.path.join(self.dir, 'crashed')
+        self.assertEqual(pool.call(request('crash_once ' + flag)), 'recovered')
+        self.assertEqual(pool.restarts, 1)
+        self.assertEqual(pool.call(request('echo ok')), 'ok')
+
+    def test_failure_after_retries(self):
+        pool = self.createPool()
+        with self.assertRaises(SubprocessPool.WorkerError):
+            pool.call(request('crash'), retries=2)
+        self.assertEqual(pool.restarts, 3)
+        self.assertEqual(pool.num_created, 0)
+
+    def test_timeout(self):
+        pool = self.createPool(timeout=0.5)
+        with self.assertRaises(SubprocessPool.WorkerError) as cm:
+            pool.call(request('hang'), retries=0)
+        self.assertIn('Timeout', str(cm.exception))
+        self.assertEqual(pool.restarts, 1)
+        self.assertEqual(pool.call(request('echo ok')), 'ok')
+
+    def test_exit_after_request_is_a_failure(self):
+        pool = self.createPool()
+        with self.assertRaises(SubprocessPool.WorkerError):
+            pool.call(request('exit'), retries=1)
+        self.assertEqual(pool.restarts, 2)
+
+    def test_exit_before_request_is_not_a_failure(self):
+        pool = self.createPool()
+        exited = []
+
+        def last(worker):
+            exited.append(worker.proc.pid)
+            return request('last bye')(worker)
+
+        def call(worker):
+            if worker.proc.pid in exited:
+                # the request is written just after the process exited by itself
+                worker.proc.wait()
+            return request('echo hello')(worker)
+
+        self.assertEqual(pool.call(last), 'bye')
+        self.assertEqual(pool.call(call, retries=0), 'hello')
+        self.assertEqual(pool.restarts, 0)
+
+    def test_exit_while_request_is_written_is_not_a_failure(self):
+        pool = self.createPool()
+        self.assertEqual(pool.call(request('retire bye')), 'bye')
+        # written to the pipe of the exiting process, then retried in a new one without retry cost
+        self.assertEqual(pool.call(request('echo hello'), retries=0), 'hello')
+        self.assertEqual(pool.restarts, 0)
+        self.assertEqual(pool.num_created, 1)
+
+    def test_restart_limit(self):
+        pool = self.createPool(max_restarts=1)
+        with self.assertRaises(SubprocessPool.WorkerError):
+            pool.call(request('crash'), retries=1)
+        with self.assertRaises(Exception) as cm:
+            pool.call(request('echo ok'))
+        self.assertIn('Restart limit', str(cm.exception))
+
+    def test_concurrent_processes(self):
+        pool = self.createPool(max_processes=2)
+        workers = [pool.acquire(), pool.acquire()]
+        self.assertNotEqual(workers[0].proc.pid, workers[1].proc.pid)
+        for worker in workers:
+            pool.idle.put(worker)
+        self.assertEqual(pool.call(request('echo ok')), 'ok')
+        self.assertEqual(pool.num_created, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+Tests of WhisperProcess.py helpers. Run from the repository root with:
+    python -m unittest discover -s iped-app/src/test/python
+"""
+import importlib.util
+import os
+import sys
+import unittest
+
+TASKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources', 'scripts', 'tasks')
+sys.path.insert(0, os.path.normpath(TASKS_DIR))
+
+# WhisperProcess redirects stdout to stderr when imported
+WhisperProcess = None
+if importlib.util.find_spec('numpy'):
+    stdout = sys.stdout
+    import WhisperProcess
+    sys.stdout = stdout
+
+
+class FakeModel:
+
+    def __init__(self, languages):
+        self.languages = languages
+        self.detected = []
+
+    def detect_language(self, audio):
+        self.detected.append(audio)
+        return self.languages[audio]
+
+
+@unittest.skipIf(WhisperProcess is None, 'numpy is not installed')
+class WhisperProcessTest(unittest.TestCase):
+
+    def test_parse_request(self):
+        files, languages = WhisperProcess.parse_request('/tmp/a.wav,/tmp/b.wav|pt,/tmp/c.wav|')
+        self.assertEqual(files, ['/tmp/a.wav', '/tmp/b.wav', '/tmp/c.wav'])
+        self.assertEqual(languages, [None, 'pt', None])
+
+    def test_languages_detected_once(self):
+        model = FakeModel({'/tmp/a.wav': 'pt', '/tmp/b.wav': 'en', '/tmp/c.wav': 'pt'})
+        files, languages = WhisperProcess.parse_request('/tmp/a.wav,/tmp/b.wav,/tmp/c.wav')
+        # audios don't exist, so they are loaded by the fallback function
+        groups = WhisperProcess.group_by_language(model, files, languages, lambda f: f)
+        self.assertEqual(groups, {'pt': [0, 2], 'en': [1]})
+        self.assertEqual(languages, ['pt', 'en', 'pt'])
+        self.assertEqual(len(model.detected), 3)
+
+        # a retry with the reported languages does not detect them again
+        files, languages = WhisperProcess.parse_request('/tmp/a.wav|pt,/tmp/b.wav|en,/tmp/c.wav|pt')
+        groups = WhisperProcess.group_by_language(model, files, languages, lambda f: f)
+        self.assertEqual(groups, {'pt': [0, 2], 'en': [1]})
+        self.assertEqual(len(model.detected), 3)
+
+    def test_partial_languages(self):
+        model = FakeModel({'/tmp/b.wav': 'es'})
+        files, languages = WhisperProcess.parse_request('/tmp/a.wav|pt,/tmp/b.wav')
+        groups = WhisperProcess.group_by_language(model, files, languages, lambda f: f)
+        self.assertEqual(groups, {'pt': [0], 'es': [1]})
+        self.assertEqual(model.detected, ['/tmp/b.wav'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -37,6 +37,9 @@ public class AudioTranscriptConfig extends AbstractTaskPropertiesConfig {
     private static final String PRECISION = "precision";
     private static final String BATCH_SIZE = "batchSize";
     private static final String DEVICE = "device";
+    private static final String TRANSCRIPT_CACHE_PATH = "transcriptCachePath";
+    private static final String VAD_FILTER = "vadFilter";
+    private static final String PROCESSES_PER_GPU = "processesPerGpu";
 
     private List<String> languages = new ArrayList<>();
     private List<String> mimesToProcess = new ArrayList<>();
@@ -56,11 +59,30 @@ public class AudioTranscriptConfig extends AbstractTaskPropertiesConfig {
     private String precision = "int8";
     private int batchSize = 1;
     private String device = "cpu";
+    private String transcriptCachePath;
+    private boolean vadFilter = false;
+    private int processesPerGpu = 1;
 
     public String getDevice() {
         return device;
     }
 
+    /**
+     * @return path of the SQLite transcription cache shared among cases or null to
+     *         use the default cache stored in the case output
+     */
+    public String getTranscriptCachePath() {
+        return transcriptCachePath;
+    }
+
+    public int getProcessesPerGpu() {
+        return processesPerGpu;
+    }
+
+    public boolean isVadFilter() {
+        return vadFilter;
+    }
+
     public String getPrecision() {
         return precision;
     }
@@ -212,6 +234,21 @@ public void processProperties(UTF8Properties properties) {
         if (value != null && !value.isBlank()) {
             device = value.strip();
         }
+
+        value = properties.getProperty(PROCESSES_PER_GPU);
+        if (value != null && !value.isBlank()) {
+            processesPerGpu = Integer.parseInt(value.strip());
+        }
+
+        value = properties.getProperty(VAD_FILTER);
+        if (value != null && !value.isBlank()) {
+            vadFilter = Boolean.valueOf(value.strip());
+        }
+
+        value = properties.getProperty(TRANSCRIPT_CACHE_PATH);
+        if (value != null && !value.isBlank()) {
+            transcriptCachePath = value.strip();
+        }
     }
 
     /**
@@ -91,7 +91,14 @@ private void loadTasks(String xml, Map<String, AbstractTask> tasks) throws Insta
                         throw new IPEDException("Script File not found: " + script.getAbsolutePath()); //$NON-NLS-1$
                     }
                 }
-                tasks.putIfAbsent(scriptName, getScriptTask(script));
+                AbstractTask task = getScriptTask(script);
+                Node processes = node.getAttributes().getNamedItem("processes"); //$NON-NLS-1$
+                if (processes != null && task instanceof PythonTask) {
+                    String value = processes.getNodeValue().trim();
+                    int numProcesses = "auto".equalsIgnoreCase(value) ? Runtime.getRuntime().availableProcessors() : Integer.parseInt(value);
+                    ((PythonTask) task).setNumProcesses(numProcesses);
+                }
+                tasks.putIfAbsent(scriptName, task);
             }
         }
     }
@@ -76,6 +76,9 @@ public class Statistics {
     int ioerrors = 0;
     AtomicInteger subitensDiscovered = new AtomicInteger();
 
+    // python script function calls: count, total, p50 and p99 times (ns)
+    private TreeMap<String, long[]> pythonFunctionStats = new TreeMap<>();
+
     public static Statistics get(ICaseData caseData, File indexDir) {
         if (instance == null) {
             instance = new Statistics(caseData, indexDir);
@@ -227,6 +230,44 @@ public int getSubitemsDiscovered() {
         return this.subitensDiscovered.get();
     }
 
+    synchronized public void setPythonFunctionStats(String script, String function, long count, long totalNanos, long p50Nanos, long p99Nanos) {
+        pythonFunctionStats.put(script + "." + function, new long[] { count, totalNanos, p50Nanos, p99Nanos });
+    }
+
+    private synchronized void logPythonFunctionStats() {
+        if (pythonFunctionStats.isEmpty()) {
+            return;
+        }
+        LOGGER.info("Processing Times per Python Function:");
+        StringBuilder sb = new StringBuilder();
+        sb.append(String.format("%-45s", "FUNCTION"));
+        sb.append(String.format(" %10s", "CALLS"));
+        sb.append(String.format(" %9s", "TIME(s)"));
+        sb.append(String.format(" %9s", "AVG(ms)"));
+        sb.append(String.format(" %9s", "P50(ms)"));
+        sb.append(String.format(" %9s", "P99(ms)"));
+        LOGGER.info(sb.toString());
+        sb.setLength(0);
+        sb.append(String.format("%-45s", "").replace(' ', '='));
+        sb.append(" ").append(String.format("%10s", "").replace(' ', '='));
+        for (int i = 0; i < 4; i++) {
+            sb.append(" ").append(String.format("%9s", "").replace(' ', '='));
+        }
+        LOGGER.info(sb.toString());
+        sb.setLength(0);
+        for (String function : pythonFunctionStats.keySet()) {
+            long[] stats = pythonFunctionStats.get(function);
+            sb.append(String.format("%-45s", function));
+            sb.append(String.format(" %10d", stats[0]));
+            sb.append(String.format(" %9d", stats[1] / 1000000000));
+            sb.append(String.format(" %9.3f", stats[1] / 1000000.0 / stats[0]));
+            sb.append(String.format(" %9.3f", stats[2] / 1000000.0));
+            sb.append(String.format(" %9.3f", stats[3] / 1000000.0));
+            LOGGER.info(sb.toString());
+            sb.setLength(0);
+        }
+    }
+
     public void logStatistics(Manager manager) throws Exception {
 
         int processed = getProcessed();
@@ -301,6 +342,8 @@ public void logStatistics(Manager manager) throws Exception {
                 sb.setLength(0);
             }
         }
+
+        logPythonFunctionStats();
         
         int numDocs;
         try (IndexReader reader = DirectoryReader.open(ConfiguredFSDirectory.open(indexDir))) {
@@ -3,8 +3,11 @@
 import java.io.File;
 import java.util.ArrayList;
 import java.util.Collections;
+import java.util.HashSet;
 import java.util.List;
 import java.util.Map;
+import java.util.Set;
+import java.util.WeakHashMap;
 import java.util.concurrent.ConcurrentHashMap;
 
 import org.apache.commons.lang3.StringUtils;
@@ -13,7 +16,9 @@
 
 import iped.configuration.Configurable;
 import iped.data.IItem;
+import iped.engine.config.AbstractTaskConfig;
 import iped.engine.config.ConfigurationManager;
+import iped.engine.config.EnableTaskProperty;
 import iped.engine.config.LocalConfig;
 import iped.engine.data.CaseData;
 import iped.engine.data.IPEDSource;
@@ -30,17 +35,37 @@ public class PythonTask extends AbstractTask {
     private static final String DISABLED = PythonParser.DISABLED;
     private static final String SEE_MANUAL = PythonParser.SEE_MANUAL;
 
+    private static final int DEFAULT_BATCH_SIZE = 50;
+
+    // max seconds an item is held in a partial batch, so it is not stuck if few items are held
+    private static final double DEFAULT_BATCH_MAX_WAIT = 60;
+
     private static final Logger LOGGER = LoggerFactory.getLogger(PythonTask.class);
     private static Map<File, JepException> jepExceptionPerScript = new ConcurrentHashMap<>();
     private static volatile File lastInstalledScript;
     private static volatile IPEDSource ipedCase;
     private static volatile int numInstances = 0;
 
+    // python modules and sys.path are shared by interpreters, but globals are not
+    private static Set<String> scriptDirsInPath = ConcurrentHashMap.newKeySet();
+    private static Set<String> importedScripts = ConcurrentHashMap.newKeySet();
+    private static Set<String> preloadCheckedScripts = ConcurrentHashMap.newKeySet();
+    private static Set<Jep> holderLoaded = Collections.synchronizedSet(Collections.newSetFromMap(new WeakHashMap<>()));
+
     private Map<Long, Boolean> scriptLoaded = new ConcurrentHashMap<>();
 
     private List<String> globals = Collections.synchronizedList(new ArrayList<>());
     private File scriptFile;
     private String moduleName;
+    private String processFunction;
+    private String processBatchFunction;
+    private int batchSize = DEFAULT_BATCH_SIZE;
+    private long batchMaxWaitMillis = (long) (DEFAULT_BATCH_MAX_WAIT * 1000);
+    private long batchStartTime;
+    private List<IItem> batch = new ArrayList<>();
+    private List<IItem> processedBatch = new ArrayList<>();
+    private Set<Integer> heldItemIds = new HashSet<>();
+    private int numProcesses = 0;
     private Boolean processQueueEnd;
     private boolean isEnabled = true;
     private boolean sendToNextTaskExists = true;
@@ -54,6 +79,14 @@ public void setThrowExceptionInsteadOfLogging(boolean value) {
         this.throwExceptionInsteadOfLogging = value;
     }
 
+    /**
+     * Sets the number of external processes running processView() of the script.
+     * If zero (default), process() is executed by the processing threads.
+     */
+    public void setNumProcesses(int numProcesses) {
+        this.numProcesses = numProcesses;
+    }
+
     public void setCaseData(CaseData caseData) {
         super.caseData = caseData;
     }
@@ -62,6 +95,22 @@ public class Converter {
         public KnnVector toKnnVector(double[] array) {
             return new KnnVector(array);
         }
+
+        /**
+         * Splits an array with the concatenated vectors of the given dimension,
+         * transferred from python at once, into vectors.
+         */
+        public List<KnnVector> toKnnVectors(float[] array, int dimension) {
+            List<KnnVector> vectors = new ArrayList<>(array.length / dimension);
+            for (int offset = 0; offset + dimension <= array.length; offset += dimension) {
+                double[] vector = new double[dimension];
+                for (int i = 0; i < dimension; i++) {
+                    vector[i] = array[offset + i];
+                }
+                vectors.add(new KnnVector(vector));
+            }
+            return vectors;
+        }
     }
 
     private Jep getJep() throws JepException {
@@ -109,20 +158,29 @@ private void loadScript(Jep jep, boolean init) throws JepException {
 
         setGlobalVars(jep);
 
-        jep.eval("import sys");
-        jep.eval("sys.path.append('" + scriptFile.getParentFile().getAbsolutePath().replace("\\", "\\\\") + "')");
+        String scriptDir = scriptFile.getParentFile().getAbsolutePath();
+        if (scriptDirsInPath.add(scriptDir)) {
+            jep.eval("import sys");
+            jep.eval("sys.path.append('" + scriptDir.replace("\\", "\\\\") + "')");
+        }
 
         String className = scriptFile.getName().replace(".py","");
         moduleName = className;
 
+        long t = System.nanoTime();
         jep.eval("import " + moduleName);
+        if (importedScripts.add(moduleName)) {
+            LOGGER.info("Python script {} imported in {}ms", moduleName, (System.nanoTime() - t) / 1000000);
+        }
 
-        // imports the script responsible for holding the instances per worker globally
-        jep.eval("from PythonTaskInstancesHolder import PythonTaskInstancesHolder");
-        jep.eval("PythonTaskInstancesHolder = PythonTaskInstancesHolder()");
+        if (holderLoaded.add(jep)) {
+            // imports the script responsible for holding the instances per worker globally
+            jep.eval("from PythonTaskInstancesHolder import PythonTaskInstancesHolder");
+            jep.eval("PythonTaskInstancesHolder = PythonTaskInstancesHolder()");
 
-        // sets logger object
-        jep.eval("PythonTaskInstancesHolder.logger = logger");
+            // sets logger object
+            jep.eval("PythonTaskInstancesHolder.logger = logger");
+        }
 
         int workerId = 0;
         if(this.worker!=null)
@@ -143,8 +201,42 @@ private void loadScript(Jep jep, boolean init) throws JepException {
         jep.set(taskInstancePerWorker, this);
         jep.eval("PythonTaskInstancesHolder.getInstance(" + workerId + ", '" + moduleName + "').javaTask" + " = " + taskInstancePerWorker);
 
+        // binds the process() method of the worker instance to a global, so it is invoked directly for each item
+        String processFunctionVar = moduleName + "_process_" + workerId;
+        if (numProcesses > 0) {
+            // items are processed by processView() of the script in a pool of external processes
+            jep.eval(processFunctionVar + " = PythonTaskInstancesHolder.getProcessPoolFunction(" + workerId + ", '" + scriptDir.replace("\\", "\\\\") + "', '"
+                    + moduleName + "', " + numProcesses + ")");
+            processFunction = processFunctionVar;
+        } else {
+            try {
+                jep.eval(processFunctionVar + " = PythonTaskInstancesHolder.getFunction(" + workerId + ", '" + moduleName + "', 'process')");
+                processFunction = processFunctionVar;
+            } catch (JepException e) {
+                processFunction = null;
+            }
+        }
+
+        // scripts implementing processBatch() receive the items held by process() in batches
+        String processBatchFunctionVar = moduleName + "_processBatch_" + workerId;
+        try {
+            if (numProcesses == 0) {
+                jep.eval(processBatchFunctionVar + " = PythonTaskInstancesHolder.getFunction(" + workerId + ", '" + moduleName + "', 'processBatch')");
+                processBatchFunction = processBatchFunctionVar;
+            }
+        } catch (JepException e) {
+            processBatchFunction = null;
+        }
+
+        if (init && preloadCheckedScripts.add(moduleName) && isEnabledInConfig(jep)) {
+            // imports heavy modules used by the script once, before init() of the first worker
+            jep.invoke("PythonTaskInstancesHolder.preload", moduleName);
+        }
+
         if (init) {
+            t = System.nanoTime();
             callPythonModuleFunction(jep, "init", ConfigurationManager.get());
+            LOGGER.debug("Python script {} initialized by worker {} in {}ms", moduleName, workerId, (System.nanoTime() - t) / 1000000);
         }
 
         try {
@@ -157,6 +249,64 @@ private void loadScript(Jep jep, boolean init) throws JepException {
                 throw e;
             }
         }
+
+        if (processBatchFunction != null) {
+            try {
+                Object size = callPythonModuleFunction(jep, "getBatchSize");
+                if (size != null) {
+                    batchSize = Math.max(1, ((Number) size).intValue());
+                }
+            } catch (JepException e) {
+                if (!e.toString().contains(" has no attribute ")) {
+                    throw e;
+                }
+            }
+            try {
+                Object maxWait = callPythonModuleFunction(jep, "getBatchMaxWait");
+                if (maxWait != null) {
+                    batchMaxWaitMillis = (long) (((Number) maxWait).doubleValue() * 1000);
+                }
+            } catch (JepException e) {
+                if (!e.toString().contains(" has no attribute ")) {
+                    throw e;
+                }
+            }
+        }
+    }
+
+    /**
+     * Returns false if the script is disabled by the loaded enable property or
+     * task config of its configurables. isEnabled() of the script is just known
+     * after init().
+     */
+    private boolean isEnabledInConfig(Jep jep) throws JepException {
+        List<Configurable<?>> configs;
+        try {
+            configs = (List<Configurable<?>>) callPythonModuleFunction(jep, "getConfigurables");
+        } catch (JepException e) {
+            if (e.toString().contains(" has no attribute ")) {
+                return true;
+            }
+            throw e;
+        }
+        ConfigurationManager configurationManager = ConfigurationManager.get();
+        if (configs == null || configurationManager == null) {
+            return true;
+        }
+        for (Configurable<?> config : configs) {
+            if (config instanceof EnableTaskProperty) {
+                EnableTaskProperty enableProp = configurationManager.getEnableTaskConfigurable(((EnableTaskProperty) config).getPropertyName());
+                if (enableProp != null && !enableProp.isEnabled()) {
+                    return false;
+                }
+            } else if (config instanceof AbstractTaskConfig) {
+                AbstractTaskConfig<?> taskConfig = configurationManager.getTaskConfigurable(((AbstractTaskConfig<?>) config).getTaskConfigFileName());
+                if (taskConfig != null && !taskConfig.isEnabled()) {
+                    return false;
+                }
+            }
+        }
+        return true;
     }
 
     @Override
@@ -218,6 +368,14 @@ public void finish() throws Exception {
         }
 
         if (isEnabled) {
+            // all items were processed, so call statistics of script functions are complete
+            getJep().invoke("PythonTaskInstancesHolder.reportStats", moduleName, stats);
+
+            if (numProcesses > 0) {
+                getJep().eval("import PythonTaskProcessPool");
+                getJep().invoke("PythonTaskProcessPool.shutdown", moduleName);
+            }
+
             IPEDSearcher searcher = new IPEDSearcher(ipedCase);
             setModuleVar(getJep(), moduleName, "ipedCase", ipedCase); //$NON-NLS-1$
             setModuleVar(getJep(), moduleName, "searcher", searcher); //$NON-NLS-1$
@@ -242,6 +400,21 @@ public void sendToNextTaskSuper(IItem item) throws Exception {
     @Override
     protected void sendToNextTask(IItem item) throws Exception {
 
+        if (isEnabled && processBatchFunction != null) {
+            // items held in the current batch are sent after being processed
+            boolean held = !item.isQueueEnd() && heldItemIds.contains(item.getId());
+            List<IItem> items = processedBatch;
+            processedBatch = new ArrayList<>();
+            for (IItem i : items) {
+                heldItemIds.remove(i.getId());
+                super.sendToNextTask(i);
+            }
+            if (!held) {
+                super.sendToNextTask(item);
+            }
+            return;
+        }
+
         if (!isEnabled || !sendToNextTaskExists) {
             super.sendToNextTask(item);
             return;
@@ -267,6 +440,10 @@ public boolean isEnabled() {
 
     @Override
     protected boolean processQueueEnd() {
+        if (processBatchFunction != null) {
+            // needed to process the last batch
+            return true;
+        }
         if (processQueueEnd == null) {
             try {
                 processQueueEnd = (Boolean) callPythonModuleFunction(getJep(), "processQueueEnd");
@@ -280,8 +457,18 @@ protected boolean processQueueEnd() {
     @Override
     public void process(IItem item) throws Exception {
 
+        Jep jep = getJep();
+        if (processBatchFunction != null) {
+            processInBatch(jep, item);
+            return;
+        }
+
         try {
-            callPythonModuleFunction(getJep(), "process", item);
+            if (processFunction != null) {
+                jep.invoke(processFunction, item);
+            } else {
+                callPythonModuleFunction(jep, "process", item);
+            }
 
         } catch (JepException e) {
             LOGGER.warn("Exception from " + getName() + " on " + item.getPath() + ": " + e.toString(), e);
@@ -291,6 +478,53 @@ public void process(IItem item) throws Exception {
         }
     }
 
+    /**
+     * Scripts implementing processBatch() return True from process() for items to
+     * be held in the current batch. The batch is passed to processBatch() when it
+     * is full, when the queue end is reached or when its first item was held for
+     * more than the batch max wait time, then its items are sent to the next task.
+     * Partial batches are checked when new items or queue ends are received, the
+     * latter are sent periodically while items are held and the queue is empty.
+     */
+    private void processInBatch(Jep jep, IItem item) throws Exception {
+        if (!item.isQueueEnd()) {
+            try {
+                Object result = processFunction != null ? jep.invoke(processFunction, item) : callPythonModuleFunction(jep, "process", item);
+                if (Boolean.TRUE.equals(result)) {
+                    if (batch.isEmpty()) {
+                        batchStartTime = System.currentTimeMillis();
+                    }
+                    batch.add(item);
+                    heldItemIds.add(item.getId());
+                }
+            } catch (JepException e) {
+                LOGGER.warn("Exception from " + getName() + " on " + item.getPath() + ": " + e.toString(), e);
+                if (e.toString().toLowerCase().contains("invalid thread access")) {
+                    throw e;
+                }
+            }
+        }
+        if (batch.size() >= batchSize || (!batch.isEmpty() && (item.isQueueEnd() || isBatchMaxWaitReached()))) {
+            List<IItem> items = batch;
+            batch = new ArrayList<>();
+            try {
+                jep.invoke(processBatchFunction, items);
+
+            } catch (JepException e) {
+                LOGGER.warn("Exception from " + getName() + " on batch of " + items.size() + " items: " + e.toString(), e);
+                if (e.toString().toLowerCase().contains("invalid thread access")) {
+                    throw e;
+                }
+            } finally {
+                processedBatch.addAll(items);
+            }
+        }
+    }
+
+    private boolean isBatchMaxWaitReached() {
+        return batchMaxWaitMillis > 0 && System.currentTimeMillis() - batchStartTime >= batchMaxWaitMillis;
+    }
+
     // This method is used to call a method in the script instance using the  
     // PythonTaskInstancesHolder utility script to call the correct instance
     private Object callPythonModuleFunction(Jep jep, String strFunctionName, Object... args) throws JepException {
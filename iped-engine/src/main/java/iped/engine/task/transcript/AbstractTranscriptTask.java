@@ -80,9 +80,12 @@ public abstract class AbstractTranscriptTask extends AbstractTask {
     private static final AtomicInteger transcriptionSuccess = new AtomicInteger();
     private static final AtomicInteger transcriptionFail = new AtomicInteger();
     private static final AtomicLong transcriptionChars = new AtomicLong();
+    private static final AtomicInteger cacheHits = new AtomicInteger();
 
     private Connection conn;
 
+    private TranscriptCache cache;
+
     protected IItem evidence;
 
     @Override
@@ -111,11 +114,24 @@ protected boolean isToProcess(IItem evidence) {
 
     private void createConnection() {
         this.conn = createConnection(output);
+        String cacheKey = getTranscriptCacheKey();
+        if (cacheKey != null) {
+            String cachePath = transcriptConfig.getTranscriptCachePath();
+            Connection cacheConn = cachePath == null ? this.conn : createConnection(new File(cachePath));
+            try {
+                this.cache = new TranscriptCache(cacheConn, cacheKey);
+            } catch (SQLException e) {
+                throw new RuntimeException(e);
+            }
+        }
     }
 
     private Connection createConnection(File output) {
-        File db = new File(output, TEXT_STORAGE);
-        db.getParentFile().mkdirs();
+        return createConnection(new File(output, TEXT_STORAGE), CREATE_TABLE);
+    }
+
+    private Connection createConnection(File db, String... createTables) {
+        db.getAbsoluteFile().getParentFile().mkdirs();
         try {
             SQLiteConfig config = new SQLiteConfig();
             config.setSynchronous(SynchronousMode.OFF);
@@ -123,7 +139,9 @@ private Connection createConnection(File output) {
             Connection conn = config.createConnection("jdbc:sqlite:" + db.getAbsolutePath());
 
             try (Statement stmt = conn.createStatement()) {
-                stmt.executeUpdate(CREATE_TABLE);
+                for (String createTable : createTables) {
+                    stmt.executeUpdate(createTable);
+                }
             }
 
             return conn;
@@ -136,6 +154,8 @@ private Connection createConnection(File output) {
     protected static class TextAndScore {
         String text;
         double score;
+        // language detected in the audio, null if not detected
+        String language;
     }
 
     private TextAndScore getTextFromDb(String id) throws IOException {
@@ -170,6 +190,17 @@ private void storeTextInDb(String id, String text, double score) throws IOExcept
         }
     }
 
+    /**
+     * Key identifying the model configuration (model, language, precision...) that
+     * produced the transcriptions, used to look up results in the transcription
+     * cache, which can be shared among cases.
+     * 
+     * @return the cache key or null if this implementation does not use the cache
+     */
+    protected String getTranscriptCacheKey() {
+        return null;
+    }
+
     @Override
     public List<Configurable<?>> getConfigurables() {
         return Arrays.asList(new AudioTranscriptConfig());
@@ -314,11 +345,22 @@ protected File getWavFile(File itemFile, String itemPath) throws IOException, In
 
     @Override
     public void finish() throws Exception {
+        if (cache != null) {
+            if (cache.getConnection() != conn) {
+                cache.getConnection().close();
+            }
+            cache = null;
+        }
         if (conn != null) {
             conn.close();
             conn = null;
         }
 
+        if (cacheHits.intValue() != 0) {
+            LOGGER.info("Transcriptions reused from cache: " + cacheHits.intValue());
+            cacheHits.set(0);
+        }
+
         long totWavConversions = wavSuccess.longValue() + wavFail.longValue();
         if (totWavConversions != 0) {
             LOGGER.info("Total conversions to WAV: " + totWavConversions);
@@ -382,9 +424,17 @@ protected void process(IItem evidence) throws Exception {
             return;
 
         TextAndScore prevResult = getTextFromDb(hash);
+        if (prevResult == null && cache != null) {
+            prevResult = cache.get(hash);
+            if (prevResult != null) {
+                storeTextInDb(hash, prevResult.text, prevResult.score);
+                cacheHits.incrementAndGet();
+            }
+        }
         if (prevResult != null) {
             evidence.getMetadata().set(ExtraProperties.CONFIDENCE_ATTR, Double.toString(prevResult.score));
             evidence.getMetadata().set(ExtraProperties.TRANSCRIPT_ATTR, prevResult.text);
+            setTranscriptLanguage(evidence, prevResult.language);
             return;
         }
 
@@ -409,7 +459,11 @@ protected void process(IItem evidence) throws Exception {
             if (result != null) {
                 evidence.getMetadata().set(ExtraProperties.CONFIDENCE_ATTR, Double.toString(result.score));
                 evidence.getMetadata().set(ExtraProperties.TRANSCRIPT_ATTR, result.text);
+                setTranscriptLanguage(evidence, result.language);
                 storeTextInDb(evidence.getHash(), result.text, result.score);
+                if (cache != null) {
+                    cache.put(evidence.getHash(), result);
+                }
                 transcriptionSuccess.incrementAndGet();
                 if (result.text != null) {
                     transcriptionChars.addAndGet(result.text.length());
@@ -429,6 +483,12 @@ protected void process(IItem evidence) throws Exception {
 
     }
 
+    private static void setTranscriptLanguage(IItem evidence, String language) {
+        if (language != null && !language.isEmpty()) {
+            evidence.getMetadata().set(ExtraProperties.TRANSCRIPT_LANGUAGE_ATTR, language);
+        }
+    }
+
     protected abstract TextAndScore transcribeAudio(File tmpFile) throws Exception;
 
 }
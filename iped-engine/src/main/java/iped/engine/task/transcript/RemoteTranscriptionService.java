@@ -17,6 +17,7 @@
 import java.nio.file.Path;
 import java.text.DecimalFormat;
 import java.util.ArrayList;
+import java.util.Arrays;
 import java.util.Deque;
 import java.util.LinkedList;
 import java.util.List;
@@ -50,6 +51,8 @@ static class TranscribeRequest {
         File wavAudio;
         TextAndScore result = null;
         Exception error = null;
+        // language detected in the audio, reused if it is transcribed again
+        String language = null;
 
         public TranscribeRequest(File wavAudio) {
             this.wavAudio = wavAudio;
@@ -219,6 +222,7 @@ public void run() {
     private static void transcribeAudios(AbstractTranscriptTask task) throws Exception {
         ArrayList<TranscribeRequest> transcribeRequests = new ArrayList<>();
         ArrayList<File> files = new ArrayList<File>();
+        ArrayList<String> languages = new ArrayList<>();
 
         if (executor.isShutdown()) {
             throw new Exception("Shutting down service instance...");
@@ -231,6 +235,7 @@ private static void transcribeAudios(AbstractTranscriptTask task) throws Excepti
                 TranscribeRequest req = toTranscribe.poll();
                 transcribeRequests.add(req);
                 files.add(req.wavAudio);
+                languages.add(req.language);
             }
         }
         logger.info("inicio da transcricao de " + files.size() + " audios");
@@ -240,19 +245,29 @@ private static void transcribeAudios(AbstractTranscriptTask task) throws Excepti
         boolean batchTrancribe = (task instanceof WhisperTranscriptTask);
         if (batchTrancribe) {
             try {
-                List<TextAndScore> results = ((WhisperTranscriptTask) task).transcribeAudios(files);
+                List<TextAndScore> results = ((WhisperTranscriptTask) task).transcribeAudios(files, languages);
                 for (int i = 0; i < results.size(); i++) {
                     transcribeRequests.get(i).result = results.get(i);
                 }
             } catch (Exception e) {// case fail, try each audio individually
                 batchTrancribe = false;
                 logger.error("Error while doing batch transcribe " + e.toString());
+            } finally {
+                // languages detected by the batch are not detected again by retries
+                for (int i = 0; i < languages.size(); i++) {
+                    transcribeRequests.get(i).language = languages.get(i);
+                }
             }
         }
         if (!batchTrancribe) {// try each audio individually
             for (int i = 0; i < files.size(); i++) {
                 try {
-                    transcribeRequests.get(i).result = task.transcribeAudio(files.get(i));
+                    TranscribeRequest req = transcribeRequests.get(i);
+                    if (task instanceof WhisperTranscriptTask) {
+                        req.result = ((WhisperTranscriptTask) task).transcribeAudios(Arrays.asList(req.wavAudio), Arrays.asList(req.language)).get(0);
+                    } else {
+                        req.result = task.transcribeAudio(req.wavAudio);
+                    }
                 } catch (Exception e2) {
                     transcribeRequests.get(i).result = null;
                     transcribeRequests.get(i).error = e2;
@@ -0,0 +1,88 @@
+package iped.engine.task.transcript;
+
+import java.io.IOException;
+import java.sql.Connection;
+import java.sql.PreparedStatement;
+import java.sql.ResultSet;
+import java.sql.SQLException;
+import java.sql.Statement;
+
+import iped.engine.task.transcript.AbstractTranscriptTask.TextAndScore;
+
+/**
+ * Transcriptions cached by audio hash and model configuration (model, language,
+ * precision...), stored in a SQLite database which can be shared among cases.
+ * The language detected in the audio, if any, is cached with its transcription.
+ */
+class TranscriptCache {
+
+    private static final String CREATE_TABLE = "CREATE TABLE IF NOT EXISTS transcript_cache(hash TEXT, model TEXT, text TEXT, score REAL, language TEXT, PRIMARY KEY(hash, model));"; //$NON-NLS-1$
+
+    private static final String INSERT_DATA = "INSERT INTO transcript_cache(hash, model, text, score, language) VALUES(?,?,?,?,?) ON CONFLICT(hash, model) DO NOTHING"; //$NON-NLS-1$
+
+    private static final String SELECT_DATA = "SELECT text, score, language FROM transcript_cache WHERE hash=? AND model=?;"; //$NON-NLS-1$
+
+    private final Connection conn;
+
+    private final String modelKey;
+
+    /**
+     * @param conn
+     *            connection to the database storing the cache
+     * @param modelKey
+     *            key of the model configuration producing the transcriptions
+     */
+    TranscriptCache(Connection conn, String modelKey) throws SQLException {
+        this.conn = conn;
+        this.modelKey = modelKey;
+        try (Statement stmt = conn.createStatement()) {
+            stmt.executeUpdate(CREATE_TABLE);
+        }
+    }
+
+    Connection getConnection() {
+        return conn;
+    }
+
+    String getModelKey() {
+        return modelKey;
+    }
+
+    /**
+     * @return the cached transcription of the audio or null if not found
+     */
+    TextAndScore get(String hash) throws IOException {
+        try (PreparedStatement ps = conn.prepareStatement(SELECT_DATA)) {
+            ps.setString(1, hash);
+            ps.setString(2, modelKey);
+            ResultSet rs = ps.executeQuery();
+            if (rs.next()) {
+                TextAndScore result = new TextAndScore();
+                result.text = rs.getString(1);
+                result.score = rs.getDouble(2);
+                result.language = rs.getString(3);
+                return result;
+            }
+        } catch (SQLException e) {
+            throw new IOException(e);
+        }
+        return null;
+    }
+
+    /**
+     * Caches the transcription of the audio, if it was not cached before.
+     */
+    void put(String hash, TextAndScore result) throws IOException {
+        try (PreparedStatement ps = conn.prepareStatement(INSERT_DATA)) {
+            ps.setString(1, hash);
+            ps.setString(2, modelKey);
+            ps.setString(3, result.text);
+            ps.setDouble(4, result.score);
+            ps.setString(5, result.language);
+            ps.executeUpdate();
+        } catch (SQLException e) {
+            throw new IOException(e);
+        }
+    }
+
+}
@@ -5,6 +5,8 @@
 import java.io.IOException;
 import java.io.InputStream;
 import java.io.InputStreamReader;
+import java.util.HashMap;
+import java.util.Map;
 import java.util.concurrent.LinkedBlockingDeque;
 import java.util.concurrent.TimeUnit;
 import java.util.concurrent.atomic.AtomicBoolean;
@@ -33,12 +35,32 @@ public class Wav2Vec2TranscriptTask extends AbstractTranscriptTask {
     private static final String HUGGINGSOUND_LOADED = "huggingsound_loaded";
     private static final String TERMINATE = "terminate_process";
     private static final String PING = "ping";
+    private static final String GPU_MEMORY = "gpu_memory ";
+
+    /**
+     * Free GPU memory needed to place another process, relative to the memory
+     * used by the first process loaded on GPU.
+     */
+    static final double GPU_MEMORY_HEADROOM = 1.2;
 
     protected static final int MAX_TRANSCRIPTIONS = 100000;
     protected static final byte[] NEW_LINE = "\n".getBytes();
 
     protected static volatile Integer numProcesses;
 
+    protected static volatile Integer numGpus;
+
+    protected static volatile int maxProcessesPerGpu = 1;
+
+    // GPU used by each process slot, kept on restarts
+    private static final Map<Integer, Integer> gpuBySlot = new HashMap<>();
+
+    // last free memory reported for each GPU in MB, -1 if unknown
+    private static volatile long[] gpuFreeMemory;
+
+    // GPU memory in MB used by one process, 0 if still unknown
+    private static volatile long processGpuMemory;
+
     protected static LinkedBlockingDeque<Server> deque = new LinkedBlockingDeque<>();
 
     protected static volatile Level logLevel = Level.forName("MSG", 250);
@@ -50,6 +72,18 @@ static class Server {
         BufferedReader reader;
         int transcriptionsDone = 0;
         int device = 0;
+
+        // statistics kept across process restarts
+        int restarts = 0;
+        long totalTranscriptions = 0;
+        long audioMillis = 0;
+        long transcriptionMillis = 0;
+
+        void addStats(long audioBytes, long millis, int transcriptions) {
+            audioMillis += 1000 * audioBytes / WAV_BYTES_PER_SEC;
+            transcriptionMillis += millis;
+            totalTranscriptions += transcriptions;
+        }
     }
 
     protected static int getNumProcessors() {
@@ -59,6 +93,144 @@ protected static int getNumProcessors() {
         return cpu.getPhysicalPackageCount();
     }
 
+    /**
+     * Distributes the transcription processes among the available GPUs, placing
+     * each new process on the GPU with fewer processes that still has enough free
+     * memory for it. Restarted processes keep their GPU.
+     * 
+     * @return the GPU index or -1 if no GPU can receive another process
+     */
+    protected static synchronized int getGpuIndex(int device) {
+        Integer gpu = gpuBySlot.get(device);
+        if (gpu != null) {
+            return gpu;
+        }
+        if (numGpus == null || numGpus == 0) {
+            return device;
+        }
+        int[] processesOnGpu = new int[numGpus];
+        for (int g : gpuBySlot.values()) {
+            processesOnGpu[g]++;
+        }
+        gpu = chooseGpu(gpuFreeMemory, processesOnGpu, maxProcessesPerGpu, processGpuMemory);
+        if (gpu >= 0) {
+            gpuBySlot.put(device, gpu);
+        }
+        return gpu;
+    }
+
+    /**
+     * Chooses the GPU with fewer processes, preferring the one with more free
+     * memory on ties. GPUs already running processesPerGpu processes or without
+     * free memory for another process (plus some headroom) are not chosen.
+     * 
+     * @param freeMemory
+     *            free memory of each GPU, -1 or missing if unknown
+     * @param processMemory
+     *            memory used by one process, 0 if unknown
+     * @return the GPU index or -1 if none can receive another process
+     */
+    static int chooseGpu(long[] freeMemory, int[] processesOnGpu, int processesPerGpu, long processMemory) {
+        int best = -1;
+        long bestFree = -1;
+        for (int i = 0; i < processesOnGpu.length; i++) {
+            long free = freeMemory != null && i < freeMemory.length ? freeMemory[i] : -1;
+            if (processesOnGpu[i] >= processesPerGpu) {
+                continue;
+            }
+            if (free >= 0 && processMemory > 0 && free < processMemory * GPU_MEMORY_HEADROOM) {
+                continue;
+            }
+            if (best == -1 || processesOnGpu[i] < processesOnGpu[best] || (processesOnGpu[i] == processesOnGpu[best] && free > bestFree)) {
+                best = i;
+                bestFree = free;
+            }
+        }
+        return best;
+    }
+
+    /**
+     * Parses the free memory of each GPU reported by the transcription process.
+     * 
+     * @return free memory in MB of each GPU, -1 if unknown, or null if the line
+     *         is not a GPU memory report
+     */
+    static long[] parseGpuMemory(String line) {
+        if (line == null || !line.startsWith(GPU_MEMORY)) {
+            return null;
+        }
+        String values = line.substring(GPU_MEMORY.length()).trim();
+        if (values.isEmpty()) {
+            return new long[0];
+        }
+        String[] parts = values.split(",", -1);
+        long[] memory = new long[parts.length];
+        for (int i = 0; i < parts.length; i++) {
+            try {
+                memory[i] = Long.parseLong(parts[i].trim());
+            } catch (NumberFormatException e) {
+                memory[i] = -1;
+            }
+        }
+        return memory;
+    }
+
+    /**
+     * Updates the free GPU memory reported by a started process. The memory used
+     * by one process is measured on the first process loaded on GPU.
+     */
+    protected static synchronized void updateGpuMemory(int gpu, String deviceLoaded, long[] memoryBefore, long[] memoryAfter) {
+        if (memoryAfter == null) {
+            return;
+        }
+        if (processGpuMemory == 0 && deviceLoaded != null && deviceLoaded.startsWith("cuda") && memoryBefore != null && gpu >= 0 && gpu < memoryBefore.length
+                && gpu < memoryAfter.length && memoryBefore[gpu] >= 0 && memoryAfter[gpu] >= 0) {
+            processGpuMemory = Math.max(1, memoryBefore[gpu] - memoryAfter[gpu]);
+            logger.info("Transcription process uses about {} MB of GPU memory", processGpuMemory);
+        }
+        gpuFreeMemory = memoryAfter;
+    }
+
+    /**
+     * Records the GPU of the first process, started before the number of GPUs is
+     * known.
+     */
+    protected static synchronized void setGpuIndex(int device, int gpu, long[] freeMemory) {
+        if (numGpus != null && numGpus > 0) {
+            gpuBySlot.putIfAbsent(device, gpu);
+        }
+        if (freeMemory != null) {
+            gpuFreeMemory = freeMemory;
+        }
+    }
+
+    /**
+     * Stops starting new processes when no GPU has enough free memory for them.
+     * 
+     * @return true if no more processes should be started
+     */
+    protected static boolean noGpuAvailable(int device, int gpu) {
+        if (gpu >= 0) {
+            return false;
+        }
+        logger.warn("Not enough free GPU memory for another transcription process, using {} processes.", device);
+        numProcesses = device;
+        return true;
+    }
+
+    protected static void setNumProcesses(int cudaCount, int processesPerGpu) {
+        int cpus = getNumProcessors();
+        logger.info("Number of CUDA devices detected: {}", cudaCount);
+        logger.info("Number of CPU devices detected: {}", cpus);
+        numGpus = cudaCount;
+        maxProcessesPerGpu = Math.max(1, processesPerGpu);
+        if (cudaCount > 0) {
+            numProcesses = cudaCount * Math.max(1, processesPerGpu);
+        } else {
+            numProcesses = cpus;
+        }
+    }
+
     protected static int getNumConcurrentTranscriptions() {
         if (numProcesses == null) {
             throw new RuntimeException("'numProcesses' variable still not initialized");
@@ -144,7 +316,12 @@ protected Server startServer0(int device) throws IOException {
                     + "' in audio transcription config file.");
         }
 
-        pb.command(python, script, model, Integer.toString(device));
+        int gpu = getGpuIndex(device);
+        if (noGpuAvailable(device, gpu)) {
+            return null;
+        }
+
+        pb.command(python, script, model, Integer.toString(gpu), Boolean.toString(transcriptConfig.isVadFilter()));
 
         Process process = pb.start();
 
@@ -160,27 +337,29 @@ protected Server startServer0(int device) throws IOException {
 
         int cudaCount = Integer.valueOf(reader.readLine());
         if (numProcesses == null) {
-            int cpus = getNumProcessors();
-            logger.info("Number of CUDA devices detected: {}", cudaCount);
-            logger.info("Number of CPU devices detected: {}", cpus);
-            if (cudaCount > 0) {
-                numProcesses = cudaCount;
-            } else {
-                numProcesses = cpus;
-            }
+            setNumProcesses(cudaCount, transcriptConfig.getProcessesPerGpu());
         }
 
+        long[] memoryBefore = null;
         String msgToIgnore = "Ignored unknown";
-        while ((line = reader.readLine()) != null && line.startsWith(msgToIgnore))
-            ;
+        while ((line = reader.readLine()) != null) {
+            long[] memory = parseGpuMemory(line);
+            if (memory != null) {
+                memoryBefore = memory;
+            } else if (!line.startsWith(msgToIgnore)) {
+                break;
+            }
+        }
+        setGpuIndex(device, gpu, memoryBefore);
 
         if (!MODEL_LOADED.equals(line)) {
             throw new StartupException("Error loading '" + model + "' transcription model.");
         }
 
-        line = reader.readLine();
+        String deviceLoaded = reader.readLine();
+        updateGpuMemory(gpu, deviceLoaded, memoryBefore, parseGpuMemory(reader.readLine()));
 
-        logger.info("Model loaded on device={}", line);
+        logger.info("Model loaded on device={}", deviceLoaded);
 
         Server server = new Server();
         server.process = process;
@@ -212,11 +391,30 @@ public void run() {
     public void finish() throws Exception {
         super.finish();
         for (Server server : deque) {
+            logServerStats(server);
             terminateServer(server);
         }
         deque.clear();
     }
 
+    private void logServerStats(Server server) {
+        if (server.totalTranscriptions == 0) {
+            return;
+        }
+        logger.info("Transcription process {}: {} transcriptions, {} restarts, throughput: {} audio seconds per second", server.device, server.totalTranscriptions, server.restarts,
+                String.format("%.2f", (double) server.audioMillis / Math.max(1, server.transcriptionMillis)));
+    }
+
+    protected Server restartServer(Server server) throws InterruptedException, StartupException {
+        terminateServer(server);
+        Server newServer = startServer(server.device);
+        newServer.restarts = server.restarts + 1;
+        newServer.totalTranscriptions = server.totalTranscriptions;
+        newServer.audioMillis = server.audioMillis;
+        newServer.transcriptionMillis = server.transcriptionMillis;
+        return newServer;
+    }
+
     protected void terminateServer(Server server) throws InterruptedException {
         Process process = server.process;
         try {
@@ -250,6 +448,11 @@ protected boolean ping(Server server) {
         return false;
     }
 
+    @Override
+    protected String getTranscriptCacheKey() {
+        return "wav2vec2:" + transcriptConfig.getHuggingFaceModel() + (transcriptConfig.isVadFilter() ? ":vad" : "");
+    }
+
     @Override
     protected TextAndScore transcribeAudio(File tmpFile) throws Exception {
         String path = evidence != null ? evidence.getPath() : tmpFile.getPath();
@@ -272,10 +475,10 @@ protected TextAndScore transcribeWavPart(File tmpFile) throws Exception {
         Server server = deque.take();
         try {
             if (!ping(server) || server.transcriptionsDone >= MAX_TRANSCRIPTIONS) {
-                terminateServer(server);
-                server = startServer(server.device);
+                server = restartServer(server);
             }
 
+            long t = System.currentTimeMillis();
             String filePath = tmpFile.getAbsolutePath().replace('\\', '/');
             server.process.getOutputStream().write(filePath.getBytes("UTF-8"));
             server.process.getOutputStream().write(NEW_LINE);
@@ -298,6 +501,7 @@ protected TextAndScore transcribeWavPart(File tmpFile) throws Exception {
             textAndScore.score = score;
 
             server.transcriptionsDone++;
+            server.addStats(tmpFile.length(), System.currentTimeMillis() - t, 1);
 
         } finally {
             deque.add(server);
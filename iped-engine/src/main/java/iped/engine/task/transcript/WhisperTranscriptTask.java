@@ -20,6 +20,7 @@
 import iped.engine.config.Configuration;
 import iped.engine.config.ConfigurationManager;
 import iped.exception.IPEDException;
+import iped.properties.ExtraProperties;
 
 public class WhisperTranscriptTask extends Wav2Vec2TranscriptTask {
 
@@ -28,6 +29,8 @@ public class WhisperTranscriptTask extends Wav2Vec2TranscriptTask {
     private static final String SCRIPT_PATH = "/scripts/tasks/WhisperProcess.py";
     private static final String LIBRARY_LOADED = "library_loaded";
     private static final String MODEL_LOADED = "model_loaded";
+    private static final String MODELS_DIR = "/models/whisper";
+    private static final String DETECTED_LANGUAGES = "detected_languages ";
 
     private static final AtomicBoolean ffmpegTested = new AtomicBoolean();
     private static volatile boolean ffmpegFound;
@@ -65,16 +68,19 @@ protected Server startServer0(int deviceId) throws IOException {
         int cpus = getNumProcessors();
         int threads = Runtime.getRuntime().availableProcessors() / cpus;
 
-        String lang = transcriptConfig.getLanguages().get(0);
-        if (lang.contains("-")) {
-            lang = lang.substring(0, lang.indexOf("-"));
-        }
-
+        String lang = getLanguage();
         String precision = transcriptConfig.getPrecision();
         String batchSize = Integer.toString(transcriptConfig.getBatchSize());
         String device = transcriptConfig.getDevice();
 
-        pb.command(python, script, model, device, Integer.toString(deviceId), Integer.toString(threads), lang, precision, batchSize);
+        String modelsDir = ipedRoot + MODELS_DIR;
+
+        int gpu = getGpuIndex(deviceId);
+        if (noGpuAvailable(deviceId, gpu)) {
+            return null;
+        }
+
+        pb.command(python, script, model, device, Integer.toString(gpu), Integer.toString(threads), lang, precision, batchSize, modelsDir);
 
         Process process = pb.start();
 
@@ -106,26 +112,30 @@ protected Server startServer0(int deviceId) throws IOException {
             throw new StartupException("Error converting the number of cuda devices: " + line);
         }
         if (numProcesses == null) {
-            logger.info("Number of CUDA devices detected: {}", cudaCount);
-            logger.info("Number of CPU devices detected: {}", cpus);
-            if (cudaCount > 0) {
-                numProcesses = cudaCount;
-            } else {
-                numProcesses = cpus;
-            }
+            setNumProcesses(cudaCount, transcriptConfig.getProcessesPerGpu());
         }
 
+        long[] memoryBefore = null;
         String msgToIgnore = "Ignored unknown";
-        while ((line = reader.readLine()) != null && line.startsWith(msgToIgnore))
-            ;
+        while ((line = reader.readLine()) != null) {
+            long[] memory = parseGpuMemory(line);
+            if (memory != null) {
+                memoryBefore = memory;
+            } else if (!line.startsWith(msgToIgnore)) {
+                break;
+            }
+        }
+        setGpuIndex(deviceId, gpu, memoryBefore);
 
         if (!MODEL_LOADED.equals(line)) {
             throw new StartupException("Error loading '" + model + "' transcription model.");
         }
 
+        String deviceLoaded = reader.readLine();
         line = reader.readLine();
+        updateGpuMemory(gpu, deviceLoaded, memoryBefore, parseGpuMemory(reader.readLine()));
 
-        logger.info("Model loaded on device={}", line);
+        logger.info("Model loaded on device={} in {}s", deviceLoaded, line);
 
         Server server = new Server();
         server.process = process;
@@ -135,12 +145,42 @@ protected Server startServer0(int deviceId) throws IOException {
         return server;
     }
 
+    protected String getLanguage() {
+        String lang = transcriptConfig.getLanguages().get(0);
+        if (lang.contains("-")) {
+            lang = lang.substring(0, lang.indexOf("-"));
+        }
+        return lang;
+    }
+
+    @Override
+    protected String getTranscriptCacheKey() {
+        return "whisper:" + transcriptConfig.getWhisperModel() + ":" + getLanguage() + ":" + transcriptConfig.getPrecision();
+    }
+
     @Override
     protected TextAndScore transcribeAudio(File tmpFile) throws Exception {
         return transcribeWavPart(tmpFile);
     }
 
-    protected List<TextAndScore> transcribeAudios(ArrayList<File> tmpFiles) throws Exception {
+    @Override
+    protected TextAndScore transcribeWavPart(File tmpFile) throws Exception {
+        // reuses the language detected before in the item, if any
+        String language = evidence != null ? evidence.getMetadata().get(ExtraProperties.TRANSCRIPT_LANGUAGE_ATTR) : null;
+        return transcribeAudios(Arrays.asList(tmpFile), Arrays.asList(language)).get(0);
+    }
+
+    /**
+     * Transcribes the audios in a batch.
+     * 
+     * @param tmpFiles
+     *            audios to transcribe
+     * @param languages
+     *            languages detected before in each audio, or null elements to
+     *            detect them. Detected languages are set into this list, even if
+     *            the transcription fails, so they are reused when retrying.
+     */
+    protected List<TextAndScore> transcribeAudios(List<File> tmpFiles, List<String> languages) throws Exception {
 
         ArrayList<TextAndScore> textAndScores = new ArrayList<>();
         for (int i = 0; i < tmpFiles.size(); i++) {
@@ -150,16 +190,21 @@ protected List<TextAndScore> transcribeAudios(ArrayList<File> tmpFiles) throws E
         Server server = deque.take();
         try {
             if (!ping(server) || server.transcriptionsDone >= MAX_TRANSCRIPTIONS) {
-                terminateServer(server);
-                server = startServer(server.device);
+                server = restartServer(server);
             }
 
+            long t = System.currentTimeMillis();
+            long audioBytes = 0;
             StringBuilder filePaths = new StringBuilder();
             for (int i = 0; i < tmpFiles.size(); i++) {
                 if (i > 0) {
                     filePaths.append(",");
                 }
                 filePaths.append(tmpFiles.get(i).getAbsolutePath().replace('\\', '/'));
+                if (languages.get(i) != null) {
+                    filePaths.append('|').append(languages.get(i));
+                }
+                audioBytes += tmpFiles.get(i).length();
 
             }
             server.process.getOutputStream().write(filePaths.toString().getBytes("UTF-8"));
@@ -170,6 +215,13 @@ protected List<TextAndScore> transcribeAudios(ArrayList<File> tmpFiles) throws E
             while (!TRANSCRIPTION_FINISHED.equals(line = server.reader.readLine())) {
                 if (line == null) {
                     throw new ProcessCrashedException();
+                } else if (line.startsWith(DETECTED_LANGUAGES)) {
+                    String[] detected = line.substring(DETECTED_LANGUAGES.length()).split(",", -1);
+                    for (int i = 0; i < detected.length && i < languages.size(); i++) {
+                        if (!detected[i].isEmpty()) {
+                            languages.set(i, detected[i]);
+                        }
+                    }
                 } else {
                     throw new RuntimeException("Transcription failed, returned: " + line);
                 }
@@ -181,9 +233,11 @@ protected List<TextAndScore> transcribeAudios(ArrayList<File> tmpFiles) throws E
                 TextAndScore textAndScore = new TextAndScore();
                 textAndScore.text = text;
                 textAndScore.score = score;
+                textAndScore.language = languages.get(i);
                 textAndScores.set(i, textAndScore);
                 server.transcriptionsDone++;
             }
+            server.addStats(audioBytes, System.currentTimeMillis() - t, tmpFiles.size());
 
         } finally {
             deque.add(server);
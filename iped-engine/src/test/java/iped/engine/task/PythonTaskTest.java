@@ -0,0 +1,56 @@
+package iped.engine.task;
+
+import static org.junit.Assert.assertArrayEquals;
+import static org.junit.Assert.assertEquals;
+import static org.junit.Assert.assertTrue;
+
+import java.io.File;
+import java.util.List;
+
+import org.junit.Test;
+
+import iped.engine.task.index.IndexItem.KnnVector;
+
+public class PythonTaskTest {
+
+    private PythonTask.Converter converter = new PythonTask(new File("TestTask.py")).new Converter();
+
+    @Test
+    public void testToKnnVectors() {
+        float[] array = { 0.5f, -1f, 2.25f, 3f, 0f, -0.125f };
+        List<KnnVector> vectors = converter.toKnnVectors(array, 3);
+        assertEquals(2, vectors.size());
+        assertArrayEquals(new double[] { 0.5, -1, 2.25 }, vectors.get(0).getArray(), 0);
+        assertArrayEquals(new double[] { 3, 0, -0.125 }, vectors.get(1).getArray(), 0);
+    }
+
+    @Test
+    public void testToKnnVectorsOfSingleVector() {
+        float[] array = { 1f, 2f, 3f, 4f };
+        List<KnnVector> vectors = converter.toKnnVectors(array, 4);
+        assertEquals(1, vectors.size());
+        assertArrayEquals(new double[] { 1, 2, 3, 4 }, vectors.get(0).getArray(), 0);
+    }
+
+    @Test
+    public void testToKnnVectorsOfEmptyArray() {
+        assertTrue(converter.toKnnVectors(new float[0], 128).isEmpty());
+    }
+
+    @Test
+    public void testToKnnVectorsIgnoresIncompleteVector() {
+        float[] array = { 1f, 2f, 3f, 4f, 5f };
+        List<KnnVector> vectors = converter.toKnnVectors(array, 2);
+        assertEquals(2, vectors.size());
+        assertArrayEquals(new double[] { 3, 4 }, vectors.get(1).getArray(), 0);
+    }
+
+    @Test
+    public void testToKnnVectorsCopiesValues() {
+        float[] array = { 1f, 2f };
+        List<KnnVector> vectors = converter.toKnnVectors(array, 2);
+        array[0] = 10f;
+        assertArrayEquals(new double[] { 1, 2 }, vectors.get(0).getArray(), 0);
+        assertArrayEquals(new double[] { 7, 8 }, converter.toKnnVector(new double[] { 7, 8 }).getArray(), 0);
+    }
+}
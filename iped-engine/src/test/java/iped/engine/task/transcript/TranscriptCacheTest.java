@@ -0,0 +1,151 @@
+package iped.engine.task.transcript;
+
+import static org.junit.Assert.assertEquals;
+import static org.junit.Assert.assertNotEquals;
+import static org.junit.Assert.assertNotNull;
+import static org.junit.Assert.assertNull;
+
+import java.io.File;
+import java.sql.Connection;
+import java.sql.DriverManager;
+
+import org.junit.After;
+import org.junit.Before;
+import org.junit.Test;
+
+import iped.engine.config.AudioTranscriptConfig;
+import iped.engine.task.transcript.AbstractTranscriptTask.TextAndScore;
+import iped.utils.UTF8Properties;
+
+public class TranscriptCacheTest {
+
+    private static final String HASH = "0123456789ABCDEF0123456789ABCDEF";
+
+    private File dbFile;
+    private Connection conn;
+
+    @Before
+    public void setUp() throws Exception {
+        dbFile = File.createTempFile("transcriptCache", ".db");
+        conn = DriverManager.getConnection("jdbc:sqlite:" + dbFile.getAbsolutePath());
+    }
+
+    @After
+    public void tearDown() throws Exception {
+        conn.close();
+        dbFile.delete();
+    }
+
+    private static TextAndScore textAndScore(String text, double score) {
+        TextAndScore result = new TextAndScore();
+        result.text = text;
+        result.score = score;
+        return result;
+    }
+
+    @Test
+    public void testLookupAndInsert() throws Exception {
+        TranscriptCache cache = new TranscriptCache(conn, "whisper:medium:pt:int8");
+        assertNull(cache.get(HASH));
+
+        cache.put(HASH, textAndScore("bom dia", 0.9));
+
+        TextAndScore result = cache.get(HASH);
+        assertNotNull(result);
+        assertEquals("bom dia", result.text);
+        assertEquals(0.9, result.score, 0.0);
+        assertNull(cache.get("FEDCBA9876543210FEDCBA9876543210"));
+    }
+
+    @Test
+    public void testDetectedLanguageIsCached() throws Exception {
+        TranscriptCache cache = new TranscriptCache(conn, "whisper:medium:detect:int8");
+        TextAndScore detected = textAndScore("good morning", 0.8);
+        detected.language = "en";
+        cache.put(HASH, detected);
+        cache.put("FEDCBA9876543210FEDCBA9876543210", textAndScore("bom dia", 0.9));
+
+        assertEquals("en", cache.get(HASH).language);
+        assertNull(cache.get("FEDCBA9876543210FEDCBA9876543210").language);
+    }
+
+    @Test
+    public void testFirstTranscriptionIsKept() throws Exception {
+        TranscriptCache cache = new TranscriptCache(conn, "whisper:medium:pt:int8");
+        cache.put(HASH, textAndScore("bom dia", 0.9));
+        cache.put(HASH, textAndScore("boa tarde", 0.5));
+
+        TextAndScore result = cache.get(HASH);
+        assertEquals("bom dia", result.text);
+        assertEquals(0.9, result.score, 0.0);
+    }
+
+    @Test
+    public void testModelsAreCachedSeparately() throws Exception {
+        TranscriptCache whisper = new TranscriptCache(conn, "whisper:medium:pt:int8");
+        TranscriptCache wav2vec2 = new TranscriptCache(conn, "wav2vec2:jonatasgrosman/wav2vec2-large-xlsr-53-portuguese");
+        whisper.put(HASH, textAndScore("bom dia", 0.9));
+
+        assertNull(wav2vec2.get(HASH));
+        wav2vec2.put(HASH, textAndScore("bom dias", 0.7));
+        assertEquals("bom dia", whisper.get(HASH).text);
+        assertEquals("bom dias", wav2vec2.get(HASH).text);
+    }
+
+    @Test
+    public void testCacheSharedAmongConnections() throws Exception {
+        new TranscriptCache(conn, "whisper:medium:pt:int8").put(HASH, textAndScore("bom dia", 0.9));
+
+        try (Connection otherCase = DriverManager.getConnection("jdbc:sqlite:" + dbFile.getAbsolutePath())) {
+            TextAndScore result = new TranscriptCache(otherCase, "whisper:medium:pt:int8").get(HASH);
+            assertNotNull(result);
+            assertEquals("bom dia", result.text);
+        }
+    }
+
+    private static AudioTranscriptConfig createConfig(String... keyValues) {
+        UTF8Properties props = new UTF8Properties();
+        props.setProperty("language", "pt-BR");
+        props.setProperty("mimesToProcess", "audio/;video/");
+        props.setProperty("implementationClass", WhisperTranscriptTask.class.getName());
+        props.setProperty("serviceRegion", "brazilsouth");
+        props.setProperty("convertCommand", "mplayer -benchmark -vo null -vc null -srate 16000 -af format=s16le,resample=16000,channels=1 -ao pcm:fast:file=$OUTPUT $INPUT");
+        props.setProperty("requestIntervalMillis", "0");
+        props.setProperty("maxConcurrentRequests", "100");
+        props.setProperty("minWordScore", "0.5");
+        props.setProperty("whisperModel", "medium");
+        props.setProperty("huggingFaceModel", "jonatasgrosman/wav2vec2-large-xlsr-53-portuguese");
+        for (int i = 0; i < keyValues.length; i += 2) {
+            props.setProperty(keyValues[i], keyValues[i + 1]);
+        }
+        AudioTranscriptConfig config = new AudioTranscriptConfig();
+        config.processProperties(props);
+        return config;
+    }
+
+    private static String whisperKey(String... keyValues) {
+        WhisperTranscriptTask task = new WhisperTranscriptTask();
+        task.transcriptConfig = createConfig(keyValues);
+        return task.getTranscriptCacheKey();
+    }
+
+    private static String wav2vec2Key(String... keyValues) {
+        Wav2Vec2TranscriptTask task = new Wav2Vec2TranscriptTask();
+        task.transcriptConfig = createConfig(keyValues);
+        return task.getTranscriptCacheKey();
+    }
+
+    @Test
+    public void testCacheKeys() {
+        assertEquals("whisper:medium:pt:int8", whisperKey());
+        assertEquals(whisperKey(), whisperKey("language", "pt"));
+        assertNotEquals(whisperKey(), whisperKey("whisperModel", "large-v3"));
+        assertNotEquals(whisperKey(), whisperKey("language", "en"));
+        assertNotEquals(whisperKey(), whisperKey("precision", "float16"));
+
+        assertEquals("wav2vec2:jonatasgrosman/wav2vec2-large-xlsr-53-portuguese", wav2vec2Key());
+        assertNotEquals(wav2vec2Key(), wav2vec2Key("vadFilter", "true"));
+        assertNotEquals(wav2vec2Key(), wav2vec2Key("huggingFaceModel", "jonatasgrosman/wav2vec2-large-xlsr-53-english"));
+    }
+
+}
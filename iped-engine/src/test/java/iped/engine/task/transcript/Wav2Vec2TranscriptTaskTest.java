@@ -0,0 +1,49 @@
+package iped.engine.task.transcript;
+
+import static org.junit.Assert.assertArrayEquals;
+import static org.junit.Assert.assertEquals;
+import static org.junit.Assert.assertNull;
+
+import org.junit.Test;
+
+public class Wav2Vec2TranscriptTaskTest {
+
+    @Test
+    public void testParseGpuMemory() {
+        assertArrayEquals(new long[] { 10240, 2048 }, Wav2Vec2TranscriptTask.parseGpuMemory("gpu_memory 10240,2048"));
+        assertArrayEquals(new long[] { -1, 2048 }, Wav2Vec2TranscriptTask.parseGpuMemory("gpu_memory ,2048"));
+        assertArrayEquals(new long[0], Wav2Vec2TranscriptTask.parseGpuMemory("gpu_memory "));
+        assertNull(Wav2Vec2TranscriptTask.parseGpuMemory("Ignored unknown kwargs"));
+        assertNull(Wav2Vec2TranscriptTask.parseGpuMemory(null));
+    }
+
+    @Test
+    public void testChooseGpuWithFewerProcesses() {
+        long[] free = { 8000, 8000 };
+        assertEquals(0, Wav2Vec2TranscriptTask.chooseGpu(free, new int[] { 0, 0 }, 2, 1000));
+        assertEquals(1, Wav2Vec2TranscriptTask.chooseGpu(free, new int[] { 1, 0 }, 2, 1000));
+        assertEquals(0, Wav2Vec2TranscriptTask.chooseGpu(free, new int[] { 1, 2 }, 2, 1000));
+        assertEquals(-1, Wav2Vec2TranscriptTask.chooseGpu(free, new int[] { 2, 2 }, 2, 1000));
+    }
+
+    @Test
+    public void testChooseGpuWithMoreFreeMemoryOnTies() {
+        assertEquals(1, Wav2Vec2TranscriptTask.chooseGpu(new long[] { 4000, 6000 }, new int[] { 1, 1 }, 4, 1000));
+    }
+
+    @Test
+    public void testChooseGpuSkipsGpusWithoutMemory() {
+        // 1100 MB free is below the headroom needed by a 1000 MB process
+        assertEquals(1, Wav2Vec2TranscriptTask.chooseGpu(new long[] { 1100, 3000 }, new int[] { 1, 2 }, 4, 1000));
+        assertEquals(-1, Wav2Vec2TranscriptTask.chooseGpu(new long[] { 1100, 900 }, new int[] { 1, 1 }, 4, 1000));
+        assertEquals(0, Wav2Vec2TranscriptTask.chooseGpu(new long[] { 1200, 900 }, new int[] { 1, 1 }, 4, 1000));
+    }
+
+    @Test
+    public void testChooseGpuWithUnknownMemory() {
+        assertEquals(1, Wav2Vec2TranscriptTask.chooseGpu(null, new int[] { 1, 0 }, 2, 1000));
+        assertEquals(0, Wav2Vec2TranscriptTask.chooseGpu(new long[] { 100, 100 }, new int[] { 0, 0 }, 2, 0));
+        assertEquals(1, Wav2Vec2TranscriptTask.chooseGpu(new long[] { 100, -1 }, new int[] { 1, 1 }, 2, 1000));
+    }
+
+}
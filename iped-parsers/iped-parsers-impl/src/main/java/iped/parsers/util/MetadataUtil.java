@@ -253,6 +253,7 @@ private static Set<String> getGeneralKeys() {
         generalKeys.add(ExtraProperties.DOWNLOADED_DATA);
         generalKeys.add(ExtraProperties.TRANSCRIPT_ATTR);
         generalKeys.add(ExtraProperties.CONFIDENCE_ATTR);
+        generalKeys.add(ExtraProperties.TRANSCRIPT_LANGUAGE_ATTR);
         generalKeys.add(OCRParser.OCR_CHAR_COUNT);
         generalKeys.add(RawStringParser.COMPRESS_RATIO);
         generalKeys.add(ExtraProperties.PARENT_VIEW_POSITION);